@@ -0,0 +1,90 @@
+from typing import Callable, Iterable, List, NamedTuple, Optional
+import io
+import os
+import time
+import file_format
+
+CHUNK_SIZES = (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024)
+SAMPLE_SIZE = 16 * 1024 * 1024
+
+
+class TuningProfile(NamedTuple):
+    """Лучшее сочетание параметров шифрования файлов на этом устройстве"""
+    cipher: str
+    chunk_size: int
+    workers: int
+    throughput: float  # МБ/с
+
+    def as_settings(self) -> dict:
+        return {
+            "file_cipher": self.cipher,
+            "file_chunk_size": self.chunk_size,
+            "file_workers": self.workers,
+        }
+
+
+class _NullWriter:
+    """Выходной поток, который только считает байты"""
+
+    def write(self, data) -> int:
+        return len(data)
+
+
+def worker_options(cpu_count: Optional[int] = None) -> List[int]:
+    """Число потоков для проверки: степени двойки до числа ядер и само число ядер"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    options = []
+    workers = 1
+    while workers < cpu_count:
+        options.append(workers)
+        workers *= 2
+    options.append(cpu_count)
+    return options
+
+
+def measure(cipher: str, chunk_size: int, workers: int, data: bytes, key: bytes, repeats: int = 2) -> float:
+    """Скорость шифрования data в памяти, МБ/с (лучшая из repeats попыток)"""
+    header = file_format.build_header(cipher, b"\0" * 16, chunk_size)
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        file_format.encrypt_stream(io.BytesIO(data), _NullWriter(), key, header, workers=workers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(data) / (1024 * 1024) / max(best, 1e-9)
+
+
+def calibrate(ciphers: Iterable[str] = None, chunk_sizes: Iterable[int] = CHUNK_SIZES,
+              workers: Iterable[int] = None, sample_size: int = SAMPLE_SIZE,
+              progress_callback: Callable[[int, int], None] = None) -> TuningProfile:
+    """Перебирает шифры, размеры блока и число потоков и возвращает самый быстрый вариант
+
+    При равной скорости (в пределах 5%) предпочитается меньше потоков и меньший блок.
+    progress_callback(проверено_вариантов, всего_вариантов) вызывается после
+    каждого замера; исключение из него прерывает подбор.
+    """
+    ciphers = list(ciphers or file_format.SETTINGS_CIPHERS)
+    chunk_sizes = list(chunk_sizes)
+    workers = list(workers or worker_options())
+    total = len(ciphers) * len(chunk_sizes) * len(workers)
+    done = 0
+    data = os.urandom(sample_size)
+    key = os.urandom(32)
+    best = None
+    for cipher in ciphers:
+        for chunk_size in chunk_sizes:
+            for worker_count in workers:
+                throughput = measure(cipher, chunk_size, worker_count, data, key)
+                if best is None or throughput > best.throughput * 1.05:
+                    best = TuningProfile(cipher, chunk_size, worker_count, round(throughput, 1))
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+    return best
+
+
+def calibrate_and_store(settings, progress_callback: Callable[[int, int], None] = None) -> TuningProfile:
+    """Подбирает профиль и сохраняет его в настройках шифрования"""
+    profile = calibrate(progress_callback=progress_callback)
+    settings.update_settings(profile.as_settings())
+    return profile
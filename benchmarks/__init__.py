@@ -0,0 +1,8 @@
+"""Замеры производительности: KDF, шифровальщики, файлы и база данных
+
+Запуск: python -m benchmarks [--quick] [--only kdf,encryptors,files,db]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+"""
+from .core import BenchmarkResult, Comparison, compare, load_report, measure, write_report
+
+__all__ = ['BenchmarkResult', 'Comparison', 'compare', 'load_report', 'measure', 'write_report']
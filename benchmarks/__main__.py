@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import tempfile
+
+SUITES = ("kdf", "encryptors", "files", "db", "startup")
+
+
+def run_suites(suites, quick: bool) -> list:
+    """Запускает выбранные наборы в текущей папке"""
+    from . import db_bench, encryptor_bench, file_bench, kdf_bench, startup_bench
+
+    modules = {
+        "kdf": kdf_bench, "encryptors": encryptor_bench, "files": file_bench, "db": db_bench,
+        "startup": startup_bench,
+    }
+    results = []
+    for name in suites:
+        print(f"▶ {name}", file=sys.stderr)
+        results.extend(modules[name].run(quick))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Замеры производительности passwords")
+    parser.add_argument("--quick", action="store_true", help="уменьшенные объемы данных для быстрой проверки")
+    parser.add_argument("--only", default=",".join(SUITES), help=f"наборы через запятую: {', '.join(SUITES)}")
+    parser.add_argument("--output", help="файл для JSON-отчета (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON-отчет для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое ухудшение, доля (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    suites = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"неизвестные наборы: {', '.join(sorted(unknown))}")
+
+    # Шифровальщики создают базу в текущей папке, поэтому работаем во временной
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    from .core import compare, load_report, write_report
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="passwords-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            results = run_suites(suites, args.quick)
+        finally:
+            os.chdir(cwd)
+    report = write_report(results, output)
+
+    if baseline_path is None:
+        return 0
+    comparisons = compare(report, load_report(baseline_path), args.threshold)
+    for item in comparisons:
+        mark = "✗" if item.regression else "✓"
+        print(
+            f"{mark} {item.name}: {item.baseline:.6g} → {item.current:.6g} {item.unit} ({item.change:+.1%})",
+            file=sys.stderr
+        )
+    regressions = [item for item in comparisons if item.regression]
+    if regressions:
+        print(f"Регрессий: {len(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from typing import Callable, Dict, List, NamedTuple, Optional
+import json
+import platform
+import sys
+import time
+
+
+class BenchmarkResult(NamedTuple):
+    """Один замер: value в единицах unit; higher_is_better — растет ли значение при ускорении"""
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = False
+
+
+class Comparison(NamedTuple):
+    """Сравнение замера с базовым: change > 0 — стало лучше, < 0 — хуже (доля)"""
+    name: str
+    baseline: float
+    current: float
+    unit: str
+    change: float
+    regression: bool
+
+
+def measure(func: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> float:
+    """Лучшее время одного вызова func в секундах
+
+    Каждая из repeat попыток крутит func, пока не наберет min_time, поэтому
+    короткие операции не упираются в точность таймера.
+    """
+    best = None
+    for _ in range(repeat):
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time:
+                break
+        per_call = elapsed / calls
+        best = per_call if best is None else min(best, per_call)
+    return best
+
+
+def write_report(results: List[BenchmarkResult], path: Optional[str] = None) -> dict:
+    """Собирает отчет в JSON; без path печатает его в stdout"""
+    from cryptography import __version__ as cryptography_version
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cryptography": cryptography_version,
+            "platform": platform.platform(),
+        },
+        "results": {
+            result.name: {
+                "value": result.value,
+                "unit": result.unit,
+                "higher_is_better": result.higher_is_better,
+            }
+            for result in results
+        },
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if path is None:
+        sys.stdout.write(text + "\n")
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return report
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.1) -> List[Comparison]:
+    """Сравнивает общие замеры двух отчетов
+
+    Регрессия — ухудшение больше threshold (доля) относительно базового замера.
+    """
+    comparisons = []
+    baseline_results: Dict[str, dict] = baseline["results"]
+    for name, current in report["results"].items():
+        previous = baseline_results.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        ratio = current["value"] / previous["value"]
+        change = ratio - 1 if current["higher_is_better"] else 1 - ratio
+        comparisons.append(Comparison(
+            name, previous["value"], current["value"], current["unit"], change, change < -threshold
+        ))
+    return comparisons
@@ -0,0 +1,55 @@
+from database.db_manager import DatabaseManager
+from typing import List
+import os
+import shutil
+import tempfile
+import time
+from .core import BenchmarkResult, measure
+
+ROW_COUNTS = (1000, 100000, 1000000)
+QUICK_ROW_COUNTS = (1000, 10000)
+
+
+def _fill(db_manager: DatabaseManager, current: int, target: int) -> float:
+    """Догружает базу до target строк пакетной вставкой, возвращает строк в секунду"""
+    rows = [
+        (f"entry{index}", b"\0" * 64, b"\0" * 16, "Fernet")
+        for index in range(current, target)
+    ]
+    started = time.perf_counter()
+    db_manager.save_encrypted_data_many(rows)
+    return len(rows) / (time.perf_counter() - started)
+
+
+def run(quick: bool = False) -> List[BenchmarkResult]:
+    """Задержка списка и вставки при 1 тыс., 100 тыс. и 1 млн строк"""
+    work = tempfile.mkdtemp(prefix="passwords-bench-")
+    try:
+        db_manager = DatabaseManager(os.path.join(work, "bench.db"))
+        results = []
+        current = 0
+        for count in QUICK_ROW_COUNTS if quick else ROW_COUNTS:
+            rows_per_second = _fill(db_manager, current, count)
+            current = count
+            results.append(BenchmarkResult(f"db.{count}.bulk_insert", rows_per_second, "rows/s", True))
+
+            page, cursor = db_manager.list_entries(200)
+            results.append(BenchmarkResult(
+                f"db.{count}.list_first_page", measure(lambda: db_manager.list_entries(200)), "s"
+            ))
+            results.append(BenchmarkResult(
+                f"db.{count}.list_next_page", measure(lambda: db_manager.list_entries(200, cursor)), "s"
+            ))
+
+            inserted = []
+
+            def insert():
+                inserted.append(db_manager.save_encrypted_data("single", b"\0" * 64, b"\0" * 16, "Fernet"))
+
+            results.append(BenchmarkResult(f"db.{count}.insert", measure(insert, 3), "s"))
+            # Одиночные вставки не должны сдвигать размер следующего замера
+            for data_id in inserted:
+                db_manager.delete_encrypted_data(data_id)
+        return results
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,26 @@
+from encryption.encryptor_factory import EncryptorFactory
+from typing import List
+import os
+from .core import BenchmarkResult, measure
+
+PAYLOAD_SIZES = (64, 1024, 64 * 1024, 1024 * 1024)
+
+
+def run(quick: bool = False) -> List[BenchmarkResult]:
+    """Скорость encrypt_data/decrypt_data каждого шифровальщика по размерам данных"""
+    sizes = PAYLOAD_SIZES[:3] if quick else PAYLOAD_SIZES
+    results = []
+    for algorithm in EncryptorFactory.get_available_algorithms():
+        encryptor = EncryptorFactory.get_encryptor_class(algorithm)()
+        # Готовый ключ: здесь измеряется шифр, а не KDF
+        encryptor.use_key(os.urandom(32), os.urandom(16))
+        name = encryptor.algorithm_name.lower().replace(" ", "")
+        for size in sizes:
+            data = "x" * size
+            encrypted = encryptor.encrypt_data(data)
+            repeat = 3 if quick else 5
+            encrypt_time = measure(lambda: encryptor.encrypt_data(data), repeat)
+            decrypt_time = measure(lambda: encryptor.decrypt_data(encrypted), repeat)
+            results.append(BenchmarkResult(f"encryptor.{name}.encrypt.{size}", size / encrypt_time / 2 ** 20, "MB/s", True))
+            results.append(BenchmarkResult(f"encryptor.{name}.decrypt.{size}", size / decrypt_time / 2 ** 20, "MB/s", True))
+    return results
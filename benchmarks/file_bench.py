@@ -0,0 +1,60 @@
+from encryption.encryptor_factory import EncryptorFactory
+from encryption_manager import FileEncryptionManager
+from typing import List
+import os
+import shutil
+import tempfile
+from .core import BenchmarkResult, measure
+
+
+def _make_tree(root: str, files: int, file_size: int) -> int:
+    """Синтетическое дерево: files файлов по file_size байт в подпапках по 50"""
+    for index in range(files):
+        folder = os.path.join(root, f"dir{index // 50}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file{index}.bin"), "wb") as f:
+            f.write(os.urandom(file_size))
+    return files * file_size
+
+
+def run(quick: bool = False) -> List[BenchmarkResult]:
+    """Скорость encrypt_file/decrypt_file (в том числе каждого движка) и encrypt_folder в МБ/с"""
+    file_size = (8 if quick else 64) * 2 ** 20
+    repeat = 1 if quick else 3
+    work = tempfile.mkdtemp(prefix="passwords-bench-")
+    try:
+        manager = FileEncryptionManager()
+        manager.use_key(os.urandom(32), os.urandom(16))
+        plain = os.path.join(work, "plain.bin")
+        with open(plain, "wb") as f:
+            f.write(os.urandom(file_size))
+        encrypted = os.path.join(work, "plain.bin.encrypted")
+        decrypted = os.path.join(work, "decrypted.bin")
+
+        encrypt_time = measure(lambda: manager.encrypt_file(plain, encrypted), repeat, 0)
+        decrypt_time = measure(lambda: manager.decrypt_file(encrypted, decrypted), repeat, 0)
+        results = [
+            BenchmarkResult("files.encrypt_file", file_size / encrypt_time / 2 ** 20, "MB/s", True),
+            BenchmarkResult("files.decrypt_file", file_size / decrypt_time / 2 ** 20, "MB/s", True),
+        ]
+
+        # Файловый режим каждого движка: у ChaCha20 и Triple DES свой потоковый шифр
+        for algorithm in EncryptorFactory.get_available_algorithms():
+            engine = EncryptorFactory.create_encryptor(algorithm, file_mode=True)
+            engine.use_key(os.urandom(32), os.urandom(16))
+            encrypt_time = measure(lambda: engine.encrypt_file(plain, encrypted), repeat, 0)
+            decrypt_time = measure(lambda: engine.decrypt_file(encrypted, decrypted), repeat, 0)
+            results += [
+                BenchmarkResult(f"files.{algorithm}.encrypt_file", file_size / encrypt_time / 2 ** 20, "MB/s", True),
+                BenchmarkResult(f"files.{algorithm}.decrypt_file", file_size / decrypt_time / 2 ** 20, "MB/s", True),
+            ]
+
+        for label, files, size in (("small", 200 if quick else 2000, 4 * 1024), ("large", 8, file_size // 8)):
+            tree = os.path.join(work, f"tree_{label}")
+            total = _make_tree(tree, files, size)
+            archive = tree + ".encrypted"
+            seconds = measure(lambda: manager.encrypt_folder(tree, archive), repeat, 0)
+            results.append(BenchmarkResult(f"files.encrypt_folder.{label}", total / seconds / 2 ** 20, "MB/s", True))
+        return results
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,30 @@
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from encryption_settings import EncryptionSettings
+from typing import List
+import os
+import kdf
+from .core import BenchmarkResult, measure
+
+
+def run(quick: bool = False) -> List[BenchmarkResult]:
+    """Время одного выведения ключа с параметрами по умолчанию"""
+    settings = EncryptionSettings.DEFAULT_SETTINGS
+    salt = os.urandom(settings["salt_size"])
+    repeat = 1 if quick else 3
+    results = []
+    for name, algorithm in EncryptionSettings.HASH_ALGORITHMS.items():
+        def derive():
+            PBKDF2HMAC(
+                algorithm=algorithm(), length=settings["key_length"],
+                salt=salt, iterations=settings["iterations"],
+            ).derive(b"benchmark")
+
+        results.append(BenchmarkResult(f"kdf.pbkdf2.{name}", measure(derive, repeat, 0), "s"))
+
+    for name in kdf.KDF_NAMES:
+        if name == "PBKDF2":
+            continue
+        params = kdf.params_from_settings(dict(settings, kdf=name))
+        seconds = measure(lambda: kdf.derive("benchmark", salt, params), repeat, 0)
+        results.append(BenchmarkResult(f"kdf.{name.lower()}", seconds, "s"))
+    return results
@@ -0,0 +1,76 @@
+from database.db_manager import DatabaseManager
+from typing import List
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from .core import BenchmarkResult
+
+ROW_COUNTS = (0, 10000, 100000)
+QUICK_ROW_COUNTS = (0, 10000)
+
+# Запускается в отдельном процессе: холодный импорт, окно и первая страница списка
+CHILD = """
+import time
+started_at = time.perf_counter()
+import json, sys
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
+app = QApplication(sys.argv)
+from gui.main_window import MainWindow
+from instrumentation import instrumentation
+window = MainWindow(started_at=started_at)
+window.show()
+
+def check():
+    spans = instrumentation.snapshot()
+    if "startup.first_window" in spans and "startup.sidebar" in spans:
+        print(json.dumps({name: spans[name]["max_ms"] / 1000 for name in spans if name.startswith("startup.")}))
+        app.quit()
+
+timer = QTimer()
+timer.timeout.connect(check)
+timer.start(5)
+QTimer.singleShot(60000, app.quit)
+app.exec()
+"""
+
+
+def _launch(work: str) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=work, env=env, capture_output=True, text=True, timeout=120
+    ).stdout
+    lines = output.strip().splitlines()
+    return json.loads(lines[-1]) if lines else {}
+
+
+def run(quick: bool = False) -> List[BenchmarkResult]:
+    """Время до первого окна и до первой страницы списка при разном числе записей"""
+    if importlib.util.find_spec("PyQt6") is None:
+        print("PyQt6 не установлен, замеры запуска пропущены", file=sys.stderr)
+        return []
+    work = tempfile.mkdtemp(prefix="passwords-bench-")
+    try:
+        db_manager = DatabaseManager(os.path.join(work, "passwords.db"))
+        results = []
+        current = 0
+        for count in QUICK_ROW_COUNTS if quick else ROW_COUNTS:
+            if count > current:
+                db_manager.save_encrypted_data_many(
+                    (f"entry{index}", b"\0" * 64, b"\0" * 16, "Fernet") for index in range(current, count)
+                )
+                current = count
+            runs = [_launch(work) for _ in range(2 if quick else 3)]
+            for name in ("startup.first_window", "startup.sidebar"):
+                times = [result[name] for result in runs if name in result]
+                if times:
+                    results.append(BenchmarkResult(f"{name.replace('startup.', f'startup.{count}.')}", min(times), "s"))
+        return results
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
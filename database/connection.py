@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+
+class ConnectionPool:
+    """Долгоживущие соединения SQLite: по одному на поток
+
+    Соединения открываются в режиме WAL с busy_timeout, поэтому фоновые
+    потоки читают, пока другой поток записывает. Транзакции задаются явно
+    через transaction(), вне его каждое выражение выполняется в autocommit.
+    """
+    BUSY_TIMEOUT_MS = 5000
+    CACHED_STATEMENTS = 256
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока, открывая его при первом вызове"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=self.CACHED_STATEMENTS,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Открывает транзакцию записи; вложенные вызовы становятся точками сохранения"""
+        conn = self.connection()
+        depth = self._local.depth
+        savepoint = f"sp_{depth}"
+        if depth == 0:
+            self._local.pending = []
+        pending_mark = len(self._local.pending)
+        conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {savepoint}")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            # Действия после коммита, запланированные внутри отмененной части, не нужны
+            del self._local.pending[pending_mark:]
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            conn.execute("COMMIT" if depth == 0 else f"RELEASE {savepoint}")
+        finally:
+            self._local.depth = depth
+
+        if depth == 0:
+            pending, self._local.pending = self._local.pending, []
+            for callback in pending:
+                callback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Вызывает callback после коммита текущей транзакции или сразу, если ее нет"""
+        self.connection()
+        if self._local.depth == 0:
+            callback()
+        else:
+            self._local.pending.append(callback)
+
+    def close_all(self) -> None:
+        """Закрывает соединения всех потоков (при завершении приложения)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Возвращает общий для процесса пул соединений к файлу базы"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def close_all_pools() -> None:
+    """Закрывает все соединения процесса"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -1,117 +1,380 @@
-import sqlite3
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import json
 import os
+from instrumentation import instrumentation
+from . import events
+from .connection import get_pool
+from .schema import ensure_schema
 
+# Курсор постраничного списка: (created_at, type, id) последней выданной строки
+EntryCursor = Tuple[str, str, int]
+
+@instrumentation.instrument("db.unit_of_work", ("flush",))
+class UnitOfWork:
+    """Буфер записей, которые сохраняются пакетами через *_many-методы
+    
+    Транзакция открывается только на время сброса пакета, поэтому долгая
+    работа между add_*() не блокирует других писателей.
+    """
+
+    def __init__(self, db_manager: "DatabaseManager", commit_interval: int):
+        self.db_manager = db_manager
+        self.commit_interval = commit_interval
+        self.inserted_ids: Dict[str, List[int]] = {'text': [], 'file': []}
+        self._data_rows: List[tuple] = []
+        self._file_rows: List[tuple] = []
+
+    def add_data(self, name: str, encrypted_data: bytes, salt: bytes, algorithm: str,
+                 wrapped_key: Optional[bytes] = None, kdf_params: Optional[dict] = None,
+                 cipher_params: Optional[dict] = None) -> None:
+        """Добавляет текстовую запись в буфер"""
+        self._data_rows.append((name, encrypted_data, salt, algorithm, wrapped_key, kdf_params, cipher_params))
+        if len(self._data_rows) >= self.commit_interval:
+            self.flush()
+
+    def add_file(self, original_path: str, encrypted_path: str, salt: bytes, algorithm: str, is_folder: bool,
+                 wrapped_key: Optional[bytes] = None, manifest: Optional[bytes] = None,
+                 kdf_params: Optional[dict] = None, cipher_params: Optional[dict] = None) -> None:
+        """Добавляет запись о файле в буфер"""
+        self._file_rows.append(
+            (original_path, encrypted_path, salt, algorithm, is_folder, wrapped_key, manifest, kdf_params, cipher_params)
+        )
+        if len(self._file_rows) >= self.commit_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Сохраняет накопленные записи"""
+        data_rows, self._data_rows = self._data_rows, []
+        file_rows, self._file_rows = self._file_rows, []
+        if data_rows:
+            self.inserted_ids['text'] += self.db_manager.save_encrypted_data_many(data_rows, self.commit_interval)
+        if file_rows:
+            self.inserted_ids['file'] += self.db_manager.save_encrypted_files_many(file_rows, self.commit_interval)
+
+    def discard(self) -> None:
+        """Отбрасывает еще не сохраненные записи"""
+        self._data_rows = []
+        self._file_rows = []
+
+
+@instrumentation.instrument("db", exclude=("unit_of_work", "subscribe", "unsubscribe"))
 class DatabaseManager:
+    # Сколько строк пакетной вставки фиксируется одной транзакцией
+    BULK_COMMIT_INTERVAL = 5000
+
     def __init__(self, db_path: str = "passwords.db"):
         self.db_path = db_path
-        self._create_tables()
-
-    def _create_tables(self) -> None:
-        """Создает необходимые таблицы в базе данных"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Таблица для хранения зашифрованных текстовых данных
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS encrypted_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    data BLOB NOT NULL,
-                    salt BLOB NOT NULL,
-                    algorithm TEXT NOT NULL,
-                    type TEXT DEFAULT 'text',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица для хранения информации о зашифрованных файлах
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS encrypted_files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    original_path TEXT NOT NULL,
-                    encrypted_path TEXT NOT NULL,
-                    salt BLOB NOT NULL,
-                    algorithm TEXT NOT NULL,
-                    is_folder BOOLEAN NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица для пользовательских настроек
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
-            ''')
-            
-            conn.commit()
+        self.pool = get_pool(db_path)
+        ensure_schema(db_path)
 
-    def save_encrypted_data(self, name: str, encrypted_data: bytes, salt: bytes, algorithm: str) -> None:
-        """Сохраняет зашифрованные текстовые данные в базу"""
-        with sqlite3.connect(self.db_path) as conn:
+    def save_encrypted_data(self, name: str, encrypted_data: bytes, salt: bytes, algorithm: str,
+                            wrapped_key: Optional[bytes] = None, kdf_params: Optional[dict] = None,
+                            cipher_params: Optional[dict] = None) -> int:
+        """Сохраняет зашифрованные текстовые данные в базу и возвращает ID записи
+        
+        kdf_params — параметры KDF, которыми выведен ключ записи (None для ключей хранилища),
+        cipher_params — параметры шифра, которым записаны данные.
+        """
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                'INSERT INTO encrypted_data (name, data, salt, algorithm, type) VALUES (?, ?, ?, ?, ?)',
-                (name, encrypted_data, salt, algorithm, 'text')
+                'INSERT INTO encrypted_data (name, data, salt, algorithm, type, kdf_params, cipher_params) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, encrypted_data, salt, algorithm, 'text', self._dump_params(kdf_params), self._dump_params(cipher_params))
             )
-            conn.commit()
+            data_id = cursor.lastrowid
+            if wrapped_key is not None:
+                cursor.execute(
+                    'INSERT INTO entry_keys (entry_type, entry_id, wrapped_key) VALUES (?, ?, ?)',
+                    ('text', data_id, wrapped_key)
+                )
+            self._notify(events.INSERT, 'text', [data_id])
+            return data_id
 
-    def save_encrypted_file(self, original_path: str, encrypted_path: str, salt: bytes, algorithm: str, is_folder: bool) -> None:
-        """Сохраняет информацию о зашифрованном файле в базу"""
-        with sqlite3.connect(self.db_path) as conn:
+    def save_encrypted_file(self, original_path: str, encrypted_path: str, salt: bytes, algorithm: str, is_folder: bool,
+                            wrapped_key: Optional[bytes] = None, kdf_params: Optional[dict] = None,
+                            cipher_params: Optional[dict] = None) -> int:
+        """Сохраняет информацию о зашифрованном файле в базу и возвращает ID записи"""
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                'INSERT INTO encrypted_files (original_path, encrypted_path, salt, algorithm, is_folder) VALUES (?, ?, ?, ?, ?)',
-                (original_path, encrypted_path, salt, algorithm, is_folder)
+                'INSERT INTO encrypted_files (original_path, encrypted_path, salt, algorithm, is_folder, kdf_params, cipher_params) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (original_path, encrypted_path, salt, algorithm, is_folder,
+                 self._dump_params(kdf_params), self._dump_params(cipher_params))
             )
-            conn.commit()
+            file_id = cursor.lastrowid
+            if wrapped_key is not None:
+                cursor.execute(
+                    'INSERT INTO entry_keys (entry_type, entry_id, wrapped_key) VALUES (?, ?, ?)',
+                    ('file', file_id, wrapped_key)
+                )
+            self._notify(events.INSERT, 'file', [file_id])
+            return file_id
+
+    def save_encrypted_data_many(self, rows: Iterable[Sequence], commit_interval: Optional[int] = None) -> List[int]:
+        """Сохраняет много текстовых записей пакетами и возвращает их ID
+        
+        Строка: (name, encrypted_data, salt, algorithm[, wrapped_key[, kdf_params[, cipher_params]]]).
+        Каждые commit_interval строк фиксируются одной транзакцией.
+        """
+        return self._insert_many(
+            'text',
+            'INSERT INTO encrypted_data (name, data, salt, algorithm, type, kdf_params, cipher_params) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    tuple(row[:4]) + (
+                        'text',
+                        self._dump_params(row[5] if len(row) > 5 else None),
+                        self._dump_params(row[6] if len(row) > 6 else None)
+                    ),
+                    row[4] if len(row) > 4 else None,
+                    None
+                )
+                for row in rows
+            ],
+            commit_interval
+        )
+
+    def save_encrypted_files_many(self, rows: Iterable[Sequence], commit_interval: Optional[int] = None) -> List[int]:
+        """Сохраняет много записей о файлах пакетами и возвращает их ID
+        
+        Строка: (original_path, encrypted_path, salt, algorithm, is_folder[, wrapped_key[, manifest[, kdf_params[, cipher_params]]]]),
+        manifest — зашифрованный манифест папки.
+        """
+        return self._insert_many(
+            'file',
+            'INSERT INTO encrypted_files (original_path, encrypted_path, salt, algorithm, is_folder, kdf_params, cipher_params) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    tuple(row[:5]) + (
+                        self._dump_params(row[7] if len(row) > 7 else None),
+                        self._dump_params(row[8] if len(row) > 8 else None)
+                    ),
+                    row[5] if len(row) > 5 else None,
+                    row[6] if len(row) > 6 else None
+                )
+                for row in rows
+            ],
+            commit_interval
+        )
+
+    def _insert_many(self, data_type: str, query: str, rows: List[tuple], commit_interval: Optional[int]) -> List[int]:
+        commit_interval = commit_interval or self.BULK_COMMIT_INTERVAL
+        inserted_ids = []
+        for start in range(0, len(rows), commit_interval):
+            batch = rows[start:start + commit_interval]
+            with self.pool.transaction() as conn:
+                conn.executemany(query, [values for values, _, _ in batch])
+                # BEGIN IMMEDIATE держит блокировку записи, поэтому AUTOINCREMENT
+                # выдал пакету подряд идущие ID, последний из которых известен
+                last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                ids = list(range(last_id - len(batch) + 1, last_id + 1))
+                wrapped_keys = [
+                    (data_type, row_id, wrapped_key)
+                    for row_id, (_, wrapped_key, _) in zip(ids, batch)
+                    if wrapped_key is not None
+                ]
+                if wrapped_keys:
+                    conn.executemany(
+                        'INSERT INTO entry_keys (entry_type, entry_id, wrapped_key) VALUES (?, ?, ?)',
+                        wrapped_keys
+                    )
+                manifests = [
+                    (row_id, manifest)
+                    for row_id, (_, _, manifest) in zip(ids, batch)
+                    if manifest is not None
+                ]
+                if manifests:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO folder_manifests (file_id, manifest) VALUES (?, ?)',
+                        manifests
+                    )
+                self._notify(events.INSERT, data_type, ids)
+            inserted_ids.extend(ids)
+        return inserted_ids
+
+    @contextmanager
+    def unit_of_work(self, commit_interval: Optional[int] = None) -> Iterator[UnitOfWork]:
+        """Собирает записи и сохраняет их пакетами при выходе из блока
+        
+        При исключении еще не сохраненные записи отбрасываются.
+        """
+        uow = UnitOfWork(self, commit_interval or self.BULK_COMMIT_INTERVAL)
+        try:
+            yield uow
+        except BaseException:
+            uow.discard()
+            raise
+        uow.flush()
 
     def get_all_encrypted_data(self) -> List[Tuple[int, str, str, str]]:
         """Возвращает список всех зашифрованных данных"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Получаем текстовые данные
-            cursor.execute('SELECT id, name, algorithm, type FROM encrypted_data ORDER BY created_at DESC')
-            text_data = cursor.fetchall()
-            
-            # Получаем файлы
-            cursor.execute('SELECT id, original_path, algorithm, "file" as type FROM encrypted_files ORDER BY created_at DESC')
-            file_data = cursor.fetchall()
-            
-            # Объединяем результаты
-            return text_data + file_data
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        # Получаем текстовые данные
+        cursor.execute('SELECT id, name, algorithm, type FROM encrypted_data ORDER BY created_at DESC')
+        text_data = cursor.fetchall()
+        
+        # Получаем файлы
+        cursor.execute('SELECT id, original_path, algorithm, "file" as type FROM encrypted_files ORDER BY created_at DESC')
+        file_data = cursor.fetchall()
+        
+        # Объединяем результаты
+        return text_data + file_data
+
+    def list_entries(self, limit: int = 200, cursor: Optional[EntryCursor] = None,
+                     data_type: Optional[str] = None, algorithm: Optional[str] = None
+                     ) -> Tuple[List[Tuple[int, str, str, str, str]], Optional[EntryCursor]]:
+        """Возвращает страницу записей от новых к старым и курсор следующей страницы
+        
+        Строки: (id, name, algorithm, type, created_at). Порядок — (created_at, type, id)
+        по убыванию, поэтому курсор однозначен даже при одинаковом времени создания.
+        Следующий курсор равен None, если записей больше нет.
+        """
+        branches = []
+        params = []
+        sources = (
+            ('text', "SELECT id, name, algorithm, 'text' AS type, created_at FROM encrypted_data"),
+            ('file', "SELECT id, original_path, algorithm, 'file' AS type, created_at FROM encrypted_files"),
+        )
+        for branch_type, select in sources:
+            if data_type is not None and data_type != branch_type:
+                continue
+            conditions = []
+            if algorithm is not None:
+                conditions.append('algorithm = ?')
+                params.append(algorithm)
+            if cursor is not None:
+                created_at, cursor_type, cursor_id = cursor
+                # Тип постоянен внутри ветки, поэтому условие сводится к диапазону индекса
+                if branch_type < cursor_type:
+                    conditions.append('created_at <= ?')
+                    params.append(created_at)
+                elif branch_type == cursor_type:
+                    conditions.append('(created_at, id) < (?, ?)')
+                    params.extend((created_at, cursor_id))
+                else:
+                    conditions.append('created_at < ?')
+                    params.append(created_at)
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+            branches.append(f'SELECT * FROM ({select}{where} ORDER BY created_at DESC, id DESC LIMIT ?)')
+            params.append(limit)
+        
+        if not branches:
+            return [], None
+        query = ' UNION ALL '.join(branches) + ' ORDER BY created_at DESC, type DESC, id DESC LIMIT ?'
+        params.append(limit)
+        
+        rows = self.pool.connection().execute(query, params).fetchall()
+        if len(rows) < limit:
+            return rows, None
+        last_id, _, _, last_type, last_created_at = rows[-1]
+        return rows, (last_created_at, last_type, last_id)
+
+    def get_entries_by_ids(self, data_type: str, ids: Iterable[int]) -> List[Tuple[int, str, str, str, str]]:
+        """Возвращает строки списка (как list_entries) для указанных ID"""
+        ids = list(ids)
+        if not ids:
+            return []
+        placeholders = ', '.join('?' * len(ids))
+        if data_type == 'text':
+            query = f"SELECT id, name, algorithm, 'text', created_at FROM encrypted_data WHERE id IN ({placeholders})"
+        else:
+            query = f"SELECT id, original_path, algorithm, 'file', created_at FROM encrypted_files WHERE id IN ({placeholders})"
+        return self.pool.connection().execute(query, ids).fetchall()
+
+    def subscribe(self, callback: Callable[[events.ChangeEvent], None]) -> None:
+        """Подписывает callback на вставку, изменение и удаление записей этой базы"""
+        events.subscribe(self.db_path, callback)
+
+    def unsubscribe(self, callback: Callable[[events.ChangeEvent], None]) -> None:
+        events.unsubscribe(self.db_path, callback)
+
+    def _notify(self, action: str, data_type: str, ids: Iterable[int]) -> None:
+        """Публикует событие после коммита текущей транзакции"""
+        event = events.ChangeEvent(action, data_type, tuple(ids))
+        self.pool.after_commit(lambda: events.publish(self.db_path, event))
 
     def get_encrypted_data_by_id(self, data_id: int, data_type: str = 'text') -> Tuple[bytes, bytes, str]:
         """Возвращает зашифрованные данные по ID и типу"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            if data_type == 'text':
-                cursor.execute('SELECT data, salt, algorithm FROM encrypted_data WHERE id = ?', (data_id,))
-            else:
-                cursor.execute('SELECT encrypted_path, salt, algorithm FROM encrypted_files WHERE id = ?', (data_id,))
-            result = cursor.fetchone()
-            if result:
-                return result
-            raise ValueError(f"Данные с ID {data_id} не найдены")
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        if data_type == 'text':
+            cursor.execute('SELECT data, salt, algorithm FROM encrypted_data WHERE id = ?', (data_id,))
+        else:
+            cursor.execute('SELECT encrypted_path, salt, algorithm FROM encrypted_files WHERE id = ?', (data_id,))
+        result = cursor.fetchone()
+        if result:
+            return result
+        raise ValueError(f"Данные с ID {data_id} не найдены")
+
+    def get_kdf_params(self, data_id: int, data_type: str = 'text') -> Optional[dict]:
+        """Возвращает параметры KDF, сохраненные с записью, или None"""
+        return self._get_params('kdf_params', data_id, data_type)
+
+    def get_cipher_params(self, data_id: int, data_type: str = 'text') -> Optional[dict]:
+        """Возвращает параметры шифра, сохраненные с записью, или None"""
+        return self._get_params('cipher_params', data_id, data_type)
+
+    def _get_params(self, column: str, data_id: int, data_type: str) -> Optional[dict]:
+        table = 'encrypted_data' if data_type == 'text' else 'encrypted_files'
+        row = self.pool.connection().execute(
+            f'SELECT {column} FROM {table} WHERE id = ?', (data_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    @staticmethod
+    def _dump_params(params: Optional[dict]) -> Optional[str]:
+        return json.dumps(params) if params is not None else None
 
     def get_file_info(self, file_id: int) -> Tuple[str, str, bytes, str, bool]:
         """Возвращает информацию о зашифрованном файле"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT original_path, encrypted_path, salt, algorithm, is_folder FROM encrypted_files WHERE id = ?',
-                (file_id,)
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT original_path, encrypted_path, salt, algorithm, is_folder FROM encrypted_files WHERE id = ?',
+            (file_id,)
+        )
+        result = cursor.fetchone()
+        if result:
+            return result
+        raise ValueError(f"Файл с ID {file_id} не найден")
+
+    def find_folder_entry(self, original_path: str
+                          ) -> Optional[Tuple[int, str, bytes, str, Optional[bytes], Optional[bytes],
+                                              Optional[dict], Optional[dict]]]:
+        """Возвращает последнюю запись о папке с этим путем
+
+        (id, encrypted_path, salt, algorithm, wrapped_key, manifest, kdf_params, cipher_params) или None.
+        """
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''SELECT f.id, f.encrypted_path, f.salt, f.algorithm, k.wrapped_key, m.manifest, f.kdf_params,
+                      f.cipher_params
+               FROM encrypted_files f
+               LEFT JOIN entry_keys k ON k.entry_type = 'file' AND k.entry_id = f.id
+               LEFT JOIN folder_manifests m ON m.file_id = f.id
+               WHERE f.original_path = ? AND f.is_folder
+               ORDER BY f.id DESC LIMIT 1''',
+            (original_path,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[:6] + tuple(json.loads(params) if params else None for params in row[6:])
+
+    def save_folder_manifest(self, file_id: int, manifest: bytes) -> None:
+        """Сохраняет зашифрованный манифест папки"""
+        with self.pool.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO folder_manifests (file_id, manifest) VALUES (?, ?)',
+                (file_id, manifest)
             )
-            result = cursor.fetchone()
-            if result:
-                return result
-            raise ValueError(f"Файл с ID {file_id} не найден")
 
     def delete_encrypted_data(self, data_id: int, data_type: str = 'text') -> None:
         """Удаляет зашифрованные данные по ID и типу"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             if data_type == 'text':
                 cursor.execute('DELETE FROM encrypted_data WHERE id = ?', (data_id,))
@@ -122,22 +385,170 @@ class DatabaseManager:
                 if result and os.path.exists(result[0]):
                     os.remove(result[0])
                 cursor.execute('DELETE FROM encrypted_files WHERE id = ?', (data_id,))
-            conn.commit()
+            cursor.execute(
+                'DELETE FROM entry_keys WHERE entry_type = ? AND entry_id = ?',
+                ('text' if data_type == 'text' else 'file', data_id)
+            )
+            if data_type != 'text':
+                cursor.execute('DELETE FROM folder_manifests WHERE file_id = ?', (data_id,))
+            self._notify(events.DELETE, 'text' if data_type == 'text' else 'file', [data_id])
 
     def save_setting(self, key: str, value: str) -> None:
         """Сохраняет настройку"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
                 (key, value)
             )
-            conn.commit()
 
     def get_setting(self, key: str, default: str = None) -> str:
         """Получает значение настройки"""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
+        result = cursor.fetchone()
+        return result[0] if result else default 
+
+    def get_vault(self) -> Optional[Tuple[bytes, str, bytes]]:
+        """Возвращает соль, параметры KDF и обернутый мастер-ключ хранилища"""
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT salt, kdf_params, wrapped_master_key FROM vault WHERE id = 1')
+        return cursor.fetchone()
+
+    def save_vault(self, salt: bytes, kdf_params: str, wrapped_master_key: bytes) -> None:
+        """Сохраняет мастер-ключ хранилища"""
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            result = cursor.fetchone()
-            return result[0] if result else default 
\ No newline at end of file
+            cursor.execute(
+                '''INSERT OR REPLACE INTO vault (id, salt, kdf_params, wrapped_master_key, updated_at)
+                   VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                (salt, kdf_params, wrapped_master_key)
+            )
+
+    def get_entry_key(self, entry_type: str, entry_id: int) -> Optional[bytes]:
+        """Возвращает обернутый ключ записи хранилища или None для обычной записи"""
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT wrapped_key FROM entry_keys WHERE entry_type = ? AND entry_id = ?',
+            (entry_type, entry_id)
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def create_rekey_job(self, target: dict) -> int:
+        """Создает задачу перешифрования записей под целевые параметры"""
+        with self.pool.transaction() as conn:
+            cursor = conn.execute('INSERT INTO rekey_jobs (target) VALUES (?)', (json.dumps(target),))
+            return cursor.lastrowid
+
+    def get_active_rekey_job(self) -> Optional[Tuple[int, dict, str, int, int, int, int]]:
+        """Возвращает незавершенную задачу перешифрования или None
+
+        (id, target, phase, last_id, migrated, skipped, failed).
+        """
+        row = self.pool.connection().execute(
+            '''SELECT id, target, phase, last_id, migrated, skipped, failed FROM rekey_jobs
+               WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1'''
+        ).fetchone()
+        if row is None:
+            return None
+        return (row[0], json.loads(row[1])) + tuple(row[2:])
+
+    def count_rekey_rows(self) -> int:
+        """Сколько всего записей просматривает задача перешифрования"""
+        return self.pool.connection().execute(
+            'SELECT (SELECT COUNT(*) FROM encrypted_data) + (SELECT COUNT(*) FROM encrypted_files)'
+        ).fetchone()[0]
+
+    def get_rekey_rows(self, data_type: str, after_id: int, limit: int) -> List[tuple]:
+        """Следующие записи для перешифрования в порядке ID
+
+        Тексты: (id, data, salt, algorithm, kdf_params, cipher_params, wrapped_key),
+        файлы: (id, encrypted_path, salt, algorithm, kdf_params, cipher_params, wrapped_key, is_folder).
+        """
+        if data_type == 'text':
+            query = '''SELECT d.id, d.data, d.salt, d.algorithm, d.kdf_params, d.cipher_params, k.wrapped_key
+                       FROM encrypted_data d
+                       LEFT JOIN entry_keys k ON k.entry_type = 'text' AND k.entry_id = d.id
+                       WHERE d.id > ? ORDER BY d.id LIMIT ?'''
+        else:
+            query = '''SELECT f.id, f.encrypted_path, f.salt, f.algorithm, f.kdf_params, f.cipher_params,
+                              k.wrapped_key, f.is_folder
+                       FROM encrypted_files f
+                       LEFT JOIN entry_keys k ON k.entry_type = 'file' AND k.entry_id = f.id
+                       WHERE f.id > ? ORDER BY f.id LIMIT ?'''
+        rows = self.pool.connection().execute(query, (after_id, limit)).fetchall()
+        return [
+            row[:4] + (json.loads(row[4]) if row[4] else None, json.loads(row[5]) if row[5] else None) + row[6:]
+            for row in rows
+        ]
+
+    def save_rekey_batch(self, job_id: int, data_type: str, last_id: int, counts: Tuple[int, int, int],
+                         updates: List[tuple], pending: Sequence[Tuple[str, str]] = ()) -> None:
+        """Сохраняет перешифрованные записи и контрольную точку задачи одной транзакцией
+
+        updates для текстов: (id, data, salt, algorithm, kdf_params, cipher_params, wrapped_key),
+        для файлов: (id, salt, algorithm, kdf_params, cipher_params, wrapped_key, manifest).
+        pending — пары (временный файл, файл записи), которые нужно поменять местами
+        после коммита; при сбое до замены они заменяются при возобновлении задачи.
+        counts — (перешифровано, пропущено, с ошибкой) с начала задачи.
+        """
+        with self.pool.transaction() as conn:
+            for update in updates:
+                if data_type == 'text':
+                    data_id, data, salt, algorithm, kdf_params, cipher_params, wrapped_key = update
+                    conn.execute(
+                        '''UPDATE encrypted_data SET data = ?, salt = ?, algorithm = ?, kdf_params = ?, cipher_params = ?
+                           WHERE id = ?''',
+                        (data, salt, algorithm, self._dump_params(kdf_params), self._dump_params(cipher_params), data_id)
+                    )
+                else:
+                    data_id, salt, algorithm, kdf_params, cipher_params, wrapped_key, manifest = update
+                    conn.execute(
+                        '''UPDATE encrypted_files SET salt = ?, algorithm = ?, kdf_params = ?, cipher_params = ?
+                           WHERE id = ?''',
+                        (salt, algorithm, self._dump_params(kdf_params), self._dump_params(cipher_params), data_id)
+                    )
+                    if manifest is not None:
+                        conn.execute(
+                            'INSERT OR REPLACE INTO folder_manifests (file_id, manifest) VALUES (?, ?)',
+                            (data_id, manifest)
+                        )
+                if wrapped_key is not None:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO entry_keys (entry_type, entry_id, wrapped_key) VALUES (?, ?, ?)',
+                        (data_type, data_id, wrapped_key)
+                    )
+            conn.executemany(
+                'INSERT OR REPLACE INTO rekey_pending (job_id, temp_path, target_path) VALUES (?, ?, ?)',
+                [(job_id, temp_path, target_path) for temp_path, target_path in pending]
+            )
+            migrated, skipped, failed = counts
+            conn.execute(
+                '''UPDATE rekey_jobs SET phase = ?, last_id = ?, migrated = ?, skipped = ?, failed = ?
+                   WHERE id = ?''',
+                (data_type, last_id, migrated, skipped, failed, job_id)
+            )
+            if updates:
+                self._notify(events.UPDATE, data_type, [update[0] for update in updates])
+
+    def get_rekey_pending(self, job_id: int) -> List[Tuple[str, str]]:
+        """Замены файлов, записанные в базу, но, возможно, не выполненные"""
+        return self.pool.connection().execute(
+            'SELECT temp_path, target_path FROM rekey_pending WHERE job_id = ?', (job_id,)
+        ).fetchall()
+
+    def clear_rekey_pending(self, job_id: int) -> None:
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM rekey_pending WHERE job_id = ?', (job_id,))
+
+    def finish_rekey_job(self, job_id: int) -> None:
+        """Отмечает задачу перешифрования завершенной"""
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "UPDATE rekey_jobs SET phase = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (job_id,)
+            )
@@ -0,0 +1,51 @@
+import os
+import threading
+import weakref
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+
+class ChangeEvent(NamedTuple):
+    """Изменение записей: action — 'insert', 'update' или 'delete'"""
+    action: str
+    data_type: str
+    ids: Tuple[int, ...]
+
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+_subscribers: Dict[str, List] = {}
+_lock = threading.Lock()
+
+
+def _key(db_path: str) -> str:
+    return db_path if db_path == ":memory:" else os.path.abspath(db_path)
+
+
+def subscribe(db_path: str, callback: Callable[[ChangeEvent], None]) -> None:
+    """Подписывает callback на изменения базы
+
+    Методы объектов хранятся по слабой ссылке и не продлевают жизнь объекта.
+    Callback вызывается в потоке, который закоммитил изменение.
+    """
+    ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+    with _lock:
+        _subscribers.setdefault(_key(db_path), []).append(ref)
+
+
+def unsubscribe(db_path: str, callback: Callable[[ChangeEvent], None]) -> None:
+    with _lock:
+        refs = _subscribers.get(_key(db_path), [])
+        refs[:] = [ref for ref in refs if ref() not in (None, callback)]
+
+
+def publish(db_path: str, event: ChangeEvent) -> None:
+    """Рассылает событие всем подписчикам базы"""
+    with _lock:
+        refs = _subscribers.get(_key(db_path), [])
+        refs[:] = [ref for ref in refs if ref() is not None]
+        callbacks = [ref() for ref in refs]
+    for callback in callbacks:
+        if callback is not None:
+            callback(event)
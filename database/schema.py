@@ -0,0 +1,202 @@
+import json
+import sqlite3
+import threading
+from typing import Callable, List, Set, Tuple, Union
+from .connection import ConnectionPool, get_pool
+
+# Шаг миграции: SQL-выражение или функция, получающая соединение
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def _insert_default_settings(conn: sqlite3.Connection) -> None:
+    """Добавляет настройки шифрования по умолчанию, если их еще нет"""
+    from encryption_settings import EncryptionSettings
+
+    if conn.execute("SELECT COUNT(*) FROM encryption_settings").fetchone()[0] == 0:
+        conn.execute(
+            "INSERT INTO encryption_settings (settings) VALUES (?)",
+            (json.dumps(EncryptionSettings.DEFAULT_SETTINGS),),
+        )
+
+
+def _backfill_kdf_params(conn: sqlite3.Connection) -> None:
+    """Записывает параметры KDF старым записям
+
+    До версии 6 ключ всегда выводился PBKDF2 по текущим настройкам, поэтому
+    старым записям достаются параметры из последней версии настроек.
+    """
+    from encryption_settings import EncryptionSettings
+    import kdf
+
+    row = conn.execute(
+        "SELECT settings FROM encryption_settings ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    settings = {**EncryptionSettings.DEFAULT_SETTINGS, **(json.loads(row[0]) if row else {})}
+    params = json.dumps(kdf.params_from_settings(dict(settings, kdf="PBKDF2")))
+    for table in ("encrypted_data", "encrypted_files"):
+        conn.execute(f"UPDATE {table} SET kdf_params = ? WHERE kdf_params IS NULL", (params,))
+
+
+# Миграции применяются по порядку, номер последней хранится в PRAGMA user_version.
+# Базы, созданные до появления миграций, имеют версию 0: CREATE ... IF NOT EXISTS
+# в первых миграциях для них безопасен.
+MIGRATIONS: List[Tuple[int, List[MigrationStep]]] = [
+    (1, [
+        # Таблица для хранения зашифрованных текстовых данных
+        '''
+        CREATE TABLE IF NOT EXISTS encrypted_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            data BLOB NOT NULL,
+            salt BLOB NOT NULL,
+            algorithm TEXT NOT NULL,
+            type TEXT DEFAULT 'text',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица для хранения информации о зашифрованных файлах
+        '''
+        CREATE TABLE IF NOT EXISTS encrypted_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_path TEXT NOT NULL,
+            encrypted_path TEXT NOT NULL,
+            salt BLOB NOT NULL,
+            algorithm TEXT NOT NULL,
+            is_folder BOOLEAN NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица для пользовательских настроек
+        '''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+        # История настроек шифрования
+        '''
+        CREATE TABLE IF NOT EXISTS encryption_settings
+        (id INTEGER PRIMARY KEY,
+         settings TEXT NOT NULL)
+        ''',
+        _insert_default_settings,
+    ]),
+    (2, [
+        # Индексы для постраничного списка, отсортированного по дате
+        'CREATE INDEX IF NOT EXISTS idx_encrypted_data_created ON encrypted_data (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_encrypted_data_algorithm ON encrypted_data (algorithm, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_encrypted_files_created ON encrypted_files (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_encrypted_files_algorithm ON encrypted_files (algorithm, created_at, id)',
+    ]),
+    (3, [
+        # Хранилище: мастер-ключ, обернутый ключом из мастер-пароля
+        '''
+        CREATE TABLE IF NOT EXISTS vault (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            salt BLOB NOT NULL,
+            kdf_params TEXT NOT NULL,
+            wrapped_master_key BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Ключи записей хранилища, обернутые мастер-ключом
+        '''
+        CREATE TABLE IF NOT EXISTS entry_keys (
+            entry_type TEXT NOT NULL,
+            entry_id INTEGER NOT NULL,
+            wrapped_key BLOB NOT NULL,
+            PRIMARY KEY (entry_type, entry_id)
+        )
+        ''',
+    ]),
+    (4, [
+        # Старые базы копили всю историю настроек, оставляем последние версии
+        'DELETE FROM encryption_settings WHERE id <= (SELECT MAX(id) FROM encryption_settings) - 20',
+    ]),
+    (5, [
+        # Зашифрованные манифесты папок для инкрементального повторного шифрования
+        '''
+        CREATE TABLE IF NOT EXISTS folder_manifests (
+            file_id INTEGER PRIMARY KEY,
+            manifest BLOB NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_encrypted_files_original_path ON encrypted_files (original_path)',
+    ]),
+    (6, [
+        # Параметры KDF каждой записи (JSON), чтобы смена KDF в настройках не ломала старые записи
+        'ALTER TABLE encrypted_data ADD COLUMN kdf_params TEXT',
+        'ALTER TABLE encrypted_files ADD COLUMN kdf_params TEXT',
+        _backfill_kdf_params,
+    ]),
+    (7, [
+        # Параметры шифра каждой записи (JSON). Тексты всегда шифровались Fernet,
+        # у старых файлов параметры остаются пустыми: шифр записан в заголовке файла
+        'ALTER TABLE encrypted_data ADD COLUMN cipher_params TEXT',
+        'ALTER TABLE encrypted_files ADD COLUMN cipher_params TEXT',
+        '''UPDATE encrypted_data SET cipher_params = '{"cipher": "Fernet"}' WHERE cipher_params IS NULL''',
+        # Задачи перешифрования: контрольная точка — фаза (тексты, затем файлы) и последний ID
+        '''
+        CREATE TABLE IF NOT EXISTS rekey_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target TEXT NOT NULL,
+            phase TEXT NOT NULL DEFAULT 'text',
+            last_id INTEGER NOT NULL DEFAULT 0,
+            migrated INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        # Перешифрованные файлы, которые еще нужно поставить на место записанных
+        '''
+        CREATE TABLE IF NOT EXISTS rekey_pending (
+            job_id INTEGER NOT NULL,
+            temp_path TEXT NOT NULL,
+            target_path TEXT NOT NULL,
+            PRIMARY KEY (job_id, target_path)
+        )
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_initialized: Set[ConnectionPool] = set()
+_initialized_lock = threading.Lock()
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Возвращает версию схемы, записанную в базе"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применяет недостающие миграции внутри текущей транзакции и возвращает новую версию"""
+    version = get_schema_version(conn)
+    for migration_version, steps in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+        version = migration_version
+        conn.execute(f"PRAGMA user_version = {version}")
+    return version
+
+
+def ensure_schema(db_path: str) -> None:
+    """Приводит схему базы к текущей версии один раз за время жизни процесса"""
+    pool = get_pool(db_path)
+    with _initialized_lock:
+        if pool in _initialized:
+            return
+        # Сначала проверяем версию без блокировки записи, затем мигрируем под BEGIN IMMEDIATE,
+        # чтобы два процесса не применили одну миграцию дважды
+        if get_schema_version(pool.connection()) < SCHEMA_VERSION:
+            with pool.transaction() as conn:
+                migrate(conn)
+        _initialized.add(pool)
@@ -1,8 +1,30 @@
-from .encryptor_factory import EncryptorFactory
-from .base_encryptor import BaseEncryptor
-from .fernet_encryptor import FernetEncryptor
-#from .twofish_encryptor import TwofishEncryptor
-from .triple_des_encryptor import TripleDESEncryptor
-from .chacha20_encryptor import ChaCha20Encryptor
-
-__all__ = ['EncryptorFactory', 'BaseEncryptor', 'FernetEncryptor', 'TripleDESEncryptor', 'ChaCha20Encryptor']
+# Классы загружаются при первом обращении (PEP 562): импорт пакета не тянет
+# за собой модули всех шифровальщиков и cryptography
+import importlib
+
+_EXPORTS = {
+    'EncryptorFactory': '.encryptor_factory',
+    'BaseEncryptor': '.base_encryptor',
+    'FernetEncryptor': '.fernet_encryptor',
+    #'TwofishEncryptor': '.twofish_encryptor',
+    'TripleDESEncryptor': '.triple_des_encryptor',
+    'ChaCha20Encryptor': '.chacha20_encryptor',
+    'FernetFileEncryptor': '.fernet_encryptor',
+    'TripleDESFileEncryptor': '.triple_des_encryptor',
+    'ChaCha20FileEncryptor': '.chacha20_encryptor',
+}
+
+__all__ = ['EncryptorFactory', 'BaseEncryptor', 'FernetEncryptor', 'TripleDESEncryptor', 'ChaCha20Encryptor',
+           'FernetFileEncryptor', 'TripleDESFileEncryptor', 'ChaCha20FileEncryptor']
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,9 +1,34 @@
 from abc import ABC, abstractmethod
 from database.db_manager import DatabaseManager
+from encryption_settings import EncryptionSettings
+from key_cache import key_cache
+import kdf
+import os
 
 class BaseEncryptor(ABC):
     def __init__(self):
         self.db_manager = DatabaseManager()
+        self.settings = EncryptionSettings(self.db_manager.db_path)
+        self.salt = None
+        # Ключ записи (32 байта): из KDF или из хранилища, на нем же строится файловый режим
+        self.raw_key = None
+        self.kdf_params = None
+
+    def _new_salt(self) -> bytes:
+        return os.urandom(self.settings.get_settings()["salt_size"])
+
+    def _derive_key(self, password: str, length: int, kdf_params: dict = None) -> bytes:
+        """Вычисляет ключ из пароля и self.salt, повторные вызовы берет из кэша
+        
+        Без kdf_params используется KDF из текущих настроек.
+        """
+        if kdf_params is None:
+            kdf_params = self.settings.get_kdf_params(length)
+        self.kdf_params = kdf_params
+        salt = self.salt
+        return key_cache.get_or_derive(
+            salt, kdf_params, password, lambda: kdf.derive(password, salt, kdf_params)
+        )
 
     @abstractmethod
     def generate_key(self, password: str) -> None:
@@ -11,8 +36,13 @@ class BaseEncryptor(ABC):
         pass
 
     @abstractmethod
-    def load_key(self, password: str, salt: bytes) -> None:
-        """Загружает существующий ключ"""
+    def load_key(self, password: str, salt: bytes, kdf_params: dict = None) -> None:
+        """Загружает существующий ключ с параметрами KDF записи"""
+        pass
+
+    @abstractmethod
+    def use_key(self, raw_key: bytes, salt: bytes) -> None:
+        """Использует готовый ключ (например, ключ записи хранилища) без KDF"""
         pass
 
     @abstractmethod
@@ -25,15 +55,27 @@ class BaseEncryptor(ABC):
         """Расшифровывает данные"""
         pass
 
+    @property
+    def cipher_params(self) -> dict:
+        """Параметры шифра, которые сохраняются вместе с записью
+
+        По отметке engine запись открывается тем же движком; записи без нее
+        созданы EncryptionManager (см. EncryptorFactory.create_for_record).
+        """
+        return {"engine": self.algorithm_name, "cipher": self.algorithm_name}
+
     def save_encrypted_data(self, data: str, name: str) -> None:
         """Сохраняет зашифрованные данные в базу данных"""
         encrypted_data = self.encrypt_data(data)
-        self.db_manager.save_encrypted_data(name, encrypted_data, self.salt, self.algorithm_name)
+        self.db_manager.save_encrypted_data(
+            name, encrypted_data, self.salt, self.algorithm_name,
+            kdf_params=self.kdf_params, cipher_params=self.cipher_params
+        )
 
     def load_encrypted_data(self, data_id: int, password: str) -> str:
         """Загружает и расшифровывает данные из базы данных"""
         encrypted_data, salt, algorithm = self.db_manager.get_encrypted_data_by_id(data_id)
-        self.load_key(password, salt)
+        self.load_key(password, salt, self.db_manager.get_kdf_params(data_id))
         return self.decrypt_data(encrypted_data)
 
     @property
@@ -1,14 +1,17 @@
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 import os
 import struct
 from .base_encryptor import BaseEncryptor
+from encryption_manager import FileEncryptionMixin
+from instrumentation import instrumentation
 
+@instrumentation.instrument(
+    "ChaCha20", ("generate_key", "load_key", "encrypt_data", "decrypt_data"),
+    sized=("encrypt_data", "decrypt_data"),
+)
 class ChaCha20Encryptor(BaseEncryptor):
     def __init__(self):
         super().__init__()
-        self.salt = None
         self.key = None
         self.cipher = None
 
@@ -17,25 +20,21 @@ class ChaCha20Encryptor(BaseEncryptor):
         return "ChaCha20"
 
     def generate_key(self, password: str) -> None:
-        self.salt = os.urandom(16)
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.salt,
-            iterations=480000,
-        )
-        self.key = kdf.derive(password.encode())
-        self.cipher = ChaCha20Poly1305(self.key)
+        self.salt = self._new_salt()
+        self._set_key(self._derive_key(password, 32))
+
+    def load_key(self, password: str, salt: bytes, kdf_params: dict = None) -> None:
+        self.salt = salt
+        self._set_key(self._derive_key(password, 32, kdf_params))
 
-    def load_key(self, password: str, salt: bytes) -> None:
+    def use_key(self, raw_key: bytes, salt: bytes) -> None:
         self.salt = salt
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.salt,
-            iterations=480000,
-        )
-        self.key = kdf.derive(password.encode())
+        self.kdf_params = None
+        self._set_key(raw_key[:32])
+
+    def _set_key(self, raw_key: bytes) -> None:
+        self.raw_key = raw_key
+        self.key = raw_key
         self.cipher = ChaCha20Poly1305(self.key)
 
     def encrypt_data(self, data: str) -> bytes:
@@ -58,4 +57,9 @@ class ChaCha20Encryptor(BaseEncryptor):
         
         # Расшифровываем данные
         decrypted_data = self.cipher.decrypt(nonce, ciphertext, None)
-        return decrypted_data.decode() 
\ No newline at end of file
+        return decrypted_data.decode()
+
+
+class ChaCha20FileEncryptor(FileEncryptionMixin, ChaCha20Encryptor):
+    """Файлы ChaCha20: потоки v2 ChaCha20-Poly1305, быстрый шифр без AES-NI"""
+    stream_cipher = "ChaCha20-Poly1305"
@@ -1,16 +1,18 @@
-from typing import Dict, Type
-from .base_encryptor import BaseEncryptor
-from .fernet_encryptor import FernetEncryptor
-from .chacha20_encryptor import ChaCha20Encryptor
-from .triple_des_encryptor import TripleDESEncryptor
-from encryption_manager import EncryptionManager, FileEncryptionManager
+from typing import TYPE_CHECKING, Dict, Optional, Type
+import importlib
+
+if TYPE_CHECKING:
+    from .base_encryptor import BaseEncryptor
+
 
 class EncryptorFactory:
-    _encryptors: Dict[str, Type[BaseEncryptor]] = {
-        "Fernet": FernetEncryptor,
-        "ChaCha20": ChaCha20Encryptor,
-        "Triple DES": TripleDESEncryptor
+    # Имя алгоритма -> (модуль, класс, класс файлового режима); модуль импортируется при первом обращении
+    _encryptors: Dict[str, tuple] = {
+        "Fernet": ("encryption.fernet_encryptor", "FernetEncryptor", "FernetFileEncryptor"),
+        "ChaCha20": ("encryption.chacha20_encryptor", "ChaCha20Encryptor", "ChaCha20FileEncryptor"),
+        "Triple DES": ("encryption.triple_des_encryptor", "TripleDESEncryptor", "TripleDESFileEncryptor")
     }
+    _loaded: Dict[tuple, Type["BaseEncryptor"]] = {}
 
     @classmethod
     def get_available_algorithms(cls) -> list[str]:
@@ -18,8 +20,35 @@ class EncryptorFactory:
         return list(cls._encryptors.keys())
 
     @classmethod
-    def create_encryptor(cls, algorithm_name: str, file_mode: bool = False) -> EncryptionManager:
-        """Создает экземпляр шифровальщика по имени алгоритма"""
+    def get_encryptor_class(cls, algorithm_name: str, file_mode: bool = False) -> Type["BaseEncryptor"]:
+        """Возвращает класс шифровальщика, импортируя его модуль при первом обращении"""
+        if algorithm_name not in cls._encryptors:
+            raise ValueError(f"Неизвестный алгоритм шифрования: {algorithm_name}")
+        encryptor_class = cls._loaded.get((algorithm_name, file_mode))
+        if encryptor_class is None:
+            module_name, class_name, file_class_name = cls._encryptors[algorithm_name]
+            module = importlib.import_module(module_name)
+            encryptor_class = getattr(module, file_class_name if file_mode else class_name)
+            cls._loaded[(algorithm_name, file_mode)] = encryptor_class
+        return encryptor_class
+
+    @classmethod
+    def create_encryptor(cls, algorithm_name: str, file_mode: bool = False) -> "BaseEncryptor":
+        """Создает шифровальщик алгоритма для новой записи"""
+        return cls.get_encryptor_class(algorithm_name, file_mode)()
+
+    @classmethod
+    def create_for_record(cls, algorithm_name: str, cipher_params: Optional[dict], file_mode: bool = False):
+        """Создает шифровальщик, которым записана существующая запись
+
+        Движок берется из отметки engine в cipher_params. Записи без нее созданы,
+        когда все алгоритмы шифровались Fernet, и открываются EncryptionManager.
+        """
         if algorithm_name not in cls._encryptors:
             raise ValueError(f"Неизвестный алгоритм шифрования: {algorithm_name}")
-        return FileEncryptionManager() if file_mode else EncryptionManager() 
\ No newline at end of file
+        engine = (cipher_params or {}).get("engine")
+        if engine is None:
+            from encryption_manager import EncryptionManager, FileEncryptionManager
+
+            return FileEncryptionManager() if file_mode else EncryptionManager()
+        return cls.create_encryptor(engine, file_mode)
@@ -1,14 +1,16 @@
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
-import os
 from .base_encryptor import BaseEncryptor
+from encryption_manager import FileEncryptionMixin
+from instrumentation import instrumentation
 
+@instrumentation.instrument(
+    "Fernet", ("generate_key", "load_key", "encrypt_data", "decrypt_data"),
+    sized=("encrypt_data", "decrypt_data"),
+)
 class FernetEncryptor(BaseEncryptor):
     def __init__(self):
         super().__init__()
-        self.salt = None
         self.key = None
         self.fernet = None
 
@@ -17,28 +19,22 @@ class FernetEncryptor(BaseEncryptor):
         return "Fernet"
 
     def generate_key(self, password: str) -> None:
-        self.salt = os.urandom(16)
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.salt,
-            iterations=480000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        self.key = key
-        self.fernet = Fernet(key)
-
-    def load_key(self, password: str, salt: bytes) -> None:
+        self.salt = self._new_salt()
+        self._set_key(self._derive_key(password, 32))
+
+    def load_key(self, password: str, salt: bytes, kdf_params: dict = None) -> None:
+        self.salt = salt
+        self._set_key(self._derive_key(password, 32, kdf_params))
+
+    def use_key(self, raw_key: bytes, salt: bytes) -> None:
         self.salt = salt
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.salt,
-            iterations=480000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        self.key = key
-        self.fernet = Fernet(key)
+        self.kdf_params = None
+        self._set_key(raw_key[:32])
+
+    def _set_key(self, raw_key: bytes) -> None:
+        self.raw_key = raw_key
+        self.key = base64.urlsafe_b64encode(raw_key)
+        self.fernet = Fernet(self.key)
 
     def encrypt_data(self, data: str) -> bytes:
         if not self.fernet:
@@ -48,4 +44,8 @@ class FernetEncryptor(BaseEncryptor):
     def decrypt_data(self, encrypted_data: bytes) -> str:
         if not self.fernet:
             raise ValueError("Ключ не был инициализирован")
-        return self.fernet.decrypt(encrypted_data).decode() 
\ No newline at end of file
+        return self.fernet.decrypt(encrypted_data).decode()
+
+
+class FernetFileEncryptor(FileEncryptionMixin, FernetEncryptor):
+    """Файлы Fernet: потоки v2 шифром из настроек (AES-GCM или ChaCha20-Poly1305)"""
@@ -1,78 +1,66 @@
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes, padding
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import os
-import struct
 from .base_encryptor import BaseEncryptor
+from encryption_manager import FileEncryptionMixin
+from file_format import TripleDESHMAC
+from instrumentation import instrumentation
 
+@instrumentation.instrument(
+    "TripleDES", ("generate_key", "load_key", "encrypt_data", "decrypt_data"),
+    sized=("encrypt_data", "decrypt_data"),
+)
 class TripleDESEncryptor(BaseEncryptor):
     def __init__(self):
         super().__init__()
-        self.salt = None
         self.key = None
-        self.iv = None
+        self.cipher = None
 
     @property
     def algorithm_name(self) -> str:
         return "Triple DES"
 
     def generate_key(self, password: str) -> None:
-        self.salt = os.urandom(16)
-        self.iv = os.urandom(8)  # Triple DES требует 8-байтовый IV
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=24,  # Triple DES требует 24-байтовый ключ
-            salt=self.salt,
-            iterations=480000,
-        )
-        self.key = kdf.derive(password.encode())
+        self.salt = self._new_salt()
+        self._set_key(self._derive_key(password, 32))
+
+    def load_key(self, password: str, salt: bytes, kdf_params: dict = None) -> None:
+        self.salt = salt
+        self._set_key(self._derive_key(password, 32, kdf_params))
 
-    def load_key(self, password: str, salt: bytes) -> None:
+    def use_key(self, raw_key: bytes, salt: bytes) -> None:
         self.salt = salt
-        self.iv = salt[:8]  # Используем первые 8 байт соли как IV
-        kdf = PBKDF2HMAC(
+        self.kdf_params = None
+        self._set_key(raw_key[:32])
+
+    def _set_key(self, raw_key: bytes) -> None:
+        self.raw_key = raw_key
+        # Ключи 3DES (24 байта) и HMAC (32 байта) выводятся из ключа записи
+        self.key = HKDF(
             algorithm=hashes.SHA256(),
-            length=24,
-            salt=self.salt,
-            iterations=480000,
-        )
-        self.key = kdf.derive(password.encode())
+            length=TripleDESHMAC.KEY_SIZE,
+            salt=None,
+            info=b"passwords text 3DES-HMAC",
+        ).derive(raw_key)
+        self.cipher = TripleDESHMAC(self.key)
 
     def encrypt_data(self, data: str) -> bytes:
-        if not self.key:
+        if not self.cipher:
             raise ValueError("Ключ не был инициализирован")
 
-        # Создаем padder для данных
-        padder = padding.PKCS7(64).padder()
-        padded_data = padder.update(data.encode()) + padder.finalize()
-
-        # Создаем шифр
-        cipher = Cipher(
-            algorithms.TripleDES(self.key),
-            modes.CBC(self.iv)
-        )
-        encryptor = cipher.encryptor()
-
-        # Шифруем данные
-        encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
-        return encrypted_data
+        # IV каждого сообщения выводится из случайного nonce, nonce хранится перед шифртекстом
+        nonce = os.urandom(12)
+        return nonce + self.cipher.encrypt(nonce, data.encode(), None)
 
     def decrypt_data(self, encrypted_data: bytes) -> str:
-        if not self.key:
+        if not self.cipher:
             raise ValueError("Ключ не был инициализирован")
 
-        # Создаем шифр
-        cipher = Cipher(
-            algorithms.TripleDES(self.key),
-            modes.CBC(self.iv)
-        )
-        decryptor = cipher.decryptor()
+        nonce = encrypted_data[:12]
+        ciphertext = encrypted_data[12:]
+        return self.cipher.decrypt(nonce, ciphertext, None).decode()
 
-        # Расшифровываем данные
-        padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
 
-        # Удаляем padding
-        unpadder = padding.PKCS7(64).unpadder()
-        data = unpadder.update(padded_data) + unpadder.finalize()
-        
-        return data.decode() 
\ No newline at end of file
+class TripleDESFileEncryptor(FileEncryptionMixin, TripleDESEncryptor):
+    """Файлы Triple DES: потоки v2 3DES-HMAC (3DES-CFB с HMAC-SHA256)"""
+    stream_cipher = "3DES-HMAC"
@@ -1,15 +1,31 @@
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import io
 import os
+import tarfile
+import tempfile
+import zipfile
 from encryption_settings import EncryptionSettings
+from instrumentation import instrumentation
+from key_cache import key_cache
+import file_format
+import folder_archive
+import kdf
 
+# Сигнатура zip: такие архивы папок создавали прежние версии
+ZIP_SIGNATURE = b"PK\x03\x04"
 
+
+@instrumentation.instrument(
+    "encryption", ("generate_key", "load_key", "encrypt_data", "decrypt_data"),
+    sized=("encrypt_data", "decrypt_data"),
+)
 class EncryptionManager:
     def __init__(self):
         self.salt = None
         self.key = None
+        self.raw_key = None
+        self.kdf_params = None
         self.fernet = None
         self.settings = EncryptionSettings()
 
@@ -17,27 +33,39 @@ class EncryptionManager:
         """Генерирует ключ на основе пароля"""
         settings = self.settings.get_settings()
         self.salt = os.urandom(settings["salt_size"])
-        kdf = PBKDF2HMAC(
-            algorithm=self.settings.get_hash_algorithm(),
-            length=settings["key_length"],
-            salt=self.salt,
-            iterations=settings["iterations"],
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        self.key = key
-        self.fernet = Fernet(key)
+        self._set_key(self._derive_key(password, kdf.params_from_settings(settings)))
 
-    def load_key(self, password: str, salt: bytes) -> None:
-        """Загружает существующий ключ"""
-        settings = self.settings.get_settings()
+    def load_key(self, password: str, salt: bytes, kdf_params: dict = None) -> None:
+        """Загружает существующий ключ
+
+        kdf_params — параметры KDF, сохраненные вместе с записью; без них
+        используются текущие настройки.
+        """
         self.salt = salt
-        kdf = PBKDF2HMAC(
-            algorithm=self.settings.get_hash_algorithm(),
-            length=settings["key_length"],
-            salt=self.salt,
-            iterations=settings["iterations"],
+        self._set_key(self._derive_key(password, kdf_params or self.settings.get_kdf_params()))
+
+    def use_key(self, raw_key: bytes, salt: bytes) -> None:
+        """Использует готовый ключ (например, ключ записи хранилища) без KDF"""
+        self.salt = salt
+        self.kdf_params = None
+        self._set_key(raw_key[:32])
+
+    def _derive_key(self, password: str, kdf_params: dict) -> bytes:
+        """Вычисляет ключ из пароля и соли, повторные вызовы берет из кэша"""
+        self.kdf_params = kdf_params
+        salt = self.salt
+        return key_cache.get_or_derive(
+            salt, kdf_params, password, lambda: kdf.derive(password, salt, kdf_params)
         )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+
+    @property
+    def cipher_params(self) -> dict:
+        """Параметры шифра, которые сохраняются вместе с записью"""
+        return {"cipher": "Fernet"}
+
+    def _set_key(self, raw_key: bytes) -> None:
+        key = base64.urlsafe_b64encode(raw_key)
+        self.raw_key = raw_key
         self.key = key
         self.fernet = Fernet(key)
 
@@ -70,37 +98,75 @@ class EncryptionManager:
         return self.decrypt_data(encrypted_data)
 
 
-class FileEncryptionManager(EncryptionManager):
+@instrumentation.instrument("files", (
+    "encrypt_file", "decrypt_file", "reencrypt_file", "encrypt_folder", "update_folder",
+    "restore_folder", "decrypt_folder",
+))
+class FileEncryptionMixin:
+    """Файловый режим шифровальщика: потоковый формат v2 на ключе записи raw_key
+
+    Подмешивается к шифровальщику, у которого есть salt, raw_key, kdf_params,
+    settings и cipher_params.
+    """
+    # Шифр потоков движка; None — шифр файлов из настроек (file_cipher)
+    stream_cipher = None
+
     def __init__(self):
         super().__init__()
-        self.chunk_size = 64 * 1024  # 64KB chunks for file processing
-
-    def encrypt_file(self, input_path: str, output_path: str = None) -> str:
-        """Шифрует файл и возвращает путь к зашифрованному файлу"""
-        if not self.fernet:
+        # Размер блока и число потоков задает профиль из настроек (см. autotune)
+        settings = self.settings.get_settings()
+        self.file_cipher = self.stream_cipher or settings["file_cipher"]
+        self.chunk_size = settings["file_chunk_size"]
+        self.workers = settings["file_workers"] or os.cpu_count() or 1
+
+    @property
+    def cipher_params(self) -> dict:
+        return dict(super().cipher_params, cipher=self.file_cipher, chunk_size=self.chunk_size)
+
+    def encrypt_file(
+        self, input_path: str, output_path: str = None, progress_callback=None
+    ) -> str:
+        """Шифрует файл в формате v2 и возвращает путь к зашифрованному файлу
+
+        progress_callback(обработано_байт, всего_байт) вызывается после каждого
+        блока; исключение из него прерывает шифрование.
+        """
+        if self.raw_key is None:
             raise ValueError("Ключ не был инициализирован")
 
         if output_path is None:
             output_path = input_path + ".encrypted"
 
-        with open(input_path, "rb") as in_file, open(output_path, "wb") as out_file:
-            # Записываем соль в начало файла
-            out_file.write(self.salt)
-
-            # Читаем и шифруем файл по частям
-            while True:
-                chunk = in_file.read(self.chunk_size)
-                if not chunk:
-                    break
-                encrypted_chunk = self.fernet.encrypt(chunk)
-                out_file.write(len(encrypted_chunk).to_bytes(8, byteorder="big"))
-                out_file.write(encrypted_chunk)
+        total_size = os.path.getsize(input_path)
+        header = self._new_header()
+
+        def report(processed):
+            progress_callback(processed, total_size)
+
+        try:
+            with open(input_path, "rb") as in_file, open(output_path, "wb") as out_file:
+                file_format.encrypt_stream(
+                    in_file, out_file, self.raw_key, header,
+                    report if progress_callback else None,
+                    self.workers,
+                )
+        except BaseException:
+            # Не оставляем недописанный файл после ошибки или отмены
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
 
         return output_path
 
-    def decrypt_file(self, input_path: str, output_path: str = None) -> str:
-        """Расшифровывает файл и возвращает путь к расшифрованному файлу"""
-        if not self.fernet:
+    def decrypt_file(
+        self, input_path: str, output_path: str = None, progress_callback=None
+    ) -> str:
+        """Расшифровывает файл формата v1 или v2 и возвращает путь к результату
+
+        progress_callback(прочитано_байт, всего_байт) вызывается после каждого
+        блока; исключение из него прерывает расшифровку.
+        """
+        if self.raw_key is None:
             raise ValueError("Ключ не был инициализирован")
 
         if output_path is None:
@@ -108,77 +174,298 @@ class FileEncryptionManager(EncryptionManager):
             if output_path == input_path:
                 output_path = input_path + ".decrypted"
 
-        with open(input_path, "rb") as in_file, open(output_path, "wb") as out_file:
-            # Читаем соль
-            salt = in_file.read(16)
+        total_size = os.path.getsize(input_path)
+
+        def report(consumed):
+            progress_callback(consumed, total_size)
+
+        try:
+            with open(input_path, "rb") as in_file, open(output_path, "wb") as out_file:
+                # Формат определяем по сигнатуре заголовка v2
+                is_v2 = in_file.read(len(file_format.MAGIC)) == file_format.MAGIC
+                in_file.seek(0)
+                if is_v2:
+                    file_format.decrypt_stream(
+                        in_file, out_file, self.raw_key,
+                        report if progress_callback else None,
+                        self.workers,
+                    )
+                else:
+                    self._decrypt_v1(in_file, out_file, progress_callback, total_size)
+        except BaseException:
+            # Не оставляем частично расшифрованный файл после ошибки или отмены
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+        return output_path
+
+    def _decrypt_v1(self, in_file, out_file, progress_callback, total_size) -> None:
+        """Расшифровывает старый формат: соль и блоки Fernet с префиксом длины"""
+        fernet = Fernet(base64.urlsafe_b64encode(self.raw_key[:32]))
+        # Пропускаем соль
+        in_file.read(16)
 
-            # Читаем и расшифровываем файл по частям
-            while True:
-                chunk_size_bytes = in_file.read(8)
-                if not chunk_size_bytes:
-                    break
+        while True:
+            chunk_size_bytes = in_file.read(8)
+            if not chunk_size_bytes:
+                break
 
-                chunk_size = int.from_bytes(chunk_size_bytes, byteorder="big")
-                encrypted_chunk = in_file.read(chunk_size)
+            chunk_size = int.from_bytes(chunk_size_bytes, byteorder="big")
+            encrypted_chunk = in_file.read(chunk_size)
 
-                if not encrypted_chunk:
-                    break
+            if not encrypted_chunk:
+                break
 
-                decrypted_chunk = self.fernet.decrypt(encrypted_chunk)
-                out_file.write(decrypted_chunk)
+            decrypted_chunk = fernet.decrypt(encrypted_chunk)
+            out_file.write(decrypted_chunk)
+
+            if progress_callback:
+                progress_callback(in_file.tell(), total_size)
+
+    def open_encrypted(self, path: str) -> file_format.SeekableReader:
+        """Открывает файл v2 как файловый объект только для чтения с seek"""
+        if self.raw_key is None:
+            raise ValueError("Ключ не был инициализирован")
+        if not file_format.is_v2_file(path):
+            raise ValueError("Произвольный доступ поддерживается только для файлов формата v2")
+        in_file = open(path, "rb")
+        try:
+            return file_format.SeekableReader(in_file, self.raw_key, close_file=True)
+        except BaseException:
+            in_file.close()
+            raise
+
+    def decrypt_range(self, path: str, offset: int, length: int) -> bytes:
+        """Расшифровывает только length байт открытого текста начиная с offset"""
+        with self.open_encrypted(path) as reader:
+            reader.seek(offset)
+            return reader.read(length)
+
+    def _new_header(self) -> file_format.StreamHeader:
+        """Заголовок v2 для нового потока с текущими настройками и новой солью файла"""
+        return file_format.build_header(
+            self.file_cipher,
+            self.salt,
+            self.chunk_size,
+            self.kdf_params,
+        )
+
+    def reencrypt_file(
+        self, source: "FileEncryptionMixin", encrypted_path: str, output_path: str, progress_callback=None
+    ) -> str:
+        """Перешифровывает файл или контейнер папки ключом и шифром этого менеджера
+
+        source — менеджер с ключом, которым файл записан сейчас. Открытый текст
+        не попадает на диск: каждый поток расшифровывается и сразу шифруется.
+        Файлы v1 и старые архивы папок переписываются в формат v2.
+        """
+        if self.raw_key is None or source.raw_key is None:
+            raise ValueError("Ключ не был инициализирован")
+
+        total_size = os.path.getsize(encrypted_path)
+
+        def report(processed):
+            progress_callback(processed, total_size)
+
+        try:
+            with open(encrypted_path, "rb") as in_file, open(output_path, "wb") as out_file:
+                if folder_archive.is_folder_archive(encrypted_path):
+                    members = folder_archive.read_manifest(in_file, source.raw_key)
+                    folder_archive.rekey_archive(
+                        in_file, out_file, source.raw_key, self.raw_key, self._new_header, members,
+                        progress_callback, self.workers,
+                    )
+                elif file_format.is_v2_file(encrypted_path):
+                    file_format.encrypt_stream(
+                        file_format.DecryptingReader(in_file, source.raw_key), out_file,
+                        self.raw_key, self._new_header(),
+                        report if progress_callback else None,
+                        self.workers,
+                    )
+                else:
+                    writer = file_format.EncryptingWriter(out_file, self.raw_key, self._new_header())
+                    with writer:
+                        source._decrypt_v1(in_file, writer, progress_callback, total_size)
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
 
         return output_path
 
-    def encrypt_folder(self, folder_path: str, output_path: str = None) -> str:
-        """Шифрует папку, создавая зашифрованный архив"""
-        import tempfile
-        import shutil
-        import os
+    def encrypt_folder(
+        self, folder_path: str, output_path: str = None, progress_callback=None
+    ) -> str:
+        """Шифрует папку в контейнер, где каждый файл зашифрован отдельно
 
-        if not self.fernet:
+        progress_callback(обработано_байт, всего_байт) вызывается после каждого
+        блока; исключение из него прерывает шифрование.
+        """
+        if self.raw_key is None:
             raise ValueError("Ключ не был инициализирован")
 
         if output_path is None:
             output_path = folder_path + ".encrypted"
 
-        # Создаем временный архив
-        temp_archive = tempfile.mktemp(".zip")
-        shutil.make_archive(temp_archive[:-4], "zip", folder_path)
+        try:
+            with open(output_path, "wb") as out_file:
+                folder_archive.write_archive(
+                    folder_path, out_file, self.raw_key, self._new_header,
+                    progress_callback, self.workers,
+                )
+        except BaseException:
+            # Не оставляем недописанный файл после ошибки или отмены
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
 
-        # Шифруем архив
-        encrypted_path = self.encrypt_file(temp_archive, output_path)
+        return output_path
 
-        # Удаляем временный архив
-        os.remove(temp_archive)
+    def update_folder(
+        self, folder_path: str, encrypted_path: str, manifest: bytes = None, progress_callback=None
+    ) -> folder_archive.ArchiveUpdate:
+        """Повторно шифрует папку, дописывая в контейнер только изменения
+
+        manifest — зашифрованный манифест из базы (export_manifest); если он не
+        соответствует контейнеру, манифест читается из самого контейнера. Когда
+        устаревшие данные занимают больше половины контейнера, он переписывается
+        целиком.
+        """
+        if self.raw_key is None:
+            raise ValueError("Ключ не был инициализирован")
 
-        return encrypted_path
+        members = None
+        if manifest is not None:
+            members, archive_size = folder_archive.unpack_manifest(manifest, self.raw_key)
+            if archive_size != os.path.getsize(encrypted_path):
+                members = None
+        if members is None:
+            members = self.list_folder(encrypted_path)
+
+        with open(encrypted_path, "r+b") as archive_file:
+            result = folder_archive.update_archive(
+                folder_path, archive_file, self.raw_key, self._new_header, members,
+                progress_callback, self.workers,
+            )
+
+        if result.archive_size - result.live_bytes > result.live_bytes:
+            self._compact_folder(encrypted_path, result.members)
+        return result
+
+    def _compact_folder(self, encrypted_path: str, members: list) -> None:
+        """Убирает из контейнера устаревшие потоки"""
+        temp_path = encrypted_path + ".tmp"
+        try:
+            with open(encrypted_path, "rb") as archive_file, open(temp_path, "wb") as out_file:
+                folder_archive.compact_archive(
+                    archive_file, out_file, self.raw_key, self._new_header, members
+                )
+            os.replace(temp_path, encrypted_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def export_manifest(self, encrypted_path: str) -> bytes:
+        """Возвращает зашифрованный манифест контейнера для хранения в базе"""
+        members = self.list_folder(encrypted_path)
+        return folder_archive.pack_manifest(
+            members, os.path.getsize(encrypted_path), self.raw_key, self._new_header()
+        )
 
-    def decrypt_folder(self, encrypted_path: str, output_folder: str = None) -> str:
-        """Расшифровывает папку из зашифрованного архива"""
-        import tempfile
-        import zipfile
-        import os
+    def list_folder(self, encrypted_path: str) -> list:
+        """Возвращает файлы и папки контейнера, не расшифровывая их содержимое"""
+        if self.raw_key is None:
+            raise ValueError("Ключ не был инициализирован")
+        with open(encrypted_path, "rb") as in_file:
+            return folder_archive.read_manifest(in_file, self.raw_key)
+
+    def restore_folder(
+        self, encrypted_path: str, paths: list, output_folder: str, progress_callback=None
+    ) -> str:
+        """Восстанавливает из контейнера только указанные файлы и папки"""
+        if self.raw_key is None:
+            raise ValueError("Ключ не был инициализирован")
+        with open(encrypted_path, "rb") as in_file:
+            members = folder_archive.select_members(
+                folder_archive.read_manifest(in_file, self.raw_key), paths
+            )
+            folder_archive.extract_members(
+                in_file, self.raw_key, members, output_folder, progress_callback, self.workers
+            )
+        return output_folder
 
-        if not self.fernet:
+    def decrypt_folder(
+        self, encrypted_path: str, output_folder: str = None, progress_callback=None
+    ) -> str:
+        """Расшифровывает папку целиком
+
+        Понимает контейнеры папок, потоковые tar-архивы v2 и старые zip-архивы
+        (zip распаковывается через временный файл, как раньше).
+        """
+        if self.raw_key is None:
             raise ValueError("Ключ не был инициализирован")
 
         if output_folder is None:
             output_folder = encrypted_path.rsplit(".encrypted", 1)[0]
 
-        # Создаем временный файл для расшифрованного архива
-        temp_archive = tempfile.mktemp(".zip")
-
-        # Расшифровываем архив
-        self.decrypt_file(encrypted_path, temp_archive)
-
-        # Создаем папку для распаковки, если её нет
-        os.makedirs(output_folder, exist_ok=True)
+        if folder_archive.is_folder_archive(encrypted_path):
+            with open(encrypted_path, "rb") as in_file:
+                members = folder_archive.read_manifest(in_file, self.raw_key)
+                folder_archive.extract_members(
+                    in_file, self.raw_key, members, output_folder, progress_callback, self.workers
+                )
+            return output_folder
+
+        total_size = os.path.getsize(encrypted_path)
+
+        def report(consumed):
+            progress_callback(consumed, total_size)
+
+        if file_format.is_v2_file(encrypted_path):
+            with open(encrypted_path, "rb") as in_file:
+                reader = io.BufferedReader(
+                    file_format.DecryptingReader(
+                        in_file, self.raw_key, report if progress_callback else None
+                    )
+                )
+                if reader.peek(4)[:4] != ZIP_SIGNATURE:
+                    os.makedirs(output_folder, exist_ok=True)
+                    with tarfile.open(fileobj=reader, mode="r|") as archive:
+                        if hasattr(tarfile, "data_filter"):
+                            archive.extractall(output_folder, filter="data")
+                        else:
+                            archive.extractall(output_folder)
+                    # Дочитываем поток до конца, чтобы проверить последний блок
+                    while reader.read(self.chunk_size):
+                        pass
+                    return output_folder
+
+        return self._decrypt_zip_folder(encrypted_path, output_folder, progress_callback)
+
+    def _decrypt_zip_folder(self, encrypted_path: str, output_folder: str, progress_callback) -> str:
+        """Расшифровывает старый архив: zip через временный файл"""
+        fd, temp_archive = tempfile.mkstemp(".zip")
+        os.close(fd)
+
+        try:
+            # Расшифровываем архив
+            self.decrypt_file(encrypted_path, temp_archive, progress_callback)
+
+            # Создаем папку для распаковки, если её нет
+            os.makedirs(output_folder, exist_ok=True)
+
+            # Распаковываем архив
+            with zipfile.ZipFile(temp_archive, "r") as zip_ref:
+                zip_ref.extractall(output_folder)
+        finally:
+            # Удаляем временный архив
+            if os.path.exists(temp_archive):
+                os.remove(temp_archive)
 
-        # Распаковываем архив
-        with zipfile.ZipFile(temp_archive, "r") as zip_ref:
-            zip_ref.extractall(output_folder)
+        return output_folder
 
-        # Удаляем временный архив
-        os.remove(temp_archive)
 
-        return output_folder
+class FileEncryptionManager(FileEncryptionMixin, EncryptionManager):
+    """Файловый режим Fernet для записей, созданных до выбора движка по алгоритму"""
@@ -1,6 +1,12 @@
-from cryptography.hazmat.primitives import hashes
-import sqlite3
+from database.connection import get_pool
+from database.schema import ensure_schema
+from database import events
+from file_format import SETTINGS_CIPHERS
+import kdf
+from types import MappingProxyType
 import json
+import os
+import threading
 
 
 class EncryptionSettings:
@@ -9,51 +15,82 @@ class EncryptionSettings:
         "key_length": 32,
         "hash_algorithm": "SHA256",
         "salt_size": 16,
+        "key_cache_ttl": 300,
+        "key_cache_size": 32,
+        "file_cipher": "AES-GCM",
+        "file_chunk_size": 64 * 1024,
+        # 0 — по числу ядер процессора
+        "file_workers": 0,
+        # Функция выведения ключа для новых записей: PBKDF2, scrypt или Argon2id
+        "kdf": "PBKDF2",
+        "scrypt_n": 2 ** 15,
+        "scrypt_r": 8,
+        "scrypt_p": 1,
+        "argon2_iterations": 3,
+        # КиБ
+        "argon2_memory_cost": 64 * 1024,
+        "argon2_lanes": 4,
     }
 
-    HASH_ALGORITHMS = {
-        "SHA256": hashes.SHA256,
-        "SHA384": hashes.SHA384,
-        "SHA512": hashes.SHA512,
-    }
+    HASH_ALGORITHMS = kdf.HASH_ALGORITHMS
+
+    # Сколько последних версий настроек хранится в истории
+    HISTORY_LIMIT = 20
+
+    # Снимки настроек, общие для всех экземпляров: путь к базе -> (id строки, отметка файла, снимок)
+    _snapshots = {}
+    _snapshots_lock = threading.Lock()
 
     def __init__(self, db_path="passwords.db"):
         self.db_path = db_path
-        self._ensure_settings_table()
+        self.pool = get_pool(db_path)
+        self._cache_key = os.path.abspath(db_path)
+        ensure_schema(db_path)
 
-    def _ensure_settings_table(self):
-        """Создает таблицу настроек, если она не существует"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS encryption_settings
-            (id INTEGER PRIMARY KEY,
-             settings TEXT NOT NULL)
-        """
-        )
+    def get_settings(self):
+        """Получает текущие настройки (неизменяемый снимок из кэша)
 
-        # Проверяем, есть ли уже настройки
-        cursor.execute("SELECT COUNT(*) FROM encryption_settings")
-        if cursor.fetchone()[0] == 0:
-            # Если нет, добавляем настройки по умолчанию
-            cursor.execute(
-                "INSERT INTO encryption_settings (settings) VALUES (?)",
-                (json.dumps(self.DEFAULT_SETTINGS),),
-            )
-        conn.commit()
-        conn.close()
+        Пока файлы базы не менялись, снимок отдается без обращения к SQLite.
+        После любой записи в базу сверяется только ID последней версии, и JSON
+        разбирается заново, лишь если настройки изменил другой процесс.
+        """
+        stamp = self._file_stamp()
+        with self._snapshots_lock:
+            cached = self._snapshots.get(self._cache_key)
+        if cached is not None and cached[1] == stamp:
+            return cached[2]
 
-    def get_settings(self):
-        """Получает текущие настройки"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.pool.connection().cursor()
         cursor.execute(
-            "SELECT settings FROM encryption_settings ORDER BY id DESC LIMIT 1"
+            "SELECT id, settings FROM encryption_settings ORDER BY id DESC LIMIT 1"
         )
-        settings = json.loads(cursor.fetchone()[0])
-        conn.close()
-        return settings
+        row_id, raw_settings = cursor.fetchone()
+        if cached is not None and cached[0] == row_id:
+            snapshot = cached[2]
+        else:
+            # Настройки, сохраненные старыми версиями, дополняем значениями по умолчанию
+            snapshot = MappingProxyType({**self.DEFAULT_SETTINGS, **json.loads(raw_settings)})
+
+        with self._snapshots_lock:
+            self._snapshots[self._cache_key] = (row_id, stamp, snapshot)
+        if cached is not None and cached[0] != row_id:
+            # Настройки изменил другой процесс
+            self._notify()
+        return snapshot
+
+    def _file_stamp(self):
+        """Отметка изменения файлов базы: меняется при любой записи, в том числе из других процессов"""
+        stamp = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _notify(self):
+        events.publish(self.db_path, events.ChangeEvent(events.UPDATE, "settings", ()))
 
     def update_settings(self, new_settings):
         """Обновляет настройки с проверкой значений"""
@@ -89,17 +126,112 @@ class EncryptionSettings:
             ):
                 raise ValueError("Размер соли должен быть целым числом >= 16")
 
+        if "key_cache_ttl" in new_settings:
+            if (
+                not isinstance(new_settings["key_cache_ttl"], int)
+                or new_settings["key_cache_ttl"] < 0
+            ):
+                raise ValueError(
+                    "Время жизни ключей в кэше должно быть целым числом >= 0"
+                )
+
+        if "file_cipher" in new_settings:
+            if new_settings["file_cipher"] not in SETTINGS_CIPHERS:
+                raise ValueError(
+                    f"Поддерживаемые шифры файлов: {', '.join(SETTINGS_CIPHERS)}"
+                )
+
+        if "file_chunk_size" in new_settings:
+            if (
+                not isinstance(new_settings["file_chunk_size"], int)
+                or not 4 * 1024 <= new_settings["file_chunk_size"] <= 16 * 1024 * 1024
+            ):
+                raise ValueError(
+                    "Размер блока файла должен быть целым числом от 4 КБ до 16 МБ"
+                )
+
+        if "file_workers" in new_settings:
+            if (
+                not isinstance(new_settings["file_workers"], int)
+                or new_settings["file_workers"] < 0
+            ):
+                raise ValueError("Число потоков должно быть целым числом >= 0")
+
+        if "kdf" in new_settings:
+            if new_settings["kdf"] not in kdf.KDF_NAMES:
+                raise ValueError(
+                    f"Поддерживаемые функции выведения ключа: {', '.join(kdf.KDF_NAMES)}"
+                )
+
+        if "scrypt_n" in new_settings:
+            n = new_settings["scrypt_n"]
+            if not isinstance(n, int) or n < kdf.MIN_SCRYPT_N or n & (n - 1):
+                raise ValueError(
+                    f"Параметр N для scrypt должен быть степенью двойки >= {kdf.MIN_SCRYPT_N}"
+                )
+
+        for name in ("scrypt_r", "scrypt_p", "argon2_iterations", "argon2_lanes"):
+            if name in new_settings:
+                if not isinstance(new_settings[name], int) or new_settings[name] < 1:
+                    raise ValueError(f"Параметр {name} должен быть целым числом >= 1")
+
+        if "argon2_memory_cost" in new_settings:
+            if (
+                not isinstance(new_settings["argon2_memory_cost"], int)
+                or new_settings["argon2_memory_cost"] < kdf.MIN_ARGON2_MEMORY_COST
+            ):
+                raise ValueError(
+                    f"Память Argon2id должна быть целым числом >= {kdf.MIN_ARGON2_MEMORY_COST} КиБ"
+                )
+
+        if "key_cache_size" in new_settings:
+            if (
+                not isinstance(new_settings["key_cache_size"], int)
+                or new_settings["key_cache_size"] < 0
+            ):
+                raise ValueError("Размер кэша ключей должен быть целым числом >= 0")
+
         # Обновляем только переданные настройки
         updated_settings = {**current, **new_settings}
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO encryption_settings (settings) VALUES (?)",
-            (json.dumps(updated_settings),),
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO encryption_settings (settings) VALUES (?)",
+                (json.dumps(updated_settings),),
+            )
+            # Сжимаем историю, чтобы таблица не росла с каждым сохранением
+            conn.execute(
+                "DELETE FROM encryption_settings WHERE id <= ?",
+                (cursor.lastrowid - self.HISTORY_LIMIT,),
+            )
+            self.pool.after_commit(self._on_updated)
+
+    def _on_updated(self):
+        with self._snapshots_lock:
+            self._snapshots.pop(self._cache_key, None)
+        self._notify()
+
+    def subscribe(self, callback):
+        """Подписывает callback(event) на изменение настроек"""
+        def on_change(event):
+            if event.data_type == "settings":
+                callback(event)
+
+        events.subscribe(self.db_path, on_change)
+        return on_change
+
+    def apply_key_cache_settings(self):
+        """Применяет настройки кэша ключей к общему кэшу процесса"""
+        from key_cache import key_cache
+
+        settings = self.get_settings()
+        key_cache.configure(
+            ttl=settings["key_cache_ttl"], max_entries=settings["key_cache_size"]
         )
-        conn.commit()
-        conn.close()
+
+    def get_kdf_params(self, key_length=None):
+        """Возвращает параметры KDF для новой записи"""
+        return kdf.params_from_settings(self.get_settings(), key_length)
 
     def get_hash_algorithm(self):
         """Возвращает текущий алгоритм хеширования"""
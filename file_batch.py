@@ -0,0 +1,137 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from database.db_manager import DatabaseManager
+from encryption.encryptor_factory import EncryptorFactory
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+from vault import Vault
+import folder_archive
+import os
+
+
+class FileResult(NamedTuple):
+    """Итог шифрования одного пути: error заполнен, если файл не зашифрован"""
+    path: str
+    encrypted_path: Optional[str] = None
+    is_folder: bool = False
+    file_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class FileBatchEncryptor:
+    """Шифрует много файлов и папок пулом потоков
+
+    Ключ из пароля вычисляется один раз на весь пакет (в хранилище каждый
+    файл получает собственный ключ записи). Ошибка одного файла не прерывает
+    пакет, а записи об успешно зашифрованных файлах сохраняются в базу одной
+    пакетной вставкой, в том числе после отмены. Уже зашифрованная тем же
+    ключом папка не шифруется заново: в ее контейнер дописываются изменения.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, algorithm: str, workers: Optional[int] = None):
+        self.db_manager = db_manager
+        self.algorithm = algorithm
+        # None — размер пула ThreadPoolExecutor по умолчанию, мелкие файлы упираются в ввод-вывод
+        self.workers = workers
+
+    def encrypt(self, paths: Sequence[str], password: Optional[str] = None, vault: Optional[Vault] = None,
+                progress_callback: Callable[[int, int], None] = None) -> List[FileResult]:
+        """Шифрует пути паролем или ключами хранилища и возвращает результаты в порядке путей
+
+        progress_callback(готово_путей, всего_путей) вызывается по мере завершения;
+        исключение из него отменяет еще не начатые файлы.
+        """
+        if password is None and vault is None:
+            raise ValueError("Нужен пароль или открытое хранилище")
+
+        shared = None
+        if vault is None:
+            shared = EncryptorFactory.create_encryptor(self.algorithm, file_mode=True)
+            shared.generate_key(password)
+            if len(paths) > 1:
+                # Параллельны файлы, блоки одного файла шифруются в его потоке
+                shared.workers = 1
+
+        def encrypt_one(path: str) -> Tuple[FileResult, Optional[tuple]]:
+            is_folder = os.path.isdir(path)
+            try:
+                # Уже зашифрованная папка дополняется своим ключом, новый ключ ей не нужен
+                if is_folder:
+                    updated = self._update_folder(path, password, vault)
+                    if updated is not None:
+                        return updated, None
+                wrapped_key = None
+                encryptor = shared
+                if encryptor is None:
+                    encryptor = EncryptorFactory.create_encryptor(self.algorithm, file_mode=True)
+                    if len(paths) > 1:
+                        encryptor.workers = 1
+                    wrapped_key = vault.prepare_encryptor(encryptor)
+                manifest = None
+                if is_folder:
+                    encrypted_path = encryptor.encrypt_folder(path)
+                    manifest = encryptor.export_manifest(encrypted_path)
+                else:
+                    encrypted_path = encryptor.encrypt_file(path)
+            except Exception as e:
+                return FileResult(path, is_folder=is_folder, error=str(e)), None
+            row = (path, encrypted_path, encryptor.salt, self.algorithm, is_folder, wrapped_key, manifest,
+                   encryptor.kdf_params, encryptor.cipher_params)
+            return FileResult(path, encrypted_path, is_folder), row
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = [executor.submit(encrypt_one, path) for path in paths]
+        try:
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if progress_callback:
+                    progress_callback(len(futures) - len(pending), len(futures))
+        finally:
+            # При отмене дожидаемся уже начатых файлов, чтобы сохранить и их
+            # (cancel_futures в shutdown есть только с Python 3.9)
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            results = self._save([future.result() for future in futures if not future.cancelled()])
+        return results
+
+    def _update_folder(self, path: str, password: Optional[str], vault: Optional[Vault]) -> Optional[FileResult]:
+        """Дописывает изменения в уже зашифрованную папку
+
+        Возвращает None, если обновлять нечего: папка еще не шифровалась, контейнер
+        пропал или записан другим ключом — тогда папка шифруется заново.
+        """
+        entry = self.db_manager.find_folder_entry(path)
+        if entry is None:
+            return None
+        file_id, encrypted_path, salt, algorithm, wrapped_key, manifest, kdf_params, cipher_params = entry
+        if (algorithm != self.algorithm or manifest is None or not os.path.exists(encrypted_path)
+                or not folder_archive.is_folder_archive(encrypted_path)):
+            return None
+
+        encryptor = EncryptorFactory.create_for_record(algorithm, cipher_params, file_mode=True)
+        if wrapped_key is not None:
+            if vault is None:
+                return None
+            vault.open_encryptor(encryptor, wrapped_key, salt)
+        else:
+            if password is None:
+                return None
+            encryptor.load_key(password, salt, kdf_params)
+        try:
+            # Манифест расшифровывается только ключом, которым записан контейнер
+            folder_archive.unpack_manifest(manifest, encryptor.raw_key)
+        except ValueError:
+            return None
+
+        encryptor.update_folder(path, encrypted_path, manifest)
+        self.db_manager.save_folder_manifest(file_id, encryptor.export_manifest(encrypted_path))
+        return FileResult(path, encrypted_path, True, file_id)
+
+    def _save(self, outcomes: List[Tuple[FileResult, Optional[tuple]]]) -> List[FileResult]:
+        """Сохраняет успешные файлы одной пакетной вставкой и проставляет их ID"""
+        rows = [row for _, row in outcomes if row is not None]
+        ids = iter(self.db_manager.save_encrypted_files_many(rows) if rows else [])
+        return [
+            result if row is None else result._replace(file_id=next(ids))
+            for result, row in outcomes
+        ]
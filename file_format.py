@@ -0,0 +1,579 @@
+"""Потоковый формат зашифрованных файлов v2
+
+Заголовок (big-endian):
+    magic "PWENC" | версия (1) | шифр (1) | KDF (1) | хеш KDF (1) | флаги (1)
+    | итерации KDF (4) | размер блока (4) | длина соли (1) | соль | соль файла (16)
+
+Дальше идут блоки: шифртекст AEAD без base64 и префиксов длины. Все блоки,
+кроме последнего, содержат ровно chunk_size байт открытого текста. Nonce блока —
+номер блока (11 байт) и флаг последнего блока (1 байт), поэтому обрезка или
+перестановка блоков обнаруживается. Заголовок целиком входит в AAD каждого блока.
+Ключ файла выводится из ключа записи через HKDF с солью файла.
+Шифр 3DES-HMAC (движок Triple DES) не является AEAD из cryptography: это
+3DES-CFB с HMAC-SHA256, размеры блоков у него такие же, как у AEAD.
+Смещение любого блока вычисляется из размера блока, поэтому файл можно
+читать с произвольного места (SeekableReader).
+"""
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.ciphers import Cipher
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+from instrumentation import instrumentation
+import hashlib
+import hmac
+import io
+import os
+import struct
+
+try:
+    from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+    from cryptography.hazmat.decrepit.ciphers.modes import CFB
+except ImportError:  # cryptography < 43
+    from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    from cryptography.hazmat.primitives.ciphers.modes import CFB
+
+MAGIC = b"PWENC"
+VERSION = 2
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+FILE_SALT_SIZE = 16
+# Сколько блоков на один поток может находиться в обработке одновременно
+IN_FLIGHT_PER_WORKER = 4
+# Сколько зашифрованных блоков собирается в буфере перед одной записью в файл
+WRITE_BATCH_BLOCKS = 16
+
+
+
+class TripleDESHMAC:
+    """3DES-CFB с HMAC-SHA256 (encrypt-then-MAC) с интерфейсом AEAD
+
+    Ключ — 24 байта 3DES и 32 байта HMAC. IV выводится из nonce через HMAC,
+    поэтому шифртекст длиннее открытого текста ровно на TAG_SIZE байт.
+    """
+    KEY_SIZE = 56
+
+    def __init__(self, key: bytes):
+        if len(key) != self.KEY_SIZE:
+            raise ValueError(f"Ключ 3DES-HMAC должен быть длиной {self.KEY_SIZE} байт")
+        self._algorithm = TripleDES(key[:24])
+        self._mac_key = key[24:]
+
+    def _iv(self, nonce: bytes) -> bytes:
+        return hmac.new(self._mac_key, b"\x00" + nonce, hashlib.sha256).digest()[:8]
+
+    def _tag(self, nonce: bytes, ciphertext, associated_data: Optional[bytes]) -> bytes:
+        associated_data = associated_data or b""
+        mac = hmac.new(self._mac_key, b"\x01" + nonce, hashlib.sha256)
+        mac.update(len(associated_data).to_bytes(8, "big"))
+        mac.update(associated_data)
+        mac.update(ciphertext)
+        return mac.digest()[:TAG_SIZE]
+
+    def encrypt(self, nonce: bytes, data, associated_data: Optional[bytes]) -> bytes:
+        encryptor = Cipher(self._algorithm, CFB(self._iv(nonce))).encryptor()
+        ciphertext = encryptor.update(data) + encryptor.finalize()
+        return ciphertext + self._tag(nonce, ciphertext, associated_data)
+
+    def decrypt(self, nonce: bytes, data, associated_data: Optional[bytes]) -> bytes:
+        if len(data) < TAG_SIZE:
+            raise InvalidTag()
+        ciphertext, tag = data[:-TAG_SIZE], data[-TAG_SIZE:]
+        if not hmac.compare_digest(self._tag(nonce, ciphertext, associated_data), tag):
+            raise InvalidTag()
+        decryptor = Cipher(self._algorithm, CFB(self._iv(nonce))).decryptor()
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+
+# Идентификатор шифра в заголовке -> (название, класс, длина ключа)
+CIPHERS = {
+    1: ("AES-GCM", AESGCM, 32),
+    2: ("ChaCha20-Poly1305", ChaCha20Poly1305, 32),
+    3: ("3DES-HMAC", TripleDESHMAC, TripleDESHMAC.KEY_SIZE),
+}
+CIPHER_IDS = {name: cipher_id for cipher_id, (name, *_) in CIPHERS.items()}
+# Шифры, которые выбираются в настройках для файлов Fernet; остальные задает движок
+SETTINGS_CIPHERS = ("AES-GCM", "ChaCha20-Poly1305")
+
+KDFS = {0: None, 1: "PBKDF2", 2: "scrypt", 3: "Argon2id"}
+KDF_IDS = {name: kdf_id for kdf_id, name in KDFS.items()}
+
+HASHES = {0: None, 1: "SHA256", 2: "SHA384", 3: "SHA512"}
+HASH_IDS = {name: hash_id for hash_id, name in HASHES.items()}
+
+_HEADER = struct.Struct(">5sBBBBBIIB")
+
+
+class StreamHeader(NamedTuple):
+    cipher: str
+    kdf: Optional[str]
+    hash_algorithm: Optional[str]
+    iterations: int
+    chunk_size: int
+    salt: bytes
+    file_salt: bytes
+    raw: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.raw)
+
+
+def build_header(cipher: str, salt: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 kdf_params: Optional[dict] = None) -> StreamHeader:
+    """Создает заголовок нового файла со случайной солью файла"""
+    if cipher not in CIPHER_IDS:
+        raise ValueError(f"Неизвестный шифр файла: {cipher}")
+    kdf_params = kdf_params or {}
+    kdf = kdf_params.get("kdf")
+    hash_algorithm = kdf_params.get("hash_algorithm")
+    # Основной параметр стоимости: итерации PBKDF2/Argon2id или N для scrypt.
+    # Полные параметры KDF хранятся в записи базы, в заголовке — для справки
+    iterations = kdf_params.get("iterations", kdf_params.get("n", 0))
+    file_salt = os.urandom(FILE_SALT_SIZE)
+    raw = _HEADER.pack(
+        MAGIC, VERSION, CIPHER_IDS[cipher], KDF_IDS[kdf], HASH_IDS[hash_algorithm], 0,
+        iterations, chunk_size, len(salt)
+    ) + salt + file_salt
+    return StreamHeader(cipher, kdf, hash_algorithm, iterations, chunk_size, salt, file_salt, raw)
+
+
+def read_header(in_file: BinaryIO) -> StreamHeader:
+    """Читает заголовок v2 из текущей позиции файла"""
+    fixed = in_file.read(_HEADER.size)
+    if len(fixed) < _HEADER.size:
+        raise ValueError("Файл поврежден: неполный заголовок")
+    magic, version, cipher_id, kdf_id, hash_id, _flags, iterations, chunk_size, salt_len = _HEADER.unpack(fixed)
+    if magic != MAGIC:
+        raise ValueError("Файл не является зашифрованным файлом формата v2")
+    if version != VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата: {version}")
+    if cipher_id not in CIPHERS or kdf_id not in KDFS or hash_id not in HASHES or chunk_size == 0:
+        raise ValueError("Файл поврежден: неизвестные параметры шифрования")
+    rest = in_file.read(salt_len + FILE_SALT_SIZE)
+    if len(rest) < salt_len + FILE_SALT_SIZE:
+        raise ValueError("Файл поврежден: неполный заголовок")
+    return StreamHeader(
+        CIPHERS[cipher_id][0], KDFS[kdf_id], HASHES[hash_id], iterations, chunk_size,
+        rest[:salt_len], rest[salt_len:], fixed + rest
+    )
+
+
+def is_v2_file(path: str) -> bool:
+    """Проверяет, записан ли файл в формате v2"""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _cipher_for(header: StreamHeader, key: bytes):
+    _, cipher_class, key_size = CIPHERS[CIPHER_IDS[header.cipher]]
+    file_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=key_size,
+        salt=header.file_salt,
+        info=b"passwords file v2 " + header.cipher.encode(),
+    ).derive(key)
+    return cipher_class(file_key)
+
+
+def _nonce(index: int, final: bool) -> bytes:
+    return index.to_bytes(11, "big") + (b"\x01" if final else b"\x00")
+
+
+def _read(in_file: BinaryIO, size: int) -> bytes:
+    with instrumentation.span("file.read") as span:
+        data = in_file.read(size)
+        span.add_bytes(len(data))
+    return data
+
+
+def _write(out_file: BinaryIO, data) -> None:
+    with instrumentation.span("file.write", len(data)):
+        out_file.write(data)
+
+
+def _blocks(in_file: BinaryIO, size: int) -> Iterator[Tuple[int, bytes, bool]]:
+    """Читает файл блоками на один вперед, чтобы отметить последний блок"""
+    index = 0
+    block = _read(in_file, size)
+    while True:
+        next_block = _read(in_file, size) if len(block) == size else b""
+        final = not next_block
+        yield index, block, final
+        if final:
+            return
+        block = next_block
+        index += 1
+
+
+def _pipeline(blocks: Iterable[Tuple[int, bytes, bool]], transform: Callable[[int, bytes, bool], bytes],
+              out_file: BinaryIO, workers: int, on_written: Callable[[int, int], None]) -> None:
+    """Преобразует блоки в пуле потоков и записывает результаты по порядку
+
+    Примитивы cryptography отпускают GIL, поэтому блоки шифруются параллельно.
+    В работе одновременно не больше IN_FLIGHT_PER_WORKER блоков на поток,
+    это ограничивает расход памяти. on_written(размер_блока, размер_результата)
+    вызывается после записи каждого блока; исключение из него прерывает обработку.
+    """
+    blocks = iter(blocks)
+    first = next(blocks)
+    blocks = chain([first], blocks)
+    # Файл из одного блока нет смысла отдавать в пул
+    if workers <= 1 or first[2]:
+        for index, block, final in blocks:
+            result = transform(index, block, final)
+            _write(out_file, result)
+            on_written(len(block), len(result))
+        return
+
+    window = deque()
+
+    def write_next() -> None:
+        block_size, future = window.popleft()
+        result = future.result()
+        _write(out_file, result)
+        on_written(block_size, len(result))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for index, block, final in blocks:
+                if len(window) >= workers * IN_FLIGHT_PER_WORKER:
+                    write_next()
+                window.append((len(block), executor.submit(transform, index, block, final)))
+            while window:
+                write_next()
+        except BaseException:
+            for _, future in window:
+                future.cancel()
+            raise
+
+
+def _read_full(in_file: BinaryIO, view: memoryview) -> int:
+    """Заполняет view из файла, короче только в конце файла"""
+    total = 0
+    with instrumentation.span("file.read") as span:
+        while total < len(view):
+            size = in_file.readinto(view[total:])
+            if not size:
+                break
+            total += size
+        span.add_bytes(total)
+    return total
+
+
+def _advise_sequential(in_file: BinaryIO) -> None:
+    """Подсказывает ОС, что файл будет прочитан последовательно (упреждающее чтение)"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(in_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+
+
+def _use_buffers(cipher, in_file: BinaryIO, block_size: int, workers: int) -> bool:
+    """Можно ли обработать поток последовательно в переиспользуемых буферах
+
+    Нужны encrypt_into/decrypt_into (cryptography 45+) и readinto. При нескольких
+    потоках так обрабатываются только файлы из одного блока, остальные идут в пул.
+    """
+    if not hasattr(cipher, "encrypt_into") or not hasattr(in_file, "readinto"):
+        return False
+    if workers <= 1:
+        return True
+    try:
+        remaining = os.fstat(in_file.fileno()).st_size - in_file.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return remaining <= block_size
+
+
+def _transform_buffered(in_file: BinaryIO, out_file: BinaryIO, block_size: int, size_delta: int,
+                        transform_into: Callable[[int, memoryview, bool, memoryview], None],
+                        on_written: Callable[[int, int], None]) -> None:
+    """Последовательная обработка блоков без выделения памяти на каждый блок
+
+    Блоки читаются через readinto в два чередующихся буфера (второй — чтение
+    вперед для флага последнего блока), результаты складываются в общий буфер
+    и пишутся в файл по WRITE_BATCH_BLOCKS блоков за раз. size_delta — разница
+    размеров результата и блока (+TAG_SIZE при шифровании, -TAG_SIZE при расшифровке).
+    """
+    current = memoryview(bytearray(block_size))
+    ahead = memoryview(bytearray(block_size))
+    out = memoryview(bytearray(WRITE_BATCH_BLOCKS * (block_size + max(size_delta, 0))))
+    position = 0
+    index = 0
+    size = _read_full(in_file, current)
+    while True:
+        next_size = _read_full(in_file, ahead) if size == block_size else 0
+        final = next_size == 0
+        result_size = size + size_delta
+        if result_size < 0:
+            raise ValueError("Неверный ключ или файл поврежден")
+        if position + result_size > len(out):
+            _write(out_file, out[:position])
+            position = 0
+        transform_into(index, current[:size], final, out[position:position + result_size])
+        position += result_size
+        on_written(size, result_size)
+        if final:
+            break
+        current, ahead = ahead, current
+        size = next_size
+        index += 1
+    _write(out_file, out[:position])
+
+
+def encrypt_stream(in_file: BinaryIO, out_file: BinaryIO, key: bytes, header: StreamHeader,
+                   progress_callback: Callable[[int], None] = None, workers: int = 1) -> int:
+    """Шифрует поток в формате v2 и возвращает число байт открытого текста
+
+    progress_callback(обработано_байт) вызывается после каждого блока.
+    """
+    cipher = _cipher_for(header, key)
+    aad = header.raw
+    out_file.write(aad)
+    processed = 0
+
+    def on_written(chunk_size: int, _encrypted_size: int) -> None:
+        nonlocal processed
+        processed += chunk_size
+        if progress_callback:
+            progress_callback(processed)
+
+    _advise_sequential(in_file)
+    if _use_buffers(cipher, in_file, header.chunk_size, workers):
+        def transform_into(index: int, chunk: memoryview, final: bool, out: memoryview) -> None:
+            with instrumentation.span("file.encrypt_chunk", len(chunk)):
+                cipher.encrypt_into(_nonce(index, final), chunk, aad, out)
+
+        _transform_buffered(in_file, out_file, header.chunk_size, TAG_SIZE, transform_into, on_written)
+        return processed
+
+    def transform(index: int, chunk: bytes, final: bool) -> bytes:
+        with instrumentation.span("file.encrypt_chunk", len(chunk)):
+            return cipher.encrypt(_nonce(index, final), chunk, aad)
+
+    _pipeline(_blocks(in_file, header.chunk_size), transform, out_file, workers, on_written)
+    return processed
+
+
+def decrypt_stream(in_file: BinaryIO, out_file: BinaryIO, key: bytes,
+                   progress_callback: Callable[[int], None] = None, workers: int = 1) -> int:
+    """Расшифровывает поток v2 и возвращает число байт открытого текста
+
+    progress_callback(прочитано_байт_шифртекста) вызывается после каждого блока.
+    """
+    header = read_header(in_file)
+    cipher = _cipher_for(header, key)
+    aad = header.raw
+    block_size = header.chunk_size + TAG_SIZE
+    consumed = header.size
+    processed = 0
+
+    def on_written(block_size: int, chunk_size: int) -> None:
+        nonlocal consumed, processed
+        consumed += block_size
+        processed += chunk_size
+        if progress_callback:
+            progress_callback(consumed)
+
+    _advise_sequential(in_file)
+    if _use_buffers(cipher, in_file, block_size, workers):
+        def transform_into(index: int, block: memoryview, final: bool, out: memoryview) -> None:
+            try:
+                with instrumentation.span("file.decrypt_chunk", len(block)):
+                    cipher.decrypt_into(_nonce(index, final), block, aad, out)
+            except InvalidTag:
+                raise ValueError("Неверный ключ или файл поврежден")
+
+        _transform_buffered(in_file, out_file, block_size, -TAG_SIZE, transform_into, on_written)
+        return processed
+
+    def transform(index: int, block: bytes, final: bool) -> bytes:
+        try:
+            with instrumentation.span("file.decrypt_chunk", len(block)):
+                return cipher.decrypt(_nonce(index, final), block, aad)
+        except InvalidTag:
+            raise ValueError("Неверный ключ или файл поврежден")
+
+    _pipeline(_blocks(in_file, block_size), transform, out_file, workers, on_written)
+    return processed
+
+
+class EncryptingWriter(io.RawIOBase):
+    """Файловый объект только для записи, шифрующий поток в формате v2
+
+    Блок отправляется в файл, как только за ним появляются новые данные,
+    а последний блок — при close(). Подходит для tarfile в режиме "w|".
+    """
+
+    def __init__(self, out_file: BinaryIO, key: bytes, header: StreamHeader,
+                 progress_callback: Callable[[int], None] = None):
+        super().__init__()
+        self._out_file = out_file
+        self._cipher = _cipher_for(header, key)
+        self._header = header
+        self._buffer = bytearray()
+        self._index = 0
+        self._progress_callback = progress_callback
+        self.processed = 0
+        out_file.write(header.raw)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("Запись в закрытый поток")
+        self._buffer += data
+        chunk_size = self._header.chunk_size
+        # Оставляем хотя бы один полный блок: он может оказаться последним
+        while len(self._buffer) > chunk_size:
+            self._emit(bytes(self._buffer[:chunk_size]), False)
+            del self._buffer[:chunk_size]
+        return len(data)
+
+    def close(self) -> None:
+        # Из __del__ после ошибки выходной файл может быть уже закрыт
+        if not self.closed and not self._out_file.closed:
+            self._emit(bytes(self._buffer), True)
+            self._buffer = bytearray()
+        super().close()
+
+    def _emit(self, chunk: bytes, final: bool) -> None:
+        with instrumentation.span("file.encrypt_chunk", len(chunk)):
+            encrypted = self._cipher.encrypt(_nonce(self._index, final), chunk, self._header.raw)
+        _write(self._out_file, encrypted)
+        self._index += 1
+        self.processed += len(chunk)
+        if self._progress_callback:
+            self._progress_callback(self.processed)
+
+
+class DecryptingReader(io.RawIOBase):
+    """Файловый объект только для чтения, расшифровывающий поток v2
+
+    Конец данных возвращается только после проверки блока с флагом последнего,
+    поэтому обрезанный файл вызывает ошибку, а не молча укорачивается.
+    Подходит для tarfile в режиме "r|".
+    """
+
+    def __init__(self, in_file: BinaryIO, key: bytes, progress_callback: Callable[[int], None] = None):
+        super().__init__()
+        self.header = read_header(in_file)
+        self._cipher = _cipher_for(self.header, key)
+        self._blocks = _blocks(in_file, self.header.chunk_size + TAG_SIZE)
+        self._chunk = b""
+        self._position = 0
+        self._finished = False
+        self._progress_callback = progress_callback
+        self.consumed = self.header.size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._position >= len(self._chunk):
+            if self._finished:
+                return 0
+            self._next_chunk()
+        size = min(len(buffer), len(self._chunk) - self._position)
+        buffer[:size] = self._chunk[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def _next_chunk(self) -> None:
+        index, block, final = next(self._blocks)
+        try:
+            with instrumentation.span("file.decrypt_chunk", len(block)):
+                self._chunk = self._cipher.decrypt(_nonce(index, final), block, self.header.raw)
+        except InvalidTag:
+            raise ValueError("Неверный ключ или файл поврежден")
+        self._position = 0
+        self._finished = final
+        self.consumed += len(block)
+        if self._progress_callback:
+            self._progress_callback(self.consumed)
+
+
+class SeekableReader(io.RawIOBase):
+    """Файл v2 с произвольным доступом: seek/read расшифровывают только нужные блоки
+
+    Все блоки, кроме последнего, одного размера, поэтому смещение блока
+    вычисляется без индекса. Длина открытого текста проверяется при открытии:
+    последний блок должен расшифроваться с флагом последнего.
+    """
+
+    def __init__(self, in_file: BinaryIO, key: bytes, close_file: bool = False):
+        super().__init__()
+        self._in_file = in_file
+        self._close_file = close_file
+        self.header = read_header(in_file)
+        self._cipher = _cipher_for(self.header, key)
+        self._block_size = self.header.chunk_size + TAG_SIZE
+
+        data_size = in_file.seek(0, io.SEEK_END) - self.header.size
+        self._chunk_count = max(1, -(-data_size // self._block_size))
+        last_block_size = data_size - (self._chunk_count - 1) * self._block_size
+        if last_block_size < TAG_SIZE:
+            raise ValueError("Файл поврежден: неполный блок")
+        self.size = (self._chunk_count - 1) * self.header.chunk_size + last_block_size - TAG_SIZE
+
+        self._cached_index = None
+        self._cached_chunk = b""
+        self._position = 0
+        self._load_chunk(self._chunk_count - 1)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Отрицательная позиция в файле")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        buffer = memoryview(buffer).cast("B")
+        written = 0
+        chunk_size = self.header.chunk_size
+        while written < len(buffer) and self._position < self.size:
+            index, start = divmod(self._position, chunk_size)
+            chunk = self._load_chunk(index)
+            size = min(len(buffer) - written, len(chunk) - start)
+            buffer[written:written + size] = chunk[start:start + size]
+            written += size
+            self._position += size
+        return written
+
+    def close(self) -> None:
+        if not self.closed and self._close_file:
+            self._in_file.close()
+        super().close()
+
+    def _load_chunk(self, index: int) -> bytes:
+        if index != self._cached_index:
+            self._in_file.seek(self.header.size + index * self._block_size)
+            block = _read(self._in_file, self._block_size)
+            final = index == self._chunk_count - 1
+            try:
+                with instrumentation.span("file.decrypt_chunk", len(block)):
+                    self._cached_chunk = self._cipher.decrypt(_nonce(index, final), block, self.header.raw)
+            except InvalidTag:
+                raise ValueError("Неверный ключ или файл поврежден")
+            self._cached_index = index
+        return self._cached_chunk
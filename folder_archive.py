@@ -0,0 +1,387 @@
+"""Контейнер зашифрованной папки с отдельно зашифрованными файлами
+
+Структура:
+    "PWDIR" | версия (1)
+    потоки v2 файлов папки подряд
+    манифест — поток v2 с JSON: путь, размер, mtime, SHA-256, смещение и длина потока
+    концовка: смещение манифеста (8) | "PWDIREND"
+
+При обновлении новые потоки, манифест и концовка дописываются в конец,
+действительна последняя концовка.
+
+Каждый поток v2 имеет собственную соль файла, а манифест хранит ее для
+каждого файла, поэтому подмена потоков местами обнаруживается. Список файлов
+читается без расшифровки содержимого, а любой файл восстанавливается отдельно.
+"""
+from typing import BinaryIO, Callable, Iterable, List, NamedTuple, Tuple
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import file_format
+
+MAGIC = b"PWDIR"
+VERSION = 1
+FOOTER_MAGIC = b"PWDIREND"
+
+_FOOTER = struct.Struct(">Q8s")
+
+
+class ArchiveMember(NamedTuple):
+    path: str
+    is_dir: bool
+    size: int
+    mtime: float
+    offset: int = 0
+    length: int = 0
+    file_salt: str = ""
+    sha256: str = ""
+
+
+class ArchiveUpdate(NamedTuple):
+    """Итог инкрементального обновления контейнера"""
+    members: List[ArchiveMember]
+    added: int
+    changed: int
+    removed: int
+    unchanged: int
+    live_bytes: int
+    archive_size: int
+
+
+class _Region:
+    """Ограничивает чтение потока одного файла его длиной"""
+
+    def __init__(self, in_file: BinaryIO, length: int):
+        self._in_file = in_file
+        self._left = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._in_file.read(size)
+        self._left -= len(data)
+        return data
+
+
+class _HashingReader:
+    """Считает SHA-256 прочитанных данных"""
+
+    def __init__(self, in_file: BinaryIO):
+        self._in_file = in_file
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._in_file.read(size)
+        self.hash.update(data)
+        return data
+
+
+def is_folder_archive(path: str) -> bool:
+    """Проверяет, является ли файл контейнером папки"""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _scan(folder_path: str) -> List[Tuple[str, str, os.stat_result]]:
+    """Файлы и папки внутри folder_path: (полный путь, путь в контейнере, stat)"""
+    entries = []
+    for root, dirs, names in os.walk(folder_path):
+        dirs.sort()
+        for name in dirs + sorted(names):
+            full_path = os.path.join(root, name)
+            if os.path.isdir(full_path) or os.path.isfile(full_path):
+                path = os.path.relpath(full_path, folder_path).replace(os.sep, "/")
+                entries.append((full_path, path, os.stat(full_path)))
+    return entries
+
+
+def _write_member(out_file: BinaryIO, full_path: str, path: str, stat: os.stat_result, key: bytes,
+                  header: file_format.StreamHeader, report, workers: int) -> ArchiveMember:
+    offset = out_file.tell()
+    with open(full_path, "rb") as in_file:
+        reader = _HashingReader(in_file)
+        size = file_format.encrypt_stream(reader, out_file, key, header, report, workers)
+    return ArchiveMember(
+        path, False, size, stat.st_mtime, offset, out_file.tell() - offset,
+        header.file_salt.hex(), reader.hash.hexdigest()
+    )
+
+
+def _write_members(out_file: BinaryIO, entries, key: bytes,
+                   new_header: Callable[[], file_format.StreamHeader],
+                   progress_callback: Callable[[int, int], None], workers: int) -> List[ArchiveMember]:
+    """Шифрует файлы из entries в конец out_file; папки только попадают в список"""
+    total_size = sum(stat.st_size for full_path, _, stat in entries if not os.path.isdir(full_path))
+    members = []
+    done = 0
+    for full_path, path, stat in entries:
+        if os.path.isdir(full_path):
+            members.append(ArchiveMember(path, True, 0, stat.st_mtime))
+            continue
+
+        def report(processed, base=done):
+            progress_callback(base + processed, total_size)
+
+        member = _write_member(
+            out_file, full_path, path, stat, key, new_header(),
+            report if progress_callback else None, workers
+        )
+        done += member.size
+        members.append(member)
+    return members
+
+
+def _write_manifest(out_file: BinaryIO, members: List[ArchiveMember], key: bytes,
+                    new_header: Callable[[], file_format.StreamHeader]) -> None:
+    manifest_offset = out_file.tell()
+    manifest = json.dumps({"version": VERSION, "members": [member._asdict() for member in members]})
+    file_format.encrypt_stream(io.BytesIO(manifest.encode()), out_file, key, new_header())
+    out_file.write(_FOOTER.pack(manifest_offset, FOOTER_MAGIC))
+
+
+def write_archive(folder_path: str, out_file: BinaryIO, key: bytes,
+                  new_header: Callable[[], file_format.StreamHeader],
+                  progress_callback: Callable[[int, int], None] = None,
+                  workers: int = 1) -> List[ArchiveMember]:
+    """Записывает контейнер папки и возвращает список ее членов
+
+    new_header() должен каждый раз возвращать заголовок с новой солью файла.
+    progress_callback(обработано_байт, всего_байт) вызывается после каждого блока.
+    """
+    out_file.write(MAGIC + bytes([VERSION]))
+    members = _write_members(out_file, _scan(folder_path), key, new_header, progress_callback, workers)
+    _write_manifest(out_file, members, key, new_header)
+    return members
+
+
+def update_archive(folder_path: str, archive_file: BinaryIO, key: bytes,
+                   new_header: Callable[[], file_format.StreamHeader], members: List[ArchiveMember],
+                   progress_callback: Callable[[int, int], None] = None,
+                   workers: int = 1) -> ArchiveUpdate:
+    """Дописывает в контейнер только новые и измененные файлы папки
+
+    members — текущий манифест контейнера. Файл считается неизменным, если
+    совпали размер и mtime, а при другом mtime — SHA-256 содержимого. Новые
+    потоки, манифест и концовка дописываются в конец, прежние данные не
+    переписываются; при ошибке контейнер обрезается до исходного размера.
+    """
+    previous = {member.path: member for member in members if not member.is_dir}
+    entries = _scan(folder_path)
+    kept = {}
+    to_write = []
+    for full_path, path, stat in entries:
+        if os.path.isdir(full_path):
+            continue
+        old = previous.get(path)
+        if old is not None and old.size == stat.st_size:
+            if old.mtime == stat.st_mtime:
+                kept[path] = old
+                continue
+            if old.sha256 and old.sha256 == _file_sha256(full_path):
+                kept[path] = old._replace(mtime=stat.st_mtime)
+                continue
+        to_write.append((full_path, path, stat))
+
+    original_size = archive_file.seek(0, io.SEEK_END)
+    if not to_write:
+        result = [
+            ArchiveMember(path, True, 0, stat.st_mtime) if os.path.isdir(full_path) else kept[path]
+            for full_path, path, stat in entries
+        ]
+        if result == members:
+            # Ничего не изменилось: контейнер не трогаем
+            return ArchiveUpdate(
+                result, 0, 0, 0, len(kept), sum(member.length for member in result), original_size
+            )
+
+    try:
+        written = {
+            member.path: member
+            for member in _write_members(archive_file, to_write, key, new_header, progress_callback, workers)
+        }
+        result = []
+        for full_path, path, stat in entries:
+            if os.path.isdir(full_path):
+                result.append(ArchiveMember(path, True, 0, stat.st_mtime))
+            else:
+                result.append(kept.get(path) or written[path])
+        _write_manifest(archive_file, result, key, new_header)
+        archive_size = archive_file.tell()
+    except BaseException:
+        archive_file.truncate(original_size)
+        raise
+
+    changed = sum(1 for _, path, _ in to_write if path in previous)
+    return ArchiveUpdate(
+        members=result,
+        added=len(to_write) - changed,
+        changed=changed,
+        removed=len(set(previous) - set(kept) - set(written)),
+        unchanged=len(kept),
+        live_bytes=sum(member.length for member in result),
+        archive_size=archive_size,
+    )
+
+
+def compact_archive(archive_file: BinaryIO, out_file: BinaryIO, key: bytes,
+                    new_header: Callable[[], file_format.StreamHeader],
+                    members: List[ArchiveMember]) -> List[ArchiveMember]:
+    """Копирует в новый контейнер только действующие потоки, без перешифрования"""
+    out_file.write(MAGIC + bytes([VERSION]))
+    result = []
+    for member in members:
+        if member.is_dir:
+            result.append(member)
+            continue
+        offset = out_file.tell()
+        archive_file.seek(member.offset)
+        shutil.copyfileobj(_Region(archive_file, member.length), out_file)
+        result.append(member._replace(offset=offset))
+    _write_manifest(out_file, result, key, new_header)
+    return result
+
+
+def rekey_archive(archive_file: BinaryIO, out_file: BinaryIO, old_key: bytes, key: bytes,
+                  new_header: Callable[[], file_format.StreamHeader], members: List[ArchiveMember],
+                  progress_callback: Callable[[int, int], None] = None,
+                  workers: int = 1) -> List[ArchiveMember]:
+    """Перешифровывает действующие потоки контейнера новым ключом в новый контейнер
+
+    progress_callback(обработано_байт, всего_байт) вызывается после каждого блока.
+    """
+    out_file.write(MAGIC + bytes([VERSION]))
+    total_size = sum(member.size for member in members)
+    result = []
+    done = 0
+    for member in members:
+        if member.is_dir:
+            result.append(member)
+            continue
+        archive_file.seek(member.offset)
+        reader = file_format.DecryptingReader(_Region(archive_file, member.length), old_key)
+        if reader.header.file_salt.hex() != member.file_salt:
+            raise ValueError(f"Контейнер поврежден: поток не соответствует файлу {member.path}")
+
+        def report(processed, base=done):
+            progress_callback(base + processed, total_size)
+
+        header = new_header()
+        offset = out_file.tell()
+        size = file_format.encrypt_stream(
+            reader, out_file, key, header, report if progress_callback else None, workers
+        )
+        result.append(member._replace(
+            offset=offset, length=out_file.tell() - offset, file_salt=header.file_salt.hex()
+        ))
+        done += size
+    _write_manifest(out_file, result, key, new_header)
+    return result
+
+
+def pack_manifest(members: List[ArchiveMember], archive_size: int, key: bytes,
+                  header: file_format.StreamHeader) -> bytes:
+    """Шифрует манифест для хранения в базе вместе с размером контейнера"""
+    manifest = json.dumps({
+        "version": VERSION,
+        "archive_size": archive_size,
+        "members": [member._asdict() for member in members],
+    })
+    out_file = io.BytesIO()
+    file_format.encrypt_stream(io.BytesIO(manifest.encode()), out_file, key, header)
+    return out_file.getvalue()
+
+
+def unpack_manifest(data: bytes, key: bytes) -> Tuple[List[ArchiveMember], int]:
+    """Расшифровывает манифест из базы и возвращает (члены, размер контейнера)"""
+    manifest = io.BytesIO()
+    file_format.decrypt_stream(io.BytesIO(data), manifest, key)
+    manifest = json.loads(manifest.getvalue())
+    return [ArchiveMember(**member) for member in manifest["members"]], manifest["archive_size"]
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(in_file: BinaryIO, key: bytes) -> List[ArchiveMember]:
+    """Читает список членов контейнера, не расшифровывая их содержимое"""
+    in_file.seek(0)
+    if in_file.read(len(MAGIC) + 1) != MAGIC + bytes([VERSION]):
+        raise ValueError("Файл не является контейнером папки")
+    end = in_file.seek(0, io.SEEK_END)
+    if end < len(MAGIC) + 1 + _FOOTER.size:
+        raise ValueError("Контейнер поврежден: нет концовки")
+    in_file.seek(end - _FOOTER.size)
+    manifest_offset, footer_magic = _FOOTER.unpack(in_file.read(_FOOTER.size))
+    if footer_magic != FOOTER_MAGIC or manifest_offset > end - _FOOTER.size:
+        raise ValueError("Контейнер поврежден: нет концовки")
+
+    in_file.seek(manifest_offset)
+    manifest = io.BytesIO()
+    file_format.decrypt_stream(_Region(in_file, end - _FOOTER.size - manifest_offset), manifest, key)
+    return [ArchiveMember(**member) for member in json.loads(manifest.getvalue())["members"]]
+
+
+def select_members(members: Iterable[ArchiveMember], paths: Iterable[str]) -> List[ArchiveMember]:
+    """Отбирает члены по путям; путь папки выбирает все ее содержимое"""
+    prefixes = [path.strip("/") for path in paths]
+    return [
+        member for member in members
+        if any(member.path == prefix or member.path.startswith(prefix + "/") for prefix in prefixes)
+    ]
+
+
+def extract_members(in_file: BinaryIO, key: bytes, members: List[ArchiveMember], output_folder: str,
+                    progress_callback: Callable[[int, int], None] = None, workers: int = 1) -> None:
+    """Восстанавливает выбранные члены контейнера в output_folder
+
+    progress_callback(восстановлено_байт, всего_байт) вызывается после каждого блока.
+    """
+    total_size = sum(member.size for member in members)
+    done = 0
+    os.makedirs(output_folder, exist_ok=True)
+    for member in members:
+        target = _target_path(output_folder, member.path)
+        if member.is_dir:
+            os.makedirs(target, exist_ok=True)
+            continue
+
+        in_file.seek(member.offset)
+        header = file_format.read_header(in_file)
+        if header.file_salt.hex() != member.file_salt:
+            raise ValueError(f"Контейнер поврежден: поток не соответствует файлу {member.path}")
+        in_file.seek(member.offset)
+
+        def report(consumed, base=done, member=member):
+            # Для потока известен прочитанный объем шифртекста, пересчитываем в байты файла
+            progress_callback(base + member.size * consumed // member.length, total_size)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as out_file:
+            file_format.decrypt_stream(
+                _Region(in_file, member.length), out_file, key,
+                report if progress_callback else None, workers
+            )
+        os.utime(target, (member.mtime, member.mtime))
+        done += member.size
+
+    # Время папок восстанавливаем после файлов, запись в папку его меняет
+    for member in members:
+        if member.is_dir:
+            target = _target_path(output_folder, member.path)
+            os.utime(target, (member.mtime, member.mtime))
+
+
+def _target_path(output_folder: str, path: str) -> str:
+    """Путь члена внутри output_folder; пути, выходящие за нее, отклоняются"""
+    relative = os.path.normpath(path)
+    if os.path.isabs(relative) or relative == ".." or relative.startswith(".." + os.sep):
+        raise ValueError(f"Недопустимый путь в контейнере: {path}")
+    return os.path.join(output_folder, relative)
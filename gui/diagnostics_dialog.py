@@ -0,0 +1,128 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox,
+                            QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+                            QHeaderView, QFileDialog, QMessageBox)
+from PyQt6.QtCore import Qt, QTimer
+from database.db_manager import DatabaseManager
+from instrumentation import instrumentation
+from typing import Optional
+
+# Ключи таблицы settings
+ENABLED_SETTING = "instrumentation_enabled"
+LOG_SETTING = "instrumentation_log"
+
+
+def apply_saved_settings(db_manager: DatabaseManager) -> Optional[str]:
+    """Включает замеры, если они были включены в прошлый раз
+
+    Возвращает ошибку открытия журнала или None; без журнала замеры все равно идут.
+    """
+    if db_manager.get_setting(ENABLED_SETTING) != "1":
+        return None
+    instrumentation.configure(enabled=True, log_path=db_manager.get_setting(LOG_SETTING) or None)
+    return instrumentation.log_error
+
+
+class DiagnosticsDialog(QDialog):
+    """Сводка замеров времени операций: KDF, шифры, база данных, файлы"""
+
+    COLUMNS = ("Операция", "Вызовов", "Ошибок", "Среднее, мс", "p50, мс", "p95, мс",
+               "Макс., мс", "Всего, мс", "МБ", "МБ/с")
+
+    def __init__(self, db_manager: DatabaseManager = None, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager or DatabaseManager()
+        self.setWindowTitle("Диагностика")
+        self.setMinimumSize(800, 450)
+
+        layout = QVBoxLayout(self)
+
+        self.enabled_check = QCheckBox("Собирать замеры")
+        self.enabled_check.setChecked(instrumentation.enabled)
+        self.enabled_check.toggled.connect(self.apply_settings)
+        layout.addWidget(self.enabled_check)
+
+        log_layout = QHBoxLayout()
+        log_layout.addWidget(QLabel("Журнал JSON (пусто — не писать):"))
+        self.log_edit = QLineEdit(instrumentation.log_path or "")
+        if instrumentation.log_error:
+            self.log_edit.setPlaceholderText(instrumentation.log_error)
+        self.log_edit.editingFinished.connect(self.apply_settings)
+        browse_button = QPushButton("Обзор...")
+        browse_button.clicked.connect(self.choose_log)
+        log_layout.addWidget(self.log_edit)
+        log_layout.addWidget(browse_button)
+        layout.addLayout(log_layout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        # Кнопки
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("Обновить")
+        refresh_button.clicked.connect(self.refresh)
+        reset_button = QPushButton("Сбросить")
+        reset_button.clicked.connect(self.reset)
+        export_button = QPushButton("Сохранить в JSON...")
+        export_button.clicked.connect(self.export)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(export_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        # Пока окно открыто, сводка обновляется раз в секунду
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def apply_settings(self):
+        """Включает или выключает замеры и запоминает выбор"""
+        enabled = self.enabled_check.isChecked()
+        log_path = self.log_edit.text().strip() or None
+        instrumentation.configure(enabled=enabled, log_path=log_path)
+        if instrumentation.log_error:
+            # Замеры включены и без журнала, неверный путь не сохраняем
+            QMessageBox.warning(self, "Ошибка", instrumentation.log_error)
+            self.log_edit.clear()
+            log_path = None
+        self.db_manager.save_setting(ENABLED_SETTING, "1" if enabled else "0")
+        self.db_manager.save_setting(LOG_SETTING, log_path or "")
+
+    def choose_log(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Журнал замеров", "", "JSON Lines (*.jsonl)")
+        if path:
+            self.log_edit.setText(path)
+            self.apply_settings()
+
+    def refresh(self):
+        """Перерисовывает таблицу по текущей сводке"""
+        snapshot = instrumentation.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, (name, stats) in enumerate(snapshot.items()):
+            values = (
+                name, stats["count"], stats["errors"], stats["mean_ms"], stats["p50_ms"],
+                stats["p95_ms"], stats["max_ms"], stats["total_ms"],
+                stats["bytes"] / (1024 * 1024), stats["mb_per_s"],
+            )
+            for column, value in enumerate(values):
+                text = f"{value:.2f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить замеры", "diagnostics.json", "JSON (*.json)")
+        if path:
+            instrumentation.export(path)
@@ -0,0 +1,189 @@
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, QThreadPool, pyqtSignal
+from typing import Optional
+from database import events
+import os
+
+
+class EntryListModel(QAbstractListModel):
+    """Модель списка сохраненных данных, загружающая строки страницами по запросу"""
+    IdRole = Qt.ItemDataRole.UserRole
+    TypeRole = Qt.ItemDataRole.UserRole + 1
+    AlgorithmRole = Qt.ItemDataRole.UserRole + 2
+    NameRole = Qt.ItemDataRole.UserRole + 3
+
+    PAGE_SIZE = 200
+
+    # Переносит события базы из рабочих потоков в поток GUI
+    _changes = pyqtSignal(object)
+    # Страница, прочитанная в фоновом потоке: (поколение, строки, курсор, ошибка)
+    _page_ready = pyqtSignal(object)
+    # Первая страница после reload() загружена
+    loaded = pyqtSignal()
+    # Фоновая загрузка не удалась, аргумент — текст ошибки
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.data_type: Optional[str] = None
+        self.algorithm: Optional[str] = None
+        self._rows = []
+        self._keys = set()
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._generation = 0
+        # События, пришедшие во время фоновой загрузки: применяются к загруженной странице
+        self._pending_changes = []
+        self._changes.connect(self.apply_change)
+        self._page_ready.connect(self._apply_page)
+        db_manager.subscribe(self._on_db_change)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        data_id, name, algorithm, data_type, _ = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if data_type == 'text':
+                return f"📝 {name} ({algorithm})"
+            # Для файлов показываем только имя файла
+            return f"📄 {os.path.basename(name)} ({algorithm})"
+        if role == self.IdRole:
+            return data_id
+        if role == self.TypeRole:
+            return data_type
+        if role == self.AlgorithmRole:
+            return algorithm
+        if role == self.NameRole:
+            return name
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        """Загружает следующую страницу записей"""
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        rows, cursor = self.db_manager.list_entries(
+            self.PAGE_SIZE, self._cursor, self.data_type, self.algorithm
+        )
+        self._append_page(rows, cursor)
+
+    def _append_page(self, rows, cursor) -> None:
+        self._cursor = cursor
+        self._exhausted = cursor is None
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self._keys.update((row[3], row[0]) for row in rows)
+            self.endInsertRows()
+
+    def _on_db_change(self, event: events.ChangeEvent) -> None:
+        # Вызывается в потоке, закоммитившем изменение
+        self._changes.emit(event)
+
+    def apply_change(self, event: events.ChangeEvent) -> None:
+        """Применяет к загруженным строкам только изменившиеся записи"""
+        if event.data_type not in ('text', 'file'):
+            return
+        if self._loading:
+            self._pending_changes.append(event)
+            return
+        if event.action in (events.DELETE, events.UPDATE):
+            changed = {(event.data_type, data_id) for data_id in event.ids}
+            for row_index in reversed(range(len(self._rows))):
+                row = self._rows[row_index]
+                if (row[3], row[0]) in changed:
+                    self.beginRemoveRows(QModelIndex(), row_index, row_index)
+                    del self._rows[row_index]
+                    self._keys.discard((row[3], row[0]))
+                    self.endRemoveRows()
+
+        if event.action in (events.INSERT, events.UPDATE):
+            for row in self.db_manager.get_entries_by_ids(event.data_type, event.ids):
+                if self._matches(row) and (row[3], row[0]) not in self._keys:
+                    self._insert_row(row)
+
+    def _matches(self, row) -> bool:
+        return ((self.data_type is None or row[3] == self.data_type)
+                and (self.algorithm is None or row[2] == self.algorithm))
+
+    def _insert_row(self, row) -> None:
+        """Вставляет строку на ее место в порядке (created_at, type, id) по убыванию"""
+        key = (row[4], row[3], row[0])
+        low, high = 0, len(self._rows)
+        while low < high:
+            middle = (low + high) // 2
+            other = self._rows[middle]
+            if (other[4], other[3], other[0]) > key:
+                low = middle + 1
+            else:
+                high = middle
+        # Строка за концом загруженной части придет со следующей страницей
+        if low == len(self._rows) and not self._exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), low, low)
+        self._rows.insert(low, row)
+        self._keys.add((row[3], row[0]))
+        self.endInsertRows()
+
+    def set_filter(self, data_type: Optional[str] = None, algorithm: Optional[str] = None,
+                   asynchronous: bool = False) -> None:
+        """Меняет фильтр и загружает список заново (asynchronous — как в reload)"""
+        self.data_type = data_type
+        self.algorithm = algorithm
+        self.reload(asynchronous)
+
+    def reload(self, asynchronous: bool = False) -> None:
+        """Сбрасывает загруженные строки и загружает первую страницу
+
+        С asynchronous=True страница читается в фоновом потоке, а строки
+        появляются в списке по сигналу; результат устаревшей загрузки
+        (фильтр сменился раньше) отбрасывается.
+        """
+        self.beginResetModel()
+        self._rows = []
+        self._keys = set()
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._pending_changes = []
+        self._generation += 1
+        self.endResetModel()
+        if not asynchronous:
+            self.fetchMore()
+            self.loaded.emit()
+            return
+
+        self._loading = True
+        generation, data_type, algorithm = self._generation, self.data_type, self.algorithm
+
+        def load():
+            try:
+                rows, cursor = self.db_manager.list_entries(self.PAGE_SIZE, None, data_type, algorithm)
+            except Exception as e:
+                self._page_ready.emit((generation, None, None, str(e)))
+            else:
+                self._page_ready.emit((generation, rows, cursor, None))
+
+        QThreadPool.globalInstance().start(load)
+
+    def _apply_page(self, page) -> None:
+        generation, rows, cursor, error = page
+        if generation != self._generation:
+            return
+        self._loading = False
+        if error is not None:
+            self._pending_changes = []
+            self.load_failed.emit(error)
+            return
+        self._append_page(rows, cursor)
+        pending, self._pending_changes = self._pending_changes, []
+        for event in pending:
+            self.apply_change(event)
+        self.loaded.emit()
@@ -0,0 +1,164 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from typing import Callable, Dict, Optional
+import itertools
+import threading
+
+
+class JobCancelledError(Exception):
+    """Задача была отменена пользователем"""
+
+
+class JobSignals(QObject):
+    """Сигналы, которые задача отправляет из рабочего потока"""
+    started = pyqtSignal(int)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+
+class Job(QRunnable):
+    """Фоновая задача: вызывает func(job, *args, **kwargs) в пуле потоков
+
+    Функция может сообщать прогресс через job.report_progress(done, total);
+    этот же вызов прерывает задачу исключением JobCancelledError после отмены.
+    """
+
+    def __init__(self, job_id: int, title: str, func: Callable, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.title = title
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+        self._last_percent = -1
+
+    def cancel(self) -> None:
+        """Запрашивает отмену задачи"""
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        """Прерывает задачу, если была запрошена отмена"""
+        if self._cancel_event.is_set():
+            raise JobCancelledError(f"Задача «{self.title}» отменена")
+
+    def report_progress(self, done: int, total: int) -> None:
+        """Сообщает прогресс и проверяет отмену"""
+        self.check_cancelled()
+        percent = min(100, int(done * 100 / total)) if total else 100
+        # Не засоряем очередь событий GUI одинаковыми значениями
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.signals.progress.emit(self.job_id, percent)
+
+    def run(self) -> None:
+        if self.is_cancelled:
+            self.signals.cancelled.emit(self.job_id)
+            return
+
+        self.signals.started.emit(self.job_id)
+        try:
+            result = self.func(self, *self.args, **self.kwargs)
+        except JobCancelledError:
+            self.signals.cancelled.emit(self.job_id)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+        else:
+            self.signals.finished.emit(self.job_id, result)
+
+
+class JobRunner(QObject):
+    """Очередь фоновых задач поверх QThreadPool
+
+    Все сигналы и обработчики on_success/on_error вызываются в потоке GUI.
+    """
+    job_added = pyqtSignal(int, str)
+    job_started = pyqtSignal(int)
+    job_progress = pyqtSignal(int, int)
+    job_done = pyqtSignal(int, str)
+
+    STATUS_FINISHED = "finished"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+
+    _job_ids = itertools.count(1)
+
+    def __init__(self, parent=None, max_workers: Optional[int] = None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_workers:
+            self.pool.setMaxThreadCount(max_workers)
+        self.jobs: Dict[int, Job] = {}
+        self._callbacks: Dict[int, tuple] = {}
+
+    def submit(self, title: str, func: Callable, *args,
+               on_success: Callable = None, on_error: Callable = None,
+               **kwargs) -> Job:
+        """Ставит задачу в очередь и возвращает её"""
+        job = Job(next(self._job_ids), title, func, *args, **kwargs)
+        job.signals.started.connect(self._on_started)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.cancelled.connect(self._on_cancelled)
+
+        self.jobs[job.job_id] = job
+        self._callbacks[job.job_id] = (on_success, on_error)
+        self.job_added.emit(job.job_id, title)
+        self.pool.start(job)
+        return job
+
+    def cancel(self, job_id: int) -> None:
+        """Отменяет задачу; задача из очереди не будет запущена"""
+        job = self.jobs.get(job_id)
+        if job:
+            job.cancel()
+
+    def cancel_all(self) -> None:
+        for job in list(self.jobs.values()):
+            job.cancel()
+
+    def active_count(self) -> int:
+        return len(self.jobs)
+
+    def shutdown(self) -> None:
+        """Отменяет все задачи и дожидается завершения потоков"""
+        self.cancel_all()
+        self.pool.waitForDone()
+
+    @pyqtSlot(int)
+    def _on_started(self, job_id: int) -> None:
+        self.job_started.emit(job_id)
+
+    @pyqtSlot(int, int)
+    def _on_progress(self, job_id: int, percent: int) -> None:
+        self.job_progress.emit(job_id, percent)
+
+    @pyqtSlot(int, object)
+    def _on_finished(self, job_id: int, result) -> None:
+        on_success, _ = self._finish(job_id, self.STATUS_FINISHED)
+        if on_success:
+            on_success(result)
+
+    @pyqtSlot(int, str)
+    def _on_failed(self, job_id: int, message: str) -> None:
+        _, on_error = self._finish(job_id, self.STATUS_FAILED)
+        if on_error:
+            on_error(message)
+
+    @pyqtSlot(int)
+    def _on_cancelled(self, job_id: int) -> None:
+        self._finish(job_id, self.STATUS_CANCELLED)
+
+    def _finish(self, job_id: int, status: str) -> tuple:
+        self.jobs.pop(job_id, None)
+        callbacks = self._callbacks.pop(job_id, (None, None))
+        self.job_done.emit(job_id, status)
+        return callbacks
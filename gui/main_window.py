@@ -2,14 +2,24 @@ from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QLineEdit, QComboBox, QPushButton, 
     QTextEdit, QListWidget, QMessageBox, QInputDialog,
-    QTabWidget, QFileDialog, QListWidgetItem
+    QTabWidget, QFileDialog, QListWidgetItem, QListView, QDialog
 )
-from PyQt6.QtCore import Qt, QMimeData
+from PyQt6.QtCore import Qt, QMimeData, QTimer
 from PyQt6.QtGui import QDragEnterEvent, QDropEvent
 from encryption.encryptor_factory import EncryptorFactory
 from database.db_manager import DatabaseManager
-from .settings_window import SettingsWindow
+from database.connection import close_all_pools
+from instrumentation import instrumentation
+from key_cache import key_cache
+from .job_runner import JobRunner
+from .entry_list_model import EntryListModel
+from .restore_dialog import RestoreDialog
+from .diagnostics_dialog import apply_saved_settings
 import os
+import time
+
+# Модули с cryptography (хранилище, настройки, пакетное шифрование, перешифрование)
+# импортируются после первой отрисовки окна или при первом использовании
 
 class DropArea(QWidget):
     def __init__(self, parent=None):
@@ -51,16 +61,60 @@ class DropArea(QWidget):
         self.file_list.clear()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, started_at: float = None):
         super().__init__()
         self.setWindowTitle("passwords")
         self.setMinimumSize(800, 600)
+        # Отсчет времени до первого окна (main.py передает время запуска процесса)
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_paint_done = False
         
         self.db_manager = DatabaseManager()
-        self.current_encryptor = None
+        instrumentation_error = apply_saved_settings(self.db_manager)
+        self.vault = None
+        self.settings = None
+        self.job_runner = JobRunner(self)
+        self.job_runner.job_added.connect(self.on_job_added)
+        self.job_runner.job_started.connect(self.on_job_started)
+        self.job_runner.job_progress.connect(self.on_job_progress)
+        self.job_runner.job_done.connect(self.on_job_done)
+        self.job_items = {}
         
         self.setup_ui()
+        if instrumentation_error:
+            self.statusBar().showMessage(instrumentation_error, 10000)
+        # Таймер срабатывает, когда цикл событий уже показал и отрисовал окно
+        QTimer.singleShot(0, self.finish_startup)
+        
+    def finish_startup(self):
+        """Загружает то, что не нужно для первого кадра: хранилище, настройки, список записей"""
+        from encryption_settings import EncryptionSettings
+        from vault import Vault
+        
+        self.vault = Vault(self.db_manager)
+        self.settings = EncryptionSettings()
+        self.settings.apply_key_cache_settings()
+        # Новые настройки кэша ключей применяются сразу после сохранения
+        self.settings.subscribe(lambda _: self.settings.apply_key_cache_settings())
+        self.update_vault_state()
+        
+        self.entry_model.loaded.connect(self.on_first_page_loaded)
         self.load_encrypted_data_list()
+        if self.db_manager.get_active_rekey_job() is not None:
+            self.statusBar().showMessage(
+                "Перешифрование записей не завершено. Нажмите «Перешифровать записи...», чтобы продолжить"
+            )
+        
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            instrumentation.record("startup.first_window", time.perf_counter() - self.started_at)
+            
+    def on_first_page_loaded(self):
+        """Отмечает время, когда список записей появился после запуска"""
+        self.entry_model.loaded.disconnect(self.on_first_page_loaded)
+        instrumentation.record("startup.sidebar", time.perf_counter() - self.started_at)
         
     def setup_ui(self):
         # Создаем центральный виджет
@@ -76,13 +130,55 @@ class MainWindow(QMainWindow):
         sidebar_layout = QVBoxLayout(sidebar)
         
         # Список зашифрованных данных
-        self.data_list = QListWidget()
-        self.data_list.itemClicked.connect(self.on_data_selected)
+        self.entry_model = EntryListModel(self.db_manager, self)
+        self.entry_model.load_failed.connect(self.on_entry_list_failed)
+        self.data_list = QListView()
+        self.data_list.setUniformItemSizes(True)
+        self.data_list.setModel(self.entry_model)
+        self.data_list.clicked.connect(self.on_data_selected)
+        
+        # Фильтр по типу записей
+        self.entry_filter_combo = QComboBox()
+        self.entry_filter_combo.addItem("Все", None)
+        self.entry_filter_combo.addItem("Тексты", 'text')
+        self.entry_filter_combo.addItem("Файлы", 'file')
+        self.entry_filter_combo.currentIndexChanged.connect(self.on_entry_filter_changed)
         
         sidebar_layout.addWidget(QLabel("Сохраненные данные:"))
+        sidebar_layout.addWidget(self.entry_filter_combo)
         sidebar_layout.addWidget(self.data_list)
         
+        # Очередь фоновых задач
+        self.jobs_list = QListWidget()
+        self.jobs_list.setMaximumHeight(120)
+        sidebar_layout.addWidget(QLabel("Задачи:"))
+        sidebar_layout.addWidget(self.jobs_list)
+        
+        cancel_job_btn = QPushButton("Отменить задачу")
+        cancel_job_btn.clicked.connect(self.cancel_selected_job)
+        sidebar_layout.addWidget(cancel_job_btn)
+        
         # Кнопка настроек
+        self.vault_btn = QPushButton("🔓 Открыть хранилище")
+        self.vault_btn.setToolTip("Записи хранилища открываются одним мастер-паролем")
+        self.vault_btn.clicked.connect(self.open_vault)
+        sidebar_layout.addWidget(self.vault_btn)
+        
+        self.change_master_btn = QPushButton("Сменить мастер-пароль")
+        self.change_master_btn.clicked.connect(self.change_master_password)
+        self.change_master_btn.setEnabled(False)
+        sidebar_layout.addWidget(self.change_master_btn)
+        
+        lock_btn = QPushButton("🔒 Заблокировать")
+        lock_btn.setToolTip("Удалить из памяти все ключи, вычисленные за сессию")
+        lock_btn.clicked.connect(self.lock_vault)
+        sidebar_layout.addWidget(lock_btn)
+        
+        rekey_btn = QPushButton("Перешифровать записи...")
+        rekey_btn.setToolTip("Перевести записи на текущие параметры KDF и шифра файлов")
+        rekey_btn.clicked.connect(self.rekey_entries)
+        sidebar_layout.addWidget(rekey_btn)
+        
         settings_btn = QPushButton("⚙️ Расширенные настройки")
         settings_btn.clicked.connect(self.show_settings)
         sidebar_layout.addWidget(settings_btn)
@@ -94,7 +190,11 @@ class MainWindow(QMainWindow):
         # Создаем вкладки
         self.tab_widget = QTabWidget()
         self.setup_text_tab()
-        self.setup_files_tab()
+        # Вкладка файлов строится при первом открытии
+        self.files_tab = QWidget()
+        self.files_tab_ready = False
+        self.tab_widget.addTab(self.files_tab, "Файлы")
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         content_layout.addWidget(self.tab_widget)
         
         # Добавляем sidebar и основной контент в главный layout
@@ -146,9 +246,16 @@ class MainWindow(QMainWindow):
         
         self.tab_widget.addTab(text_tab, "Текст")
         
+    def on_tab_changed(self, index):
+        if self.tab_widget.widget(index) is self.files_tab:
+            self.setup_files_tab()
+            
     def setup_files_tab(self):
-        files_tab = QWidget()
-        layout = QVBoxLayout(files_tab)
+        """Строит вкладку файлов, если она еще не построена"""
+        if self.files_tab_ready:
+            return
+        self.files_tab_ready = True
+        layout = QVBoxLayout(self.files_tab)
         
         # Выбор алгоритма
         algo_layout = QHBoxLayout()
@@ -176,11 +283,16 @@ class MainWindow(QMainWindow):
         self.files_encrypt_btn.clicked.connect(self.encrypt_files)
         self.files_decrypt_btn = QPushButton("Расшифровать")
         self.files_decrypt_btn.clicked.connect(self.decrypt_files)
+        self.files_restore_btn = QPushButton("Восстановить выбранное...")
+        self.files_restore_btn.setToolTip("Восстановить отдельные файлы из зашифрованной папки")
+        self.files_restore_btn.clicked.connect(self.restore_selected)
         button_layout.addWidget(self.files_encrypt_btn)
         button_layout.addWidget(self.files_decrypt_btn)
+        button_layout.addWidget(self.files_restore_btn)
         layout.addLayout(button_layout)
         
-        self.tab_widget.addTab(files_tab, "Файлы")
+        if self.vault is not None:
+            self.update_vault_state()
         
     def encrypt_text(self):
         """Шифрует и сохраняет текстовые данные"""
@@ -190,8 +302,9 @@ class MainWindow(QMainWindow):
             return
             
         password = self.text_password_input.text()
-        if not password:
-            QMessageBox.warning(self, "Ошибка", "Введите пароль")
+        use_vault = not password and self.vault.is_unlocked
+        if not password and not use_vault:
+            QMessageBox.warning(self, "Ошибка", "Введите пароль или откройте хранилище")
             return
             
         data = self.text_data_input.toPlainText()
@@ -200,59 +313,83 @@ class MainWindow(QMainWindow):
             return
             
         algorithm = self.text_algo_combo.currentText()
-        self.current_encryptor = EncryptorFactory.create_encryptor(algorithm)
-        self.current_encryptor.generate_key(password)
         
-        try:
+        def run(job):
+            encryptor = EncryptorFactory.create_encryptor(algorithm)
+            wrapped_key = None
+            if use_vault:
+                wrapped_key = self.vault.prepare_encryptor(encryptor)
+            else:
+                encryptor.generate_key(password)
+            job.check_cancelled()
+            
             # Шифруем данные
-            encrypted_data = self.current_encryptor.encrypt_data(data)
+            encrypted_data = encryptor.encrypt_data(data)
+            job.check_cancelled()
             
             # Сохраняем в базу данных
             self.db_manager.save_encrypted_data(
                 name=name,
                 encrypted_data=encrypted_data,
-                salt=self.current_encryptor.salt,
-                algorithm=algorithm
+                salt=encryptor.salt,
+                algorithm=algorithm,
+                wrapped_key=wrapped_key,
+                kdf_params=encryptor.kdf_params,
+                cipher_params=encryptor.cipher_params
             )
-            
-            self.load_encrypted_data_list()
-            self.text_data_input.clear()
-            self.text_password_input.clear()
+        
+        def on_success(_):
             QMessageBox.information(self, "Успех", "Данные успешно зашифрованы")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось зашифровать данные: {str(e)}")
+        
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось зашифровать данные: {message}")
+        
+        # Данные уже переданы задаче, поля можно освободить для следующей записи
+        self.text_data_input.clear()
+        self.text_password_input.clear()
+        self.job_runner.submit(
+            f"Шифрование «{name}»", run,
+            on_success=on_success, on_error=on_error
+        )
             
     def decrypt_text(self):
         """Расшифровывает выбранные текстовые данные"""
-        current_item = self.data_list.currentItem()
-        if not current_item:
+        current_item = self.data_list.currentIndex()
+        if not current_item.isValid():
             return
             
-        data_id = current_item.data(Qt.ItemDataRole.UserRole)
-        data_type = current_item.data(Qt.ItemDataRole.UserRole + 1)
+        data_id = current_item.data(EntryListModel.IdRole)
+        data_type = current_item.data(EntryListModel.TypeRole)
         
         if data_type != 'text':
             QMessageBox.warning(self, "Ошибка", "Выбранный элемент не является текстом")
             return
             
-        password, ok = QInputDialog.getText(
-            self, "Расшифровка", 
-            "Введите пароль:", QLineEdit.EchoMode.Password
-        )
-        if not ok or not password:
+        password = self.ask_entry_password('text', data_id)
+        if password is None:
             return
             
-        algorithm = self.text_algo_combo.currentText()
-        self.current_encryptor = EncryptorFactory.create_encryptor(algorithm)
+        def run(job):
+            # Алгоритм и движок берутся из записи, а не из выбора в интерфейсе
+            encrypted_data, salt, algorithm = self.db_manager.get_encrypted_data_by_id(data_id, 'text')
+            encryptor = EncryptorFactory.create_for_record(
+                algorithm, self.db_manager.get_cipher_params(data_id, 'text')
+            )
+            self.load_entry_key(encryptor, 'text', data_id, password, salt)
+            job.check_cancelled()
+            return encryptor.decrypt_data(encrypted_data)
         
-        try:
-            encrypted_data, salt, _ = self.db_manager.get_encrypted_data_by_id(data_id, 'text')
-            self.current_encryptor.load_key(password, salt)
-            decrypted_data = self.current_encryptor.decrypt_data(encrypted_data)
+        def on_success(decrypted_data):
             self.text_data_input.setText(decrypted_data)
             self.tab_widget.setCurrentIndex(0)  # Переключаемся на вкладку с текстом
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось расшифровать данные: {str(e)}")
+        
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось расшифровать данные: {message}")
+        
+        self.job_runner.submit(
+            f"Расшифровка «{current_item.data(EntryListModel.NameRole)}»", run,
+            on_success=on_success, on_error=on_error
+        )
             
     def encrypt_files(self):
         """Шифрует выбранные файлы"""
@@ -262,136 +399,402 @@ class MainWindow(QMainWindow):
             return
             
         password = self.files_password_input.text()
-        if not password:
-            QMessageBox.warning(self, "Ошибка", "Введите пароль")
+        use_vault = not password and self.vault.is_unlocked
+        if not password and not use_vault:
+            QMessageBox.warning(self, "Ошибка", "Введите пароль или откройте хранилище")
             return
             
         algorithm = self.files_algo_combo.currentText()
-        self.current_encryptor = EncryptorFactory.create_encryptor(algorithm, file_mode=True)
-        self.current_encryptor.generate_key(password)
         
-        try:
-            for file_path in files:
-                is_folder = os.path.isdir(file_path)
-                if is_folder:
-                    encrypted_path = self.current_encryptor.encrypt_folder(file_path)
-                else:
-                    encrypted_path = self.current_encryptor.encrypt_file(file_path)
-                    
-                # Сохраняем информацию в базу данных
-                self.db_manager.save_encrypted_file(
-                    original_path=file_path,
-                    encrypted_path=encrypted_path,
-                    salt=self.current_encryptor.salt,
-                    algorithm=algorithm,
-                    is_folder=is_folder
-                )
-            
-            self.drop_area.clear()
-            self.files_password_input.clear()
-            self.load_encrypted_data_list()
-            QMessageBox.information(self, "Успех", "Файлы успешно зашифрованы")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось зашифровать файлы: {str(e)}")
+        def run(job):
+            from file_batch import FileBatchEncryptor
+            
+            # Файлы шифруются параллельно, записи сохраняются одной пакетной вставкой
+            batch = FileBatchEncryptor(self.db_manager, algorithm)
+            return batch.encrypt(
+                files,
+                password=None if use_vault else password,
+                vault=self.vault if use_vault else None,
+                progress_callback=job.report_progress
+            )
+        
+        def on_success(results):
+            errors = [result for result in results if result.error]
+            if not errors:
+                QMessageBox.information(self, "Успех", "Файлы успешно зашифрованы")
+                return
+            details = "\n".join(f"{result.path}: {result.error}" for result in errors[:10])
+            QMessageBox.warning(
+                self, "Ошибка",
+                f"Зашифровано файлов: {len(results) - len(errors)} из {len(results)}\n\n{details}"
+            )
+        
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось зашифровать файлы: {message}")
+        
+        self.drop_area.clear()
+        self.files_password_input.clear()
+        self.job_runner.submit(
+            f"Шифрование файлов ({len(files)})", run,
+            on_success=on_success, on_error=on_error
+        )
             
     def decrypt_files(self):
         """Расшифровывает выбранные файлы"""
-        current_item = self.data_list.currentItem()
-        if not current_item:
+        current_item = self.data_list.currentIndex()
+        if not current_item.isValid():
             return
             
-        data_id = current_item.data(Qt.ItemDataRole.UserRole)
-        data_type = current_item.data(Qt.ItemDataRole.UserRole + 1)
+        data_id = current_item.data(EntryListModel.IdRole)
+        data_type = current_item.data(EntryListModel.TypeRole)
         
         if data_type != 'file':
             QMessageBox.warning(self, "Ошибка", "Выбранный элемент не является файлом")
             return
             
-        password, ok = QInputDialog.getText(
-            self, "Расшифровка", 
-            "Введите пароль:", QLineEdit.EchoMode.Password
-        )
-        if not ok or not password:
+        password = self.ask_entry_password('file', data_id)
+        if password is None:
             return
             
         try:
             # Получаем информацию о файле
             original_path, encrypted_path, salt, algorithm, is_folder = self.db_manager.get_file_info(data_id)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось расшифровать файл: {str(e)}")
+            return
             
-            # Запрашиваем путь для сохранения
-            if is_folder:
-                save_path = QFileDialog.getExistingDirectory(
-                    self, 
-                    "Выберите папку для сохранения расшифрованной директории"
-                )
-            else:
-                default_name = os.path.basename(original_path)
-                save_path, _ = QFileDialog.getSaveFileName(
-                    self,
-                    "Сохранить расшифрованный файл",
-                    default_name,
-                    "Все файлы (*.*)"
-                )
-                
-            if not save_path:  # Пользователь отменил выбор
-                return
-                
+        # Запрашиваем путь для сохранения
+        if is_folder:
+            save_path = QFileDialog.getExistingDirectory(
+                self, 
+                "Выберите папку для сохранения расшифрованной директории"
+            )
+        else:
+            default_name = os.path.basename(original_path)
+            save_path, _ = QFileDialog.getSaveFileName(
+                self,
+                "Сохранить расшифрованный файл",
+                default_name,
+                "Все файлы (*.*)"
+            )
+            
+        if not save_path:  # Пользователь отменил выбор
+            return
+        
+        def run(job):
             # Создаем шифровальщик и загружаем ключ
-            self.current_encryptor = EncryptorFactory.create_encryptor(algorithm, file_mode=True)
-            self.current_encryptor.load_key(password, salt)
+            encryptor = EncryptorFactory.create_for_record(
+                algorithm, self.db_manager.get_cipher_params(data_id, 'file'), file_mode=True
+            )
+            self.load_entry_key(encryptor, 'file', data_id, password, salt)
+            job.check_cancelled()
             
             # Расшифровываем файл или папку
             if is_folder:
-                self.current_encryptor.decrypt_folder(encrypted_path, save_path)
+                encryptor.decrypt_folder(encrypted_path, save_path, job.report_progress)
             else:
-                self.current_encryptor.decrypt_file(encrypted_path, save_path)
-                
+                encryptor.decrypt_file(encrypted_path, save_path, job.report_progress)
+        
+        def on_success(_):
             QMessageBox.information(self, "Успех", "Файл успешно расшифрован")
+        
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось расшифровать файл: {message}")
+        
+        self.job_runner.submit(
+            f"Расшифровка {os.path.basename(original_path)}", run,
+            on_success=on_success, on_error=on_error
+        )
+            
+    def restore_selected(self):
+        """Восстанавливает отдельные файлы из зашифрованной папки"""
+        current_item = self.data_list.currentIndex()
+        if not current_item.isValid() or current_item.data(EntryListModel.TypeRole) != 'file':
+            QMessageBox.warning(self, "Ошибка", "Выберите зашифрованную папку")
+            return
+            
+        import folder_archive
+        
+        data_id = current_item.data(EntryListModel.IdRole)
+        try:
+            original_path, encrypted_path, salt, algorithm, is_folder = self.db_manager.get_file_info(data_id)
+            is_archive = is_folder and folder_archive.is_folder_archive(encrypted_path)
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось расшифровать файл: {str(e)}")
+            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть папку: {str(e)}")
+            return
+        if not is_archive:
+            QMessageBox.warning(
+                self, "Ошибка",
+                "Выборочное восстановление доступно только для папок, зашифрованных этой версией программы"
+            )
+            return
+            
+        password = self.ask_entry_password('file', data_id)
+        if password is None:
+            return
+            
+        def load_members(job):
+            encryptor = EncryptorFactory.create_for_record(
+                algorithm, self.db_manager.get_cipher_params(data_id, 'file'), file_mode=True
+            )
+            self.load_entry_key(encryptor, 'file', data_id, password, salt)
+            return encryptor, encryptor.list_folder(encrypted_path)
+        
+        def on_loaded(result):
+            encryptor, members = result
+            dialog = RestoreDialog(members, self)
+            if dialog.exec() != QDialog.DialogCode.Accepted:
+                return
+            paths = dialog.selected_paths()
+            if not paths:
+                return
+            save_path = QFileDialog.getExistingDirectory(
+                self,
+                "Выберите папку для восстановленных файлов"
+            )
+            if not save_path:
+                return
+                
+            def run(job):
+                encryptor.restore_folder(encrypted_path, paths, save_path, job.report_progress)
+            
+            def on_success(_):
+                QMessageBox.information(self, "Успех", f"Восстановлено файлов: {len(paths)}")
+            
+            self.job_runner.submit(
+                f"Восстановление из {os.path.basename(original_path)}", run,
+                on_success=on_success, on_error=on_error
+            )
+        
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось восстановить файлы: {message}")
+        
+        self.job_runner.submit(
+            f"Чтение списка файлов {os.path.basename(original_path)}", load_members,
+            on_success=on_loaded, on_error=on_error
+        )
             
     def on_data_selected(self, item):
         """Обработчик выбора данных из списка"""
-        data_type = item.data(Qt.ItemDataRole.UserRole + 1)
+        data_type = item.data(EntryListModel.TypeRole)
+        algorithm = item.data(EntryListModel.AlgorithmRole)
         
         if data_type == 'text':
             self.text_decrypt_btn.setEnabled(True)
-            self.text_name_input.setText(item.text().split(" (")[0])
-            algorithm = item.text().split("(")[1].rstrip(")")
+            self.text_name_input.setText(item.data(EntryListModel.NameRole))
             index = self.text_algo_combo.findText(algorithm)
             if index >= 0:
                 self.text_algo_combo.setCurrentIndex(index)
             self.tab_widget.setCurrentIndex(0)  # Переключаемся на вкладку с текстом
         else:
+            self.setup_files_tab()
             self.files_decrypt_btn.setEnabled(True)
-            algorithm = item.text().split("(")[1].rstrip(")")
             index = self.files_algo_combo.findText(algorithm)
             if index >= 0:
                 self.files_algo_combo.setCurrentIndex(index)
             self.tab_widget.setCurrentIndex(1)  # Переключаемся на вкладку с файлами
             
+    def ask_entry_password(self, data_type, data_id):
+        """Запрашивает пароль записи; для записей хранилища возвращает пустую строку
+        
+        None означает, что расшифровку нужно прервать.
+        """
+        if self.db_manager.get_entry_key(data_type, data_id) is not None:
+            if not self.vault.is_unlocked:
+                QMessageBox.warning(self, "Ошибка", "Запись принадлежит хранилищу. Сначала откройте хранилище")
+                return None
+            return ""
+            
+        password, ok = QInputDialog.getText(
+            self, "Расшифровка", 
+            "Введите пароль:", QLineEdit.EchoMode.Password
+        )
+        if not ok or not password:
+            return None
+        return password
+        
+    def load_entry_key(self, encryptor, data_type, data_id, password, salt):
+        """Загружает ключ записи: из хранилища или из пароля"""
+        wrapped_key = self.db_manager.get_entry_key(data_type, data_id)
+        if wrapped_key is not None:
+            self.vault.open_encryptor(encryptor, wrapped_key, salt)
+        else:
+            encryptor.load_key(password, salt, self.db_manager.get_kdf_params(data_id, data_type))
+            
+    def open_vault(self):
+        """Создает или разблокирует хранилище"""
+        if self.vault.is_unlocked:
+            return
+            
+        creating = not self.vault.exists()
+        prompt = "Придумайте мастер-пароль:" if creating else "Введите мастер-пароль:"
+        password, ok = QInputDialog.getText(
+            self, "Хранилище", prompt, QLineEdit.EchoMode.Password
+        )
+        if not ok or not password:
+            return
+        if creating:
+            confirm, ok = QInputDialog.getText(
+                self, "Хранилище", "Повторите мастер-пароль:", QLineEdit.EchoMode.Password
+            )
+            if not ok or confirm != password:
+                QMessageBox.warning(self, "Ошибка", "Пароли не совпадают")
+                return
+                
+        def run(job):
+            if creating:
+                self.vault.create(password)
+            else:
+                self.vault.unlock(password)
+                
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть хранилище: {message}")
+            
+        self.job_runner.submit(
+            "Открытие хранилища", run,
+            on_success=lambda _: self.update_vault_state(), on_error=on_error
+        )
+        
+    def change_master_password(self):
+        """Меняет мастер-пароль хранилища без перешифрования записей"""
+        old_password, ok = QInputDialog.getText(
+            self, "Хранилище", "Текущий мастер-пароль:", QLineEdit.EchoMode.Password
+        )
+        if not ok or not old_password:
+            return
+        new_password, ok = QInputDialog.getText(
+            self, "Хранилище", "Новый мастер-пароль:", QLineEdit.EchoMode.Password
+        )
+        if not ok or not new_password:
+            return
+            
+        def on_success(_):
+            self.update_vault_state()
+            QMessageBox.information(self, "Успех", "Мастер-пароль изменен")
+            
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сменить мастер-пароль: {message}")
+            
+        def run(job):
+            self.vault.change_password(old_password, new_password)
+            
+        self.job_runner.submit(
+            "Смена мастер-пароля", run,
+            on_success=on_success, on_error=on_error
+        )
+        
+    def rekey_entries(self):
+        """Перешифровывает записи под текущие настройки или продолжает прерванную задачу"""
+        password, ok = QInputDialog.getText(
+            self, "Перешифрование",
+            "Пароль записей (пусто — только записи открытого хранилища):",
+            QLineEdit.EchoMode.Password
+        )
+        if not ok:
+            return
+        if not password and not self.vault.is_unlocked:
+            QMessageBox.warning(self, "Ошибка", "Введите пароль или откройте хранилище")
+            return
+            
+        def run(job):
+            from rekey import RekeyEngine
+            
+            engine = RekeyEngine(self.db_manager, password or None, self.vault)
+            return engine.run(progress_callback=job.report_progress)
+            
+        def on_success(result):
+            QMessageBox.information(
+                self, "Перешифрование",
+                f"Перешифровано записей: {result.migrated}\n"
+                f"Пропущено: {result.skipped}\n"
+                f"С ошибкой (другой пароль или файл недоступен): {result.failed}"
+            )
+            
+        def on_error(message):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось перешифровать записи: {message}")
+            
+        self.job_runner.submit(
+            "Перешифрование записей", run,
+            on_success=on_success, on_error=on_error
+        )
+        
+    def update_vault_state(self):
+        """Обновляет кнопки хранилища"""
+        if self.vault.is_unlocked:
+            self.vault_btn.setText("✅ Хранилище открыто")
+            placeholder = "Пусто — ключ из хранилища"
+        else:
+            self.vault_btn.setText("🔓 Открыть хранилище")
+            placeholder = ""
+        self.change_master_btn.setEnabled(self.vault.exists())
+        self.text_password_input.setPlaceholderText(placeholder)
+        if self.files_tab_ready:
+            self.files_password_input.setPlaceholderText(placeholder)
+        
+    def lock_vault(self):
+        """Стирает ключи сессии, следующая расшифровка снова потребует KDF"""
+        key_cache.lock()
+        self.vault.lock()
+        self.update_vault_state()
+        self.statusBar().showMessage("Хранилище заблокировано", 5000)
+        
     def show_settings(self):
         """Открывает окно настроек"""
+        from .settings_window import SettingsWindow
+        
         settings_dialog = SettingsWindow(self)
         settings_dialog.exec()
 
+    def on_job_added(self, job_id, title):
+        """Добавляет задачу в список очереди"""
+        item = QListWidgetItem(f"⏳ {title}")
+        item.setData(Qt.ItemDataRole.UserRole, job_id)
+        item.setData(Qt.ItemDataRole.UserRole + 1, title)
+        self.jobs_list.addItem(item)
+        self.job_items[job_id] = item
+        
+    def on_job_started(self, job_id):
+        item = self.job_items.get(job_id)
+        if item:
+            item.setText(f"▶️ {item.data(Qt.ItemDataRole.UserRole + 1)}")
+            
+    def on_job_progress(self, job_id, percent):
+        item = self.job_items.get(job_id)
+        if item:
+            item.setText(f"▶️ {item.data(Qt.ItemDataRole.UserRole + 1)}: {percent}%")
+            
+    def on_job_done(self, job_id, status):
+        """Убирает завершенную задачу из списка очереди"""
+        item = self.job_items.pop(job_id, None)
+        if item:
+            self.jobs_list.takeItem(self.jobs_list.row(item))
+        if status == JobRunner.STATUS_CANCELLED and item:
+            self.statusBar().showMessage(
+                f"Задача отменена: {item.data(Qt.ItemDataRole.UserRole + 1)}", 5000
+            )
+            
+    def cancel_selected_job(self):
+        """Отменяет выбранную в очереди задачу"""
+        item = self.jobs_list.currentItem()
+        if item:
+            self.job_runner.cancel(item.data(Qt.ItemDataRole.UserRole))
+            
+    def closeEvent(self, event):
+        self.job_runner.shutdown()
+        close_all_pools()
+        super().closeEvent(event)
+
+    def on_entry_filter_changed(self, _index):
+        """Применяет фильтр по типу записей"""
+        self.entry_model.set_filter(self.entry_filter_combo.currentData(), asynchronous=True)
+
     def load_encrypted_data_list(self):
         """Загружает список зашифрованных данных в sidebar"""
-        self.data_list.clear()
-        try:
-            for data_id, name, algorithm, data_type in self.db_manager.get_all_encrypted_data():
-                if data_type == 'text':
-                    item_text = f"📝 {name} ({algorithm})"
-                else:
-                    # Для файлов показываем только имя файла
-                    item_text = f"📄 {os.path.basename(name)} ({algorithm})"
-                    
-                item = QListWidgetItem(item_text)
-                item.setData(Qt.ItemDataRole.UserRole, data_id)
-                item.setData(Qt.ItemDataRole.UserRole + 1, data_type)
-                self.data_list.addItem(item)
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список данных: {str(e)}")
+        # Первая страница читается в фоновом потоке, остальные — при прокрутке
+        self.entry_model.reload(asynchronous=True)
+        
+    def on_entry_list_failed(self, message):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список данных: {message}")
     
     def encrypt_data(self):
         pass
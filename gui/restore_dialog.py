@@ -0,0 +1,59 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
+                            QListWidget, QListWidgetItem, QPushButton)
+from PyQt6.QtCore import Qt
+
+
+class RestoreDialog(QDialog):
+    """Выбор файлов, которые нужно восстановить из зашифрованной папки"""
+
+    def __init__(self, members, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Восстановить выбранное")
+        self.setModal(True)
+        self.setMinimumSize(450, 400)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Отметьте файлы для восстановления:"))
+
+        self.members_list = QListWidget()
+        for member in members:
+            if member.is_dir:
+                continue
+            item = QListWidgetItem(f"{member.path} ({self.format_size(member.size)})")
+            item.setData(Qt.ItemDataRole.UserRole, member.path)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.members_list.addItem(item)
+        layout.addWidget(self.members_list)
+
+        # Кнопки
+        button_layout = QHBoxLayout()
+        select_all_button = QPushButton("Выбрать все")
+        select_all_button.clicked.connect(self.select_all)
+        restore_button = QPushButton("Восстановить")
+        restore_button.clicked.connect(self.accept)
+        cancel_button = QPushButton("Отмена")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(select_all_button)
+        button_layout.addWidget(restore_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+    def select_all(self):
+        for row in range(self.members_list.count()):
+            self.members_list.item(row).setCheckState(Qt.CheckState.Checked)
+
+    def selected_paths(self):
+        """Возвращает пути отмеченных файлов"""
+        return [
+            self.members_list.item(row).data(Qt.ItemDataRole.UserRole)
+            for row in range(self.members_list.count())
+            if self.members_list.item(row).checkState() == Qt.CheckState.Checked
+        ]
+
+    @staticmethod
+    def format_size(size):
+        for unit in ("Б", "КБ", "МБ", "ГБ"):
+            if size < 1024 or unit == "ГБ":
+                return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+            size /= 1024
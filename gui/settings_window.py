@@ -1,13 +1,29 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                             QSpinBox, QComboBox, QPushButton, QMessageBox)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from encryption_settings import EncryptionSettings
+from file_format import SETTINGS_CIPHERS
+from .diagnostics_dialog import DiagnosticsDialog
+from .job_runner import JobRunner
+import autotune
+import kdf
 
 class SettingsWindow(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.settings = EncryptionSettings()
         self.current_settings = self.settings.get_settings()
+        # Замеры скорости идут в фоне, окно остается отзывчивым
+        self.job_runner = JobRunner(self)
+        self.job_runner.job_progress.connect(self.on_job_progress)
+        self.autotune_job = None
+        # Оценка времени разблокировки запускается после паузы в изменениях
+        self.unlock_timer = QTimer(self)
+        self.unlock_timer.setSingleShot(True)
+        self.unlock_timer.setInterval(300)
+        self.unlock_timer.timeout.connect(self.estimate_unlock_time)
+        self.unlock_estimate_running = False
+        self.unlock_estimate_pending = False
         
         self.setWindowTitle("Расширенные настройки шифрования")
         self.setModal(True)
@@ -25,17 +41,70 @@ class SettingsWindow(QDialog):
         layout.addWidget(warning_label)
         layout.addSpacing(10)
         
+        # Функция выведения ключа
+        kdf_layout = QHBoxLayout()
+        kdf_label = QLabel("Функция выведения ключа:")
+        self.kdf_combo = QComboBox()
+        self.kdf_combo.addItems(kdf.KDF_NAMES)
+        self.kdf_combo.setCurrentText(self.current_settings['kdf'])
+        kdf_layout.addWidget(kdf_label)
+        kdf_layout.addWidget(self.kdf_combo)
+        layout.addLayout(kdf_layout)
+        
         # Количество итераций
         iterations_layout = QHBoxLayout()
-        iterations_label = QLabel("Количество итераций:")
+        iterations_label = QLabel("Количество итераций PBKDF2:")
         self.iterations_spin = QSpinBox()
-        self.iterations_spin.setRange(100000, 1000000)
+        self.iterations_spin.setRange(kdf.MIN_PBKDF2_ITERATIONS, 10000000)
         self.iterations_spin.setSingleStep(10000)
         self.iterations_spin.setValue(self.current_settings['iterations'])
         iterations_layout.addWidget(iterations_label)
         iterations_layout.addWidget(self.iterations_spin)
         layout.addLayout(iterations_layout)
         
+        scrypt_layout = QHBoxLayout()
+        scrypt_label = QLabel("Стоимость scrypt (log2 N):")
+        self.scrypt_log_n_spin = QSpinBox()
+        self.scrypt_log_n_spin.setRange(kdf.MIN_SCRYPT_N.bit_length() - 1, 22)
+        self.scrypt_log_n_spin.setValue(self.current_settings['scrypt_n'].bit_length() - 1)
+        scrypt_layout.addWidget(scrypt_label)
+        scrypt_layout.addWidget(self.scrypt_log_n_spin)
+        layout.addLayout(scrypt_layout)
+        
+        argon2_layout = QHBoxLayout()
+        argon2_memory_label = QLabel("Память Argon2id (МБ):")
+        self.argon2_memory_spin = QSpinBox()
+        self.argon2_memory_spin.setRange(kdf.MIN_ARGON2_MEMORY_COST // 1024, 4096)
+        self.argon2_memory_spin.setValue(self.current_settings['argon2_memory_cost'] // 1024)
+        argon2_passes_label = QLabel("Проходов:")
+        self.argon2_iterations_spin = QSpinBox()
+        self.argon2_iterations_spin.setRange(1, 100)
+        self.argon2_iterations_spin.setValue(self.current_settings['argon2_iterations'])
+        argon2_layout.addWidget(argon2_memory_label)
+        argon2_layout.addWidget(self.argon2_memory_spin)
+        argon2_layout.addWidget(argon2_passes_label)
+        argon2_layout.addWidget(self.argon2_iterations_spin)
+        layout.addLayout(argon2_layout)
+        
+        # Подбор стоимости KDF под целевое время разблокировки
+        target_layout = QHBoxLayout()
+        target_label = QLabel("Целевое время разблокировки (мс):")
+        self.target_time_spin = QSpinBox()
+        self.target_time_spin.setRange(100, 10000)
+        self.target_time_spin.setSingleStep(100)
+        self.target_time_spin.setValue(500)
+        self.calibrate_button = QPushButton("Откалибровать")
+        self.calibrate_button.setToolTip("Измерить скорость выбранной функции и подобрать ее стоимость")
+        self.calibrate_button.clicked.connect(self.run_kdf_calibration)
+        target_layout.addWidget(target_label)
+        target_layout.addWidget(self.target_time_spin)
+        target_layout.addWidget(self.calibrate_button)
+        layout.addLayout(target_layout)
+        
+        self.unlock_time_label = QLabel()
+        self.unlock_time_label.setStyleSheet("color: gray;")
+        layout.addWidget(self.unlock_time_label)
+        
         # Длина ключа
         key_length_layout = QHBoxLayout()
         key_length_label = QLabel("Длина ключа (байт):")
@@ -56,6 +125,14 @@ class SettingsWindow(QDialog):
         hash_layout.addWidget(self.hash_combo)
         layout.addLayout(hash_layout)
         
+        # Прогноз обновляется при изменении любого параметра KDF
+        self.kdf_combo.currentTextChanged.connect(self.update_unlock_time)
+        self.hash_combo.currentTextChanged.connect(self.update_unlock_time)
+        for spin in (self.iterations_spin, self.scrypt_log_n_spin,
+                     self.argon2_memory_spin, self.argon2_iterations_spin):
+            spin.valueChanged.connect(self.update_unlock_time)
+        self.update_unlock_time()
+        
         # Размер соли
         salt_layout = QHBoxLayout()
         salt_label = QLabel("Размер соли (байт):")
@@ -66,6 +143,60 @@ class SettingsWindow(QDialog):
         salt_layout.addWidget(self.salt_spin)
         layout.addLayout(salt_layout)
         
+        # Шифр для файлов
+        file_cipher_layout = QHBoxLayout()
+        # ChaCha20 и Triple DES шифруют файлы своим шифром, выбор действует для Fernet
+        file_cipher_label = QLabel("Шифр для файлов Fernet:")
+        self.file_cipher_combo = QComboBox()
+        self.file_cipher_combo.addItems(SETTINGS_CIPHERS)
+        self.file_cipher_combo.setCurrentText(self.current_settings['file_cipher'])
+        file_cipher_layout.addWidget(file_cipher_label)
+        file_cipher_layout.addWidget(self.file_cipher_combo)
+        layout.addLayout(file_cipher_layout)
+        
+        chunk_layout = QHBoxLayout()
+        chunk_label = QLabel("Размер блока файла (КБ):")
+        self.chunk_size_spin = QSpinBox()
+        self.chunk_size_spin.setRange(4, 16 * 1024)
+        self.chunk_size_spin.setValue(self.current_settings['file_chunk_size'] // 1024)
+        chunk_layout.addWidget(chunk_label)
+        chunk_layout.addWidget(self.chunk_size_spin)
+        layout.addLayout(chunk_layout)
+        
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Потоков для файлов (0 — по числу ядер):")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(0, 256)
+        self.workers_spin.setValue(self.current_settings['file_workers'])
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin)
+        layout.addLayout(workers_layout)
+        
+        self.autotune_button = QPushButton("Подобрать под это устройство")
+        self.autotune_button.setToolTip("Измерить скорость шифров, размеров блока и числа потоков и сохранить лучший вариант")
+        self.autotune_button.clicked.connect(self.run_autotune)
+        layout.addWidget(self.autotune_button)
+        
+        # Кэш ключей
+        cache_ttl_layout = QHBoxLayout()
+        cache_ttl_label = QLabel("Хранить ключи в памяти (сек, 0 — не хранить):")
+        self.cache_ttl_spin = QSpinBox()
+        self.cache_ttl_spin.setRange(0, 86400)
+        self.cache_ttl_spin.setSingleStep(60)
+        self.cache_ttl_spin.setValue(self.current_settings['key_cache_ttl'])
+        cache_ttl_layout.addWidget(cache_ttl_label)
+        cache_ttl_layout.addWidget(self.cache_ttl_spin)
+        layout.addLayout(cache_ttl_layout)
+        
+        cache_size_layout = QHBoxLayout()
+        cache_size_label = QLabel("Размер кэша ключей:")
+        self.cache_size_spin = QSpinBox()
+        self.cache_size_spin.setRange(0, 1024)
+        self.cache_size_spin.setValue(self.current_settings['key_cache_size'])
+        cache_size_layout.addWidget(cache_size_label)
+        cache_size_layout.addWidget(self.cache_size_spin)
+        layout.addLayout(cache_size_layout)
+        
         # Информационная надпись
         info_label = QLabel(
             "\nПримечание:\n"
@@ -78,6 +209,11 @@ class SettingsWindow(QDialog):
         
         # Кнопки
         button_layout = QHBoxLayout()
+        diagnostics_button = QPushButton("Диагностика...")
+        diagnostics_button.setToolTip("Время операций: KDF, шифры, база данных, чтение и запись файлов")
+        diagnostics_button.clicked.connect(self.show_diagnostics)
+        button_layout.addWidget(diagnostics_button)
+        button_layout.addStretch()
         save_button = QPushButton("Сохранить")
         save_button.clicked.connect(self.save_settings)
         cancel_button = QPushButton("Отмена")
@@ -91,10 +227,14 @@ class SettingsWindow(QDialog):
     def save_settings(self):
         try:
             new_settings = {
-                'iterations': self.iterations_spin.value(),
+                **self.kdf_settings(),
                 'key_length': self.key_length_spin.value(),
-                'hash_algorithm': self.hash_combo.currentText(),
-                'salt_size': self.salt_spin.value()
+                'salt_size': self.salt_spin.value(),
+                'key_cache_ttl': self.cache_ttl_spin.value(),
+                'key_cache_size': self.cache_size_spin.value(),
+                'file_cipher': self.file_cipher_combo.currentText(),
+                'file_chunk_size': self.chunk_size_spin.value() * 1024,
+                'file_workers': self.workers_spin.value()
             }
             
             self.settings.update_settings(new_settings)
@@ -102,4 +242,124 @@ class SettingsWindow(QDialog):
             self.accept()
             
         except ValueError as e:
-            QMessageBox.warning(self, "Ошибка", str(e)) 
\ No newline at end of file
+            QMessageBox.warning(self, "Ошибка", str(e)) 
+    
+    def show_diagnostics(self):
+        """Открывает сводку замеров времени операций"""
+        DiagnosticsDialog(parent=self).exec()
+    
+    def kdf_settings(self):
+        """Параметры KDF, выбранные в окне"""
+        return {
+            'kdf': self.kdf_combo.currentText(),
+            'iterations': self.iterations_spin.value(),
+            'hash_algorithm': self.hash_combo.currentText(),
+            'scrypt_n': 2 ** self.scrypt_log_n_spin.value(),
+            'argon2_memory_cost': self.argon2_memory_spin.value() * 1024,
+            'argon2_iterations': self.argon2_iterations_spin.value(),
+        }
+    
+    def update_unlock_time(self):
+        """Пересчитывает ожидаемое время разблокировки после паузы в изменениях"""
+        self.unlock_time_label.setText("Ожидаемое время разблокировки: оценивается...")
+        self.unlock_timer.start()
+    
+    def estimate_unlock_time(self):
+        """Оценивает время разблокировки пробным запуском KDF в фоне"""
+        # Пока идет замер, параметры могли измениться: повторим его по завершении
+        if self.unlock_estimate_running:
+            self.unlock_estimate_pending = True
+            return
+        params = kdf.params_from_settings({**self.current_settings, **self.kdf_settings()})
+        
+        def run(job):
+            return kdf.estimate_seconds(params)
+        
+        def on_finished(seconds=None):
+            self.unlock_estimate_running = False
+            if self.unlock_estimate_pending:
+                self.unlock_estimate_pending = False
+                self.estimate_unlock_time()
+            elif seconds is not None:
+                self.unlock_time_label.setText(f"Ожидаемое время разблокировки: ~{seconds * 1000:.0f} мс")
+            else:
+                self.unlock_time_label.setText("Ожидаемое время разблокировки: не удалось оценить")
+        
+        self.unlock_estimate_running = True
+        self.job_runner.submit(
+            "Оценка времени разблокировки", run,
+            on_success=on_finished, on_error=lambda _: on_finished()
+        )
+    
+    def run_kdf_calibration(self):
+        """Подбирает стоимость выбранной KDF под целевое время"""
+        settings = {**self.current_settings, **self.kdf_settings()}
+        kdf_name = self.kdf_combo.currentText()
+        target = self.target_time_spin.value() / 1000
+        
+        def run(job):
+            return kdf.calibrate(settings, kdf_name, target)
+        
+        def on_success(changes):
+            self.finish_calibration()
+            if 'iterations' in changes:
+                self.iterations_spin.setValue(changes['iterations'])
+            if 'scrypt_n' in changes:
+                self.scrypt_log_n_spin.setValue(changes['scrypt_n'].bit_length() - 1)
+            if 'argon2_iterations' in changes:
+                self.argon2_iterations_spin.setValue(changes['argon2_iterations'])
+            self.update_unlock_time()
+        
+        def on_error(message):
+            self.finish_calibration()
+            QMessageBox.critical(self, "Ошибка", f"Не удалось откалибровать: {message}")
+        
+        self.calibrate_button.setEnabled(False)
+        self.calibrate_button.setText("Замер...")
+        self.job_runner.submit("Калибровка KDF", run, on_success=on_success, on_error=on_error)
+    
+    def finish_calibration(self):
+        self.calibrate_button.setEnabled(True)
+        self.calibrate_button.setText("Откалибровать")
+    
+    def run_autotune(self):
+        """Подбирает шифр, размер блока и число потоков для файлов"""
+        def run(job):
+            return autotune.calibrate_and_store(self.settings, job.report_progress)
+        
+        def on_success(profile):
+            self.finish_autotune()
+            self.file_cipher_combo.setCurrentText(profile.cipher)
+            self.chunk_size_spin.setValue(profile.chunk_size // 1024)
+            self.workers_spin.setValue(profile.workers)
+            QMessageBox.information(
+                self, "Готово",
+                f"Шифр: {profile.cipher}\n"
+                f"Размер блока: {profile.chunk_size // 1024} КБ\n"
+                f"Потоков: {profile.workers}\n"
+                f"Скорость: {profile.throughput} МБ/с"
+            )
+        
+        def on_error(message):
+            self.finish_autotune()
+            QMessageBox.critical(self, "Ошибка", f"Не удалось подобрать параметры: {message}")
+        
+        self.autotune_button.setEnabled(False)
+        self.autotune_button.setText("Подбор... 0%")
+        self.autotune_job = self.job_runner.submit(
+            "Подбор параметров файлов", run, on_success=on_success, on_error=on_error
+        )
+    
+    def finish_autotune(self):
+        self.autotune_job = None
+        self.autotune_button.setEnabled(True)
+        self.autotune_button.setText("Подобрать под это устройство")
+    
+    def on_job_progress(self, job_id, percent):
+        if self.autotune_job is not None and self.autotune_job.job_id == job_id:
+            self.autotune_button.setText(f"Подбор... {percent}%")
+    
+    def done(self, result):
+        # Незавершенный подбор прерывается при закрытии окна
+        self.job_runner.shutdown()
+        super().done(result)
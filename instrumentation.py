@@ -0,0 +1,238 @@
+"""Замеры времени операций: KDF, шифры, методы базы данных и ввод-вывод файлов
+
+Операции оборачиваются в интервалы (span) с именем вида "db.list_entries"
+или "file.read". Интервалы сводятся в гистограммы задержек и счетчики байт,
+которые возвращает snapshot(); каждый интервал можно также писать строкой
+JSON в журнал (log_path).
+
+Выключенные замеры почти ничего не стоят: span() возвращает общий пустой
+объект, а обертки методов сразу вызывают исходный метод. Включаются замеры
+из окна диагностики или переменными окружения PASSWORDS_INSTRUMENTATION=1
+и PASSWORDS_INSTRUMENTATION_LOG=путь.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional
+import functools
+import json
+import os
+import threading
+import time
+import types
+
+# Верхние границы корзин гистограммы, секунды
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float("inf"))
+
+
+class Histogram:
+    """Распределение длительностей одной операции и число обработанных байт"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Оценка квантиля q (0..1): граница корзины, но не больше максимума"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "min_ms": self.min * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max * 1000,
+            "bytes": self.bytes,
+            "mb_per_s": self.bytes / self.total / (1024 * 1024) if self.total else 0.0,
+            "buckets": dict(zip(map(str, BUCKETS), self.buckets)),
+        }
+
+
+class _NullSpan:
+    """Интервал выключенных замеров: ничего не делает"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_bytes(self, nbytes: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Интервал одной операции, используется как контекстный менеджер"""
+    __slots__ = ("_owner", "name", "nbytes", "_started")
+
+    def __init__(self, owner: "Instrumentation", name: str, nbytes: int = 0):
+        self._owner = owner
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *_):
+        self._owner.record(self.name, time.perf_counter() - self._started, self.nbytes, exc_type is not None)
+        return False
+
+    def add_bytes(self, nbytes: int) -> None:
+        self.nbytes += nbytes
+
+
+class Instrumentation:
+    """Сборщик замеров процесса"""
+
+    def __init__(self):
+        self.enabled = False
+        self.log_path: Optional[str] = None
+        # Ошибка открытия журнала при последней настройке
+        self.log_error: Optional[str] = None
+        self._histograms: Dict[str, Histogram] = {}
+        self._log_file = None
+        self._lock = threading.Lock()
+        # Отдельная блокировка записи в журнал, чтобы запись не держала гистограммы
+        self._log_lock = threading.Lock()
+
+    def configure(self, enabled: bool = None, log_path: Optional[str] = "") -> None:
+        """Включает или выключает замеры и задает журнал (None — без журнала)
+
+        Если журнал не удается открыть, замеры работают без него, а ошибка
+        остается в log_error.
+        """
+        with self._lock:
+            self.log_error = None
+            if log_path != "" and log_path != self.log_path:
+                if self._log_file is not None:
+                    with self._log_lock:
+                        self._log_file.close()
+                    self._log_file = None
+                self.log_path = log_path or None
+            if enabled is not None:
+                self.enabled = enabled
+            if self.enabled and self.log_path and self._log_file is None:
+                try:
+                    self._log_file = open(self.log_path, "a", encoding="utf-8")
+                except OSError as e:
+                    self.log_error = f"Не удалось открыть журнал замеров {self.log_path}: {e}"
+                    self.log_path = None
+
+    def span(self, name: str, nbytes: int = 0):
+        """Интервал операции name; байты можно добавить через add_bytes()"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, nbytes)
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        """Добавляет готовый замер"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(seconds, nbytes, error)
+            log_file = self._log_file
+        if log_file is None:
+            return
+        line = json.dumps({
+            "time": time.time(),
+            "name": name,
+            "ms": seconds * 1000,
+            "bytes": nbytes,
+            "error": error,
+            "thread": threading.current_thread().name,
+        }) + "\n"
+        with self._log_lock:
+            # Журнал могли закрыть в configure(), пока строка готовилась
+            if not log_file.closed:
+                log_file.write(line)
+                log_file.flush()
+
+    def timed(self, name: str, sized: bool = False):
+        """Декоратор функции: каждый вызов — интервал name
+
+        sized — считать байтами длину первого аргумента после self.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                nbytes = len(args[1]) if sized and len(args) > 1 and args[1] is not None else 0
+                with Span(self, name, nbytes):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument(self, prefix: str, methods: Iterable[str] = None, sized: Iterable[str] = (),
+                   exclude: Iterable[str] = ()):
+        """Декоратор класса: оборачивает методы в интервалы "prefix.метод"
+
+        По умолчанию оборачиваются все публичные методы, объявленные в самом
+        классе. sized — методы, для которых считаются байты первого аргумента.
+        """
+        sized = set(sized)
+        exclude = set(exclude)
+
+        def decorator(cls):
+            names = methods if methods is not None else [
+                name for name, value in vars(cls).items()
+                if not name.startswith("_") and isinstance(value, types.FunctionType)
+            ]
+            for name in names:
+                if name not in exclude:
+                    setattr(cls, name, self.timed(f"{prefix}.{name}", name in sized)(getattr(cls, name)))
+            return cls
+        return decorator
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Сводка по всем операциям: число вызовов, задержки в мс, байты"""
+        with self._lock:
+            return {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())}
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные замеры"""
+        with self._lock:
+            self._histograms.clear()
+
+    def export(self, path: str) -> None:
+        """Сохраняет сводку в файл JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "spans": self.snapshot()}, f, indent=2)
+
+
+# Общий сборщик процесса
+instrumentation = Instrumentation()
+instrumentation.configure(
+    enabled=os.environ.get("PASSWORDS_INSTRUMENTATION") == "1",
+    log_path=os.environ.get("PASSWORDS_INSTRUMENTATION_LOG") or None,
+)
@@ -0,0 +1,133 @@
+"""Выведение ключа из пароля: PBKDF2, scrypt и Argon2id
+
+Параметры KDF — словарь, который сохраняется вместе с каждой записью:
+    {"kdf": "PBKDF2", "hash_algorithm": "SHA256", "iterations": 480000, "key_length": 32}
+    {"kdf": "scrypt", "n": 32768, "r": 8, "p": 1, "key_length": 32}
+    {"kdf": "Argon2id", "iterations": 3, "memory_cost": 65536, "lanes": 4, "key_length": 32}
+memory_cost Argon2id задается в КиБ.
+"""
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from instrumentation import instrumentation
+import os
+import time
+
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+except ImportError:  # Argon2id появился в cryptography 44
+    Argon2id = None
+
+HASH_ALGORITHMS = {
+    "SHA256": hashes.SHA256,
+    "SHA384": hashes.SHA384,
+    "SHA512": hashes.SHA512,
+}
+
+KDF_NAMES = ["PBKDF2", "scrypt"] + (["Argon2id"] if Argon2id is not None else [])
+
+MIN_PBKDF2_ITERATIONS = 100000
+MIN_SCRYPT_N = 2 ** 14
+MIN_ARGON2_MEMORY_COST = 8 * 1024
+
+
+def params_from_settings(settings, key_length: int = None) -> dict:
+    """Параметры KDF для новой записи по текущим настройкам"""
+    key_length = key_length or settings["key_length"]
+    kdf = settings.get("kdf", "PBKDF2")
+    if kdf == "scrypt":
+        return {
+            "kdf": "scrypt",
+            "n": settings["scrypt_n"],
+            "r": settings["scrypt_r"],
+            "p": settings["scrypt_p"],
+            "key_length": key_length,
+        }
+    if kdf == "Argon2id":
+        return {
+            "kdf": "Argon2id",
+            "iterations": settings["argon2_iterations"],
+            "memory_cost": settings["argon2_memory_cost"],
+            "lanes": settings["argon2_lanes"],
+            "key_length": key_length,
+        }
+    return {
+        "kdf": "PBKDF2",
+        "hash_algorithm": settings["hash_algorithm"],
+        "iterations": settings["iterations"],
+        "key_length": key_length,
+    }
+
+
+def derive(password: str, salt: bytes, params: dict) -> bytes:
+    """Вычисляет ключ из пароля и соли по параметрам KDF"""
+    length = params.get("key_length", 32)
+    kdf = params.get("kdf", "PBKDF2")
+    if kdf == "PBKDF2":
+        function = PBKDF2HMAC(
+            algorithm=HASH_ALGORITHMS[params["hash_algorithm"]](),
+            length=length,
+            salt=salt,
+            iterations=params["iterations"],
+        )
+    elif kdf == "scrypt":
+        function = Scrypt(salt=salt, length=length, n=params["n"], r=params["r"], p=params["p"])
+    elif kdf == "Argon2id":
+        if Argon2id is None:
+            raise ValueError("Argon2id недоступен: обновите пакет cryptography")
+        function = Argon2id(
+            salt=salt,
+            length=length,
+            iterations=params["iterations"],
+            lanes=params["lanes"],
+            memory_cost=params["memory_cost"],
+        )
+    else:
+        raise ValueError(f"Неизвестная функция выведения ключа: {kdf}")
+    with instrumentation.span(f"kdf.{kdf}"):
+        return function.derive(password.encode())
+
+
+def _probe(params: dict) -> float:
+    started = time.perf_counter()
+    derive("calibration", os.urandom(16), params)
+    return time.perf_counter() - started
+
+
+def estimate_seconds(params: dict) -> float:
+    """Предсказывает время вычисления ключа по короткому пробному запуску
+
+    Время всех трех KDF растет линейно по основному параметру стоимости,
+    поэтому пробный запуск делается с уменьшенной стоимостью и масштабируется.
+    """
+    kdf = params.get("kdf", "PBKDF2")
+    if kdf == "PBKDF2":
+        probe = dict(params, iterations=min(params["iterations"], 20000))
+        return _probe(probe) * params["iterations"] / probe["iterations"]
+    if kdf == "scrypt":
+        probe = dict(params, n=min(params["n"], 2 ** 12))
+        return _probe(probe) * params["n"] / probe["n"]
+    probe = dict(params, iterations=1, memory_cost=min(params["memory_cost"], MIN_ARGON2_MEMORY_COST))
+    return _probe(probe) * params["iterations"] * params["memory_cost"] / probe["memory_cost"]
+
+
+def calibrate(settings, kdf: str, target_seconds: float) -> dict:
+    """Подбирает стоимость KDF под целевое время разблокировки
+
+    Возвращает изменения настроек. Для PBKDF2 меняется число итераций,
+    для scrypt — N (степень двойки), для Argon2id — число проходов при
+    заданном объеме памяти. Значения не опускаются ниже безопасного минимума.
+    """
+    params = params_from_settings(dict(settings, kdf=kdf))
+    if kdf == "PBKDF2":
+        per_iteration = estimate_seconds(params) / params["iterations"]
+        iterations = int(target_seconds / per_iteration) // 1000 * 1000
+        return {"kdf": kdf, "iterations": max(MIN_PBKDF2_ITERATIONS, iterations)}
+    if kdf == "scrypt":
+        per_n = estimate_seconds(params) / params["n"]
+        n = MIN_SCRYPT_N
+        while n * 2 * per_n <= target_seconds:
+            n *= 2
+        return {"kdf": kdf, "scrypt_n": n}
+    per_pass = estimate_seconds(dict(params, iterations=1))
+    return {"kdf": kdf, "argon2_iterations": max(1, int(target_seconds / per_pass))}
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+
+class KeyCache:
+    """LRU-кэш производных ключей на время сессии
+
+    Ключ кэша: (соль, параметры KDF, отпечаток пароля). Записи живут не
+    дольше ttl секунд, при вытеснении байты ключа затираются нулями.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Отпечаток пароля — HMAC со случайным секретом процесса, поэтому
+        # по содержимому кэша нельзя перебирать пароль офлайн
+        self._fingerprint_secret = os.urandom(32)
+
+    def configure(self, ttl: float = None, max_entries: int = None) -> None:
+        """Меняет время жизни и размер кэша"""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+            self._purge(time.monotonic())
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def fingerprint(self, password: str) -> bytes:
+        """Возвращает отпечаток пароля, пригодный для ключа кэша"""
+        return hmac.new(
+            self._fingerprint_secret, password.encode(), hashlib.sha256
+        ).digest()
+
+    def _cache_key(self, salt: bytes, kdf_params: dict, password: str) -> tuple:
+        return (bytes(salt), tuple(sorted(kdf_params.items())), self.fingerprint(password))
+
+    def get(self, salt: bytes, kdf_params: dict, password: str) -> Optional[bytes]:
+        """Возвращает ключ из кэша или None"""
+        if not self.enabled:
+            return None
+        cache_key = self._cache_key(salt, kdf_params, password)
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(cache_key)
+            return bytes(entry[0])
+
+    def put(self, salt: bytes, kdf_params: dict, password: str, key: bytes) -> None:
+        """Кладет ключ в кэш"""
+        if not self.enabled:
+            return
+        cache_key = self._cache_key(salt, kdf_params, password)
+        with self._lock:
+            if cache_key in self._entries:
+                self._evict(cache_key)
+            self._entries[cache_key] = (bytearray(key), time.monotonic() + self.ttl)
+            self._purge(time.monotonic())
+
+    def get_or_derive(self, salt: bytes, kdf_params: dict, password: str,
+                      derive: Callable[[], bytes]) -> bytes:
+        """Возвращает ключ из кэша, при промахе вычисляет его через derive()"""
+        key = self.get(salt, kdf_params, password)
+        if key is None:
+            key = derive()
+            self.put(salt, kdf_params, password, key)
+        return key
+
+    def lock(self) -> None:
+        """Блокирует хранилище: затирает и удаляет все ключи"""
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._evict(cache_key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge(time.monotonic())
+            return len(self._entries)
+
+    def _purge(self, now: float) -> None:
+        """Удаляет просроченные записи и лишние записи сверх лимита"""
+        for cache_key, (_, expires_at) in list(self._entries.items()):
+            if expires_at <= now:
+                self._evict(cache_key)
+        while self._entries and len(self._entries) > max(self.max_entries, 0):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, cache_key: tuple) -> None:
+        key, _ = self._entries.pop(cache_key)
+        key[:] = bytes(len(key))
+
+
+# Общий кэш процесса, им пользуются все шифровальщики
+key_cache = KeyCache()
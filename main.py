@@ -1,3 +1,8 @@
+import time
+
+# Время запуска для замера «до первого окна» (startup.first_window в диагностике)
+STARTED_AT = time.perf_counter()
+
 import sys
 from PyQt6.QtWidgets import QApplication
 from gui.main_window import MainWindow
@@ -5,7 +10,7 @@ from gui.main_window import MainWindow
 
 def main():
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(started_at=STARTED_AT)
     window.show()
     sys.exit(app.exec())
 
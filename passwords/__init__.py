@@ -0,0 +1,6 @@
+"""Командная строка passwords без графического интерфейса
+
+Запуск: python -m passwords <команда> [параметры], список команд — python -m passwords --help.
+Модули шифрования импортируются только командами, которым они нужны,
+поэтому запуск быстрый, а PyQt не требуется вовсе.
+"""
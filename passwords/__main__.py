@@ -0,0 +1,290 @@
+import argparse
+import os
+import sys
+
+# Коды возврата
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+
+def _from_env(name: str) -> str:
+    password = os.environ.get(name)
+    if password is None:
+        raise ValueError(f"Переменная окружения {name} не задана")
+    return password
+
+
+def read_password(args, prompt: str = "Пароль: ") -> str:
+    """Пароль из переменной окружения, файла или с терминала"""
+    if args.password_env:
+        return _from_env(args.password_env)
+    if args.password_file:
+        with open(args.password_file, encoding="utf-8") as f:
+            return f.readline().rstrip("\r\n")
+    import getpass
+    return getpass.getpass(prompt)
+
+
+def open_vault(db_manager, args):
+    """Разблокирует хранилище мастер-паролем"""
+    from vault import Vault
+
+    vault = Vault(db_manager)
+    if args.master_password_env:
+        vault.unlock(_from_env(args.master_password_env))
+    else:
+        vault.unlock(read_password(args, "Мастер-пароль: "))
+    return vault
+
+
+def load_entry_key(db_manager, encryptor, data_type: str, data_id: int, salt: bytes, args) -> None:
+    """Загружает ключ записи: из хранилища или из пароля"""
+    wrapped_key = db_manager.get_entry_key(data_type, data_id)
+    if wrapped_key is not None:
+        open_vault(db_manager, args).open_encryptor(encryptor, wrapped_key, salt)
+    else:
+        encryptor.load_key(read_password(args), salt, db_manager.get_kdf_params(data_id, data_type))
+
+
+def describe_error(error: Exception) -> str:
+    # InvalidToken и InvalidTag из cryptography не содержат текста
+    return str(error) or "неверный пароль или данные повреждены"
+
+
+def cmd_list(db_manager, args) -> int:
+    cursor = None
+    remaining = args.limit
+    while remaining > 0:
+        rows, cursor = db_manager.list_entries(min(remaining, 1000), cursor, args.type)
+        for data_id, name, algorithm, data_type, created_at in rows:
+            print(f"{data_type}\t{data_id}\t{algorithm}\t{created_at}\t{name}")
+        remaining -= len(rows)
+        if cursor is None:
+            break
+    return EXIT_OK
+
+
+def cmd_encrypt_text(db_manager, args) -> int:
+    from encryption.encryptor_factory import EncryptorFactory
+
+    if args.text is not None:
+        data = args.text
+    elif args.input:
+        with open(args.input, encoding="utf-8") as f:
+            data = f.read()
+    else:
+        data = sys.stdin.read()
+    if not data:
+        raise ValueError("Нет данных для шифрования")
+
+    encryptor = EncryptorFactory.create_encryptor(args.algorithm)
+    wrapped_key = None
+    if args.vault:
+        wrapped_key = open_vault(db_manager, args).prepare_encryptor(encryptor)
+    else:
+        encryptor.generate_key(read_password(args))
+    data_id = db_manager.save_encrypted_data(
+        args.name, encryptor.encrypt_data(data), encryptor.salt, args.algorithm,
+        wrapped_key=wrapped_key, kdf_params=encryptor.kdf_params, cipher_params=encryptor.cipher_params
+    )
+    print(data_id)
+    return EXIT_OK
+
+
+def cmd_decrypt_text(db_manager, args) -> int:
+    from encryption.encryptor_factory import EncryptorFactory
+
+    encrypted_data, salt, algorithm = db_manager.get_encrypted_data_by_id(args.id, 'text')
+    encryptor = EncryptorFactory.create_for_record(algorithm, db_manager.get_cipher_params(args.id, 'text'))
+    load_entry_key(db_manager, encryptor, 'text', args.id, salt, args)
+    data = encryptor.decrypt_data(encrypted_data)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        sys.stdout.write(data)
+    return EXIT_OK
+
+
+def cmd_encrypt(db_manager, args) -> int:
+    from file_batch import FileBatchEncryptor
+
+    paths = [os.path.abspath(path) for path in args.paths]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise ValueError(f"Не найдено: {', '.join(missing)}")
+
+    vault = open_vault(db_manager, args) if args.vault else None
+    password = None if vault else read_password(args)
+    results = FileBatchEncryptor(db_manager, args.algorithm).encrypt(paths, password=password, vault=vault)
+    for result in results:
+        if result.error:
+            print(f"{result.path}: {result.error}", file=sys.stderr)
+        else:
+            print(f"{result.file_id}\t{result.encrypted_path}")
+    return EXIT_ERROR if any(result.error for result in results) else EXIT_OK
+
+
+def cmd_decrypt(db_manager, args) -> int:
+    from encryption.encryptor_factory import EncryptorFactory
+
+    original_path, encrypted_path, salt, algorithm, is_folder = db_manager.get_file_info(args.id)
+    encryptor = EncryptorFactory.create_for_record(
+        algorithm, db_manager.get_cipher_params(args.id, 'file'), file_mode=True
+    )
+    load_entry_key(db_manager, encryptor, 'file', args.id, salt, args)
+    if is_folder:
+        output = encryptor.decrypt_folder(encrypted_path, args.output)
+    else:
+        output = encryptor.decrypt_file(encrypted_path, args.output)
+    print(output)
+    return EXIT_OK
+
+
+def cmd_export(db_manager, args) -> int:
+    """Выгружает расшифрованные текстовые записи в JSON
+
+    Записи с другим паролем (или из закрытого хранилища) пропускаются
+    с сообщением в stderr.
+    """
+    from encryption.encryptor_factory import EncryptorFactory
+    import json
+
+    password = None if args.vault_only else read_password(args)
+    vault = open_vault(db_manager, args) if args.vault or args.vault_only else None
+    entries = []
+    skipped = 0
+    cursor = None
+    while True:
+        rows, cursor = db_manager.list_entries(1000, cursor, 'text')
+        for data_id, name, algorithm, _, created_at in rows:
+            encrypted_data, salt, _ = db_manager.get_encrypted_data_by_id(data_id, 'text')
+            encryptor = EncryptorFactory.create_for_record(algorithm, db_manager.get_cipher_params(data_id, 'text'))
+            wrapped_key = db_manager.get_entry_key('text', data_id)
+            try:
+                if wrapped_key is not None:
+                    if vault is None:
+                        raise ValueError("запись принадлежит хранилищу (добавьте --vault)")
+                    vault.open_encryptor(encryptor, wrapped_key, salt)
+                else:
+                    if password is None:
+                        raise ValueError("запись защищена паролем")
+                    encryptor.load_key(password, salt, db_manager.get_kdf_params(data_id, 'text'))
+                data = encryptor.decrypt_data(encrypted_data)
+            except Exception as e:
+                print(f"Пропущена запись {data_id} «{name}»: {describe_error(e)}", file=sys.stderr)
+                skipped += 1
+                continue
+            entries.append({
+                "id": data_id, "name": name, "algorithm": algorithm,
+                "created_at": created_at, "data": data,
+            })
+        if cursor is None:
+            break
+
+    text = json.dumps(entries, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(f"Выгружено записей: {len(entries)}, пропущено: {skipped}", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_bench(_db_manager, args) -> int:
+    from benchmarks.__main__ import main as bench_main
+
+    return bench_main(args.bench_args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m passwords", description="Шифрование паролей, файлов и папок")
+    parser.add_argument("-C", "--directory", metavar="DIR",
+                        help="папка с базой passwords.db (по умолчанию текущая)")
+    # Источник пароля общий для всех команд, по умолчанию пароль запрашивается с терминала
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--password-env", metavar="VAR", help="взять пароль из переменной окружения")
+    source.add_argument("--password-file", metavar="FILE", help="взять пароль из первой строки файла")
+    parser.add_argument("--master-password-env", metavar="VAR",
+                        help="мастер-пароль хранилища из переменной окружения")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="команда")
+
+    command = commands.add_parser("list", help="список записей")
+    command.add_argument("--type", choices=("text", "file"), help="только тексты или только файлы")
+    command.add_argument("--limit", type=int, default=200, help="сколько записей вывести")
+    command.set_defaults(handler=cmd_list)
+
+    command = commands.add_parser("encrypt-text", help="зашифровать текст (из --text, --input или stdin)")
+    command.add_argument("name", help="название записи")
+    command.add_argument("--text", help="текст для шифрования")
+    command.add_argument("--input", metavar="FILE", help="файл с текстом")
+    command.add_argument("--algorithm", default="Fernet", help="алгоритм шифрования")
+    command.add_argument("--vault", action="store_true", help="ключом хранилища вместо пароля")
+    command.set_defaults(handler=cmd_encrypt_text)
+
+    command = commands.add_parser("decrypt-text", help="расшифровать текстовую запись")
+    command.add_argument("id", type=int, help="ID записи")
+    command.add_argument("--output", metavar="FILE", help="записать в файл вместо stdout")
+    command.set_defaults(handler=cmd_decrypt_text)
+
+    command = commands.add_parser("encrypt", help="зашифровать файлы и папки")
+    command.add_argument("paths", nargs="+", help="файлы и папки")
+    command.add_argument("--algorithm", default="Fernet", help="алгоритм шифрования")
+    command.add_argument("--vault", action="store_true", help="ключами хранилища вместо пароля")
+    command.set_defaults(handler=cmd_encrypt)
+
+    command = commands.add_parser("decrypt", help="расшифровать файл или папку")
+    command.add_argument("id", type=int, help="ID записи о файле")
+    command.add_argument("--output", help="куда расшифровать (по умолчанию рядом, без .encrypted)")
+    command.set_defaults(handler=cmd_decrypt)
+
+    command = commands.add_parser("export", help="выгрузить расшифрованные тексты в JSON")
+    command.add_argument("output", help="файл JSON или - для stdout")
+    vault_mode = command.add_mutually_exclusive_group()
+    vault_mode.add_argument("--vault", action="store_true", help="также записи хранилища")
+    vault_mode.add_argument("--vault-only", action="store_true", help="только записи хранилища")
+    command.set_defaults(handler=cmd_export)
+
+    command = commands.add_parser("bench", help="замеры производительности (параметры python -m benchmarks)")
+    command.set_defaults(handler=cmd_bench)
+    return parser
+
+
+def resolve_paths(args) -> None:
+    """Делает пути из параметров абсолютными относительно текущей папки (до перехода в -C)"""
+    for name in ("password_file", "input", "output"):
+        path = getattr(args, name, None)
+        if path and path != "-":
+            setattr(args, name, os.path.abspath(path))
+    if getattr(args, "paths", None):
+        args.paths = [os.path.abspath(path) for path in args.paths]
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    # Параметры после bench передаются замерам как есть
+    if args.handler is cmd_bench:
+        args.bench_args = extra
+        return cmd_bench(None, args)
+    if extra:
+        parser.error(f"неизвестные параметры: {' '.join(extra)}")
+    # Шифровальщики и настройки открывают passwords.db в текущей папке, как и интерфейс
+    if args.directory:
+        resolve_paths(args)
+        os.chdir(args.directory)
+
+    from database.db_manager import DatabaseManager
+
+    try:
+        return args.handler(DatabaseManager(), args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"Ошибка: {describe_error(e)}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Фоновое перешифрование записей под новые параметры KDF и шифра
+
+Задача перешифрования хранит в базе целевые параметры и контрольную точку
+(фаза — тексты, затем файлы — и последний обработанный ID). Каждый пакет
+записей сохраняется вместе с контрольной точкой одной транзакцией, поэтому
+после сбоя или отмены задача продолжается с места остановки.
+
+Файл перешифровывается во временный файл рядом с исходным. Замена файлов
+журналируется в той же транзакции, что и новые ключи записи, и выполняется
+после коммита; если программа упала между ними, замена довершается при
+возобновлении задачи.
+"""
+from database.db_manager import DatabaseManager
+from encryption.encryptor_factory import EncryptorFactory
+from encryption_settings import EncryptionSettings
+from typing import Callable, NamedTuple, Optional
+from vault import Vault
+import folder_archive
+import os
+import time
+
+# Суффикс временного файла с перешифрованными данными
+TEMP_SUFFIX = ".rekey"
+
+
+class RekeyResult(NamedTuple):
+    """Итог задачи перешифрования"""
+    job_id: int
+    migrated: int
+    skipped: int
+    failed: int
+
+
+class RekeyEngine:
+    """Перешифровывает записи пакетами с контрольными точками и ограничением нагрузки
+
+    Записи с паролем перешифровываются, только если передан password (записи
+    с другим паролем считаются ошибочными и остаются как есть), записи
+    хранилища — только при открытом хранилище. Каждая запись получает новый
+    ключ: новую соль и целевые параметры KDF или новый ключ хранилища.
+    С vault_password мастер-пароль хранилища тоже переводится на целевой KDF.
+
+    duty_cycle — доля времени, которую задача занимает работой: после пакета,
+    занявшего t секунд, она спит t * (1 - duty_cycle) / duty_cycle секунд и не
+    отнимает у интерфейса базу и диск.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, password: Optional[str] = None,
+                 vault: Optional[Vault] = None, vault_password: Optional[str] = None,
+                 batch_size: int = 16, duty_cycle: float = 0.5):
+        self.db_manager = db_manager
+        self.settings = EncryptionSettings(db_manager.db_path)
+        self.password = password
+        self.vault = vault if vault is not None and vault.is_unlocked else None
+        self.vault_password = vault_password
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self._target_ciphers = {}
+
+    def current_target(self, algorithm: Optional[str] = None) -> dict:
+        """Целевые параметры по текущим настройкам
+
+        algorithm — перевести записи на этот алгоритм (None — оставить прежний).
+        """
+        settings = self.settings.get_settings()
+        return {
+            "kdf_params": self.settings.get_kdf_params(),
+            "salt_size": settings["salt_size"],
+            "file_cipher": settings["file_cipher"],
+            "chunk_size": settings["file_chunk_size"],
+            "algorithm": algorithm,
+        }
+
+    def start(self, algorithm: Optional[str] = None) -> int:
+        """Создает задачу под текущие настройки или возвращает незавершенную"""
+        job = self.db_manager.get_active_rekey_job()
+        if job is not None:
+            return job[0]
+        return self.db_manager.create_rekey_job(self.current_target(algorithm))
+
+    def run(self, progress_callback: Callable[[int, int], None] = None,
+            algorithm: Optional[str] = None) -> RekeyResult:
+        """Выполняет (или продолжает) задачу перешифрования до конца
+
+        progress_callback(просмотрено_записей, всего_записей) вызывается после
+        каждого пакета; исключение из него останавливает задачу, сохраненная
+        контрольная точка позволяет продолжить ее позже.
+        """
+        self.start(algorithm)
+        job_id, target, phase, last_id, migrated, skipped, failed = self.db_manager.get_active_rekey_job()
+        self._finish_pending(job_id)
+        if self.vault is not None and self.vault_password is not None:
+            vault_params = dict(target["kdf_params"], key_length=self.vault.MASTER_KEY_SIZE)
+            if self.vault.kdf_params() != vault_params:
+                self.vault.rekey(self.vault_password, vault_params)
+
+        total = self.db_manager.count_rekey_rows()
+        seen = 0
+        counts = [migrated, skipped, failed]
+        phases = ("text", "file")
+        for data_type in phases[phases.index(phase):] if phase in phases else ():
+            after_id = last_id if data_type == phase else 0
+            # Файлы тяжелые, каждый сохраняется собственной контрольной точкой
+            limit = self.batch_size if data_type == "text" else 1
+            while True:
+                rows = self.db_manager.get_rekey_rows(data_type, after_id, limit)
+                if not rows:
+                    break
+                started = time.monotonic()
+                updates = []
+                pending = []
+                for row in rows:
+                    outcome = self._rekey_row(data_type, row, target)
+                    if outcome is None:
+                        counts[1] += 1
+                    elif outcome is False:
+                        counts[2] += 1
+                    else:
+                        update, swap = outcome
+                        updates.append(update)
+                        if swap is not None:
+                            pending.append(swap)
+                        counts[0] += 1
+                after_id = rows[-1][0]
+                self.db_manager.save_rekey_batch(job_id, data_type, after_id, tuple(counts), updates, pending)
+                self._finish_pending(job_id)
+
+                seen += len(rows)
+                if progress_callback:
+                    progress_callback(min(seen, total), total)
+                self._throttle(time.monotonic() - started)
+
+        self.db_manager.finish_rekey_job(job_id)
+        return RekeyResult(job_id, *counts)
+
+    def _throttle(self, elapsed: float) -> None:
+        if 0 < self.duty_cycle < 1:
+            time.sleep(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+
+    def _finish_pending(self, job_id: int) -> None:
+        """Ставит на место перешифрованные файлы, записи о которых уже в базе"""
+        pending = self.db_manager.get_rekey_pending(job_id)
+        for temp_path, target_path in pending:
+            if os.path.exists(temp_path):
+                os.replace(temp_path, target_path)
+        if pending:
+            self.db_manager.clear_rekey_pending(job_id)
+
+    def _target_cipher(self, algorithm: str, file_mode: bool, target: dict) -> dict:
+        cache_key = (algorithm, file_mode)
+        if cache_key not in self._target_ciphers:
+            self._target_ciphers[cache_key] = self._new_encryptor(algorithm, file_mode, target).cipher_params
+        return self._target_ciphers[cache_key]
+
+    def _new_encryptor(self, algorithm: str, file_mode: bool, target: dict):
+        encryptor = EncryptorFactory.create_encryptor(algorithm, file_mode=file_mode)
+        # ChaCha20 и Triple DES шифруют файлы своим шифром, настройка действует для Fernet
+        if file_mode and encryptor.stream_cipher is None:
+            encryptor.file_cipher = target["file_cipher"]
+            encryptor.chunk_size = target["chunk_size"]
+        return encryptor
+
+    def _open_old(self, algorithm: str, file_mode: bool, salt: bytes, kdf_params, cipher_params, wrapped_key):
+        """Шифровальщик с текущим ключом записи или None, если ключ недоступен"""
+        encryptor = EncryptorFactory.create_for_record(algorithm, cipher_params, file_mode=file_mode)
+        if wrapped_key is not None:
+            if self.vault is None:
+                return None
+            self.vault.open_encryptor(encryptor, wrapped_key, salt)
+        else:
+            if self.password is None:
+                return None
+            encryptor.load_key(self.password, salt, kdf_params)
+        return encryptor
+
+    def _open_new(self, algorithm: str, file_mode: bool, target: dict, in_vault: bool):
+        """Шифровальщик с новым ключом записи и обернутый ключ (для хранилища)"""
+        encryptor = self._new_encryptor(algorithm, file_mode, target)
+        if in_vault:
+            return encryptor, self.vault.prepare_encryptor(encryptor)
+        # Новая соль и целевые параметры KDF, а не текущие настройки
+        encryptor.load_key(self.password, os.urandom(target["salt_size"]), target["kdf_params"])
+        return encryptor, None
+
+    def _needs_rekey(self, algorithm: str, new_algorithm: str, file_mode: bool, kdf_params,
+                     cipher_params, wrapped_key, target: dict) -> bool:
+        if new_algorithm != algorithm:
+            return True
+        if cipher_params != self._target_cipher(new_algorithm, file_mode, target):
+            return True
+        return wrapped_key is None and kdf_params != target["kdf_params"]
+
+    def _rekey_row(self, data_type: str, row: tuple, target: dict):
+        """Перешифровывает одну запись
+
+        Возвращает None, если запись пропущена (уже в целевых параметрах или нет
+        ключа), False при ошибке, иначе (строка обновления, замена файла или None).
+        """
+        file_mode = data_type == "file"
+        data_id, payload, salt, algorithm, kdf_params, cipher_params, wrapped_key = row[:7]
+        new_algorithm = target["algorithm"] or algorithm
+        in_vault = wrapped_key is not None
+        if not self._needs_rekey(algorithm, new_algorithm, file_mode, kdf_params,
+                                 cipher_params, wrapped_key, target):
+            return None
+        old = self._open_old(algorithm, file_mode, salt, kdf_params, cipher_params, wrapped_key)
+        if old is None:
+            return None
+
+        try:
+            new, new_wrapped_key = self._open_new(new_algorithm, file_mode, target, in_vault)
+            if not file_mode:
+                data = new.encrypt_data(old.decrypt_data(payload))
+                return (data_id, data, new.salt, new_algorithm, new.kdf_params,
+                        new.cipher_params, new_wrapped_key), None
+
+            if not os.path.exists(payload):
+                return False
+            temp_path = payload + TEMP_SUFFIX
+            new.reencrypt_file(old, payload, temp_path)
+        except Exception:
+            return False
+
+        manifest = None
+        # Старые архивы папок (tar или zip в одном потоке) не имеют манифеста
+        if row[7] and folder_archive.is_folder_archive(temp_path):
+            try:
+                manifest = new.export_manifest(temp_path)
+            except Exception:
+                os.remove(temp_path)
+                return False
+        return (data_id, new.salt, new_algorithm, new.kdf_params, new.cipher_params,
+                new_wrapped_key, manifest), (temp_path, payload)
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class DirectoryOptionTest(unittest.TestCase):
+    """-C меняет только папку базы, пути в параметрах считаются от текущей папки"""
+
+    def setUp(self):
+        self.work = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work.cleanup)
+        os.makedirs(os.path.join(self.work.name, "vaultdir"))
+        os.makedirs(os.path.join(self.work.name, "docs"))
+        with open(os.path.join(self.work.name, "docs", "note.txt"), "w", encoding="utf-8") as f:
+            f.write("secret note")
+        with open(os.path.join(self.work.name, "password.txt"), "w", encoding="utf-8") as f:
+            f.write("pw\n")
+
+    def cli(self, *args):
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        return subprocess.run(
+            [sys.executable, "-m", "passwords", "-C", "vaultdir", "--password-file", "password.txt", *args],
+            cwd=self.work.name, env=env, capture_output=True, text=True,
+        )
+
+    def test_relative_paths_resolve_against_caller_cwd(self):
+        result = self.cli("encrypt", "docs")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        folder_id, encrypted_path = result.stdout.split("\t")
+        self.assertEqual(encrypted_path.strip(), os.path.join(self.work.name, "docs.encrypted"))
+        self.assertTrue(os.path.exists(os.path.join(self.work.name, "vaultdir", "passwords.db")))
+
+        result = self.cli("decrypt", folder_id, "--output", "restored")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(os.path.join(self.work.name, "restored", "note.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "secret note")
+
+    def test_text_input_and_export_output(self):
+        result = self.cli("encrypt-text", "note", "--input", "docs/note.txt")
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        result = self.cli("export", "export.json")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(os.path.join(self.work.name, "export.json"), encoding="utf-8") as f:
+            self.assertIn("secret note", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import io
+import os
+import unittest
+
+import file_format
+
+KEY = bytes(range(32))
+SALT = b"s" * 16
+CHUNK_SIZE = 64
+
+
+def encrypt(data: bytes, cipher: str = "AES-GCM", key: bytes = KEY, workers: int = 1) -> bytes:
+    out_file = io.BytesIO()
+    header = file_format.build_header(cipher, SALT, CHUNK_SIZE)
+    file_format.encrypt_stream(io.BytesIO(data), out_file, key, header, workers=workers)
+    return out_file.getvalue()
+
+
+def decrypt(data: bytes, key: bytes = KEY, workers: int = 1) -> bytes:
+    out_file = io.BytesIO()
+    file_format.decrypt_stream(io.BytesIO(data), out_file, key, workers=workers)
+    return out_file.getvalue()
+
+
+class HeaderTest(unittest.TestCase):
+    def test_round_trip(self):
+        kdf_params = {"kdf": "PBKDF2", "hash_algorithm": "SHA256", "iterations": 100000}
+        header = file_format.build_header("ChaCha20-Poly1305", SALT, 4096, kdf_params)
+
+        parsed = file_format.read_header(io.BytesIO(header.raw + b"rest"))
+
+        self.assertEqual(parsed, header)
+        self.assertEqual(parsed.cipher, "ChaCha20-Poly1305")
+        self.assertEqual(parsed.kdf, "PBKDF2")
+        self.assertEqual(parsed.iterations, 100000)
+        self.assertEqual(parsed.chunk_size, 4096)
+        self.assertEqual(parsed.salt, SALT)
+
+    def test_file_salt_is_random(self):
+        first = file_format.build_header("AES-GCM", SALT)
+        second = file_format.build_header("AES-GCM", SALT)
+        self.assertNotEqual(first.file_salt, second.file_salt)
+
+    def test_rejects_bad_headers(self):
+        raw = bytearray(file_format.build_header("AES-GCM", SALT).raw)
+        cases = {
+            "magic": b"XXXXX" + raw[5:],
+            "version": raw[:5] + b"\x09" + raw[6:],
+            "cipher": raw[:6] + b"\x63" + raw[7:],
+            "short": raw[:10],
+            "salt": raw[:-1],
+        }
+        for name, data in cases.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                file_format.read_header(io.BytesIO(bytes(data)))
+
+    def test_unknown_cipher(self):
+        with self.assertRaises(ValueError):
+            file_format.build_header("DES", SALT)
+
+
+class StreamTest(unittest.TestCase):
+    def test_round_trip(self):
+        # Пустой файл, неполный блок, ровно несколько блоков и с остатком
+        sizes = (0, 1, CHUNK_SIZE, CHUNK_SIZE * 3, CHUNK_SIZE * 3 + 5)
+        for cipher in file_format.CIPHER_IDS:
+            for workers in (1, 3):
+                for size in sizes:
+                    with self.subTest(cipher=cipher, workers=workers, size=size):
+                        data = os.urandom(size)
+                        self.assertEqual(decrypt(encrypt(data, cipher, workers=workers), workers=workers), data)
+
+    def test_wrong_key(self):
+        encrypted = encrypt(b"secret data")
+        with self.assertRaises(ValueError):
+            decrypt(encrypted, key=b"k" * 32)
+
+    def test_tampered_data(self):
+        encrypted = bytearray(encrypt(os.urandom(CHUNK_SIZE * 2)))
+        encrypted[-3] ^= 1
+        with self.assertRaises(ValueError):
+            decrypt(bytes(encrypted))
+
+    def test_tampered_header(self):
+        # Заголовок — дополнительные данные AEAD, поэтому меняется и проверка блоков
+        encrypted = bytearray(encrypt(b"secret data"))
+        header_size = file_format.read_header(io.BytesIO(encrypted)).size
+        encrypted[header_size - file_format.FILE_SALT_SIZE - 1] ^= 1
+        with self.assertRaises(ValueError):
+            decrypt(bytes(encrypted))
+
+    def test_truncated_after_full_chunk(self):
+        # Без последнего блока предпоследний не проходит проверку флага последнего
+        data = os.urandom(CHUNK_SIZE * 3 + 5)
+        encrypted = encrypt(data)
+        truncated = encrypted[:-(5 + file_format.TAG_SIZE)]
+        with self.assertRaises(ValueError):
+            decrypt(truncated)
+
+    def test_truncated_final_empty_chunk(self):
+        # Размер кратен блоку: последним идет пустой блок, без него файл неполон
+        encrypted = encrypt(os.urandom(CHUNK_SIZE * 2))
+        with self.assertRaises(ValueError):
+            decrypt(encrypted[:-file_format.TAG_SIZE])
+
+    def test_reordered_chunks(self):
+        encrypted = encrypt(os.urandom(CHUNK_SIZE * 2 + 5))
+        header_size = file_format.read_header(io.BytesIO(encrypted)).size
+        block_size = CHUNK_SIZE + file_format.TAG_SIZE
+        first = encrypted[header_size:header_size + block_size]
+        second = encrypted[header_size + block_size:header_size + 2 * block_size]
+        swapped = encrypted[:header_size] + second + first + encrypted[header_size + 2 * block_size:]
+        with self.assertRaises(ValueError):
+            decrypt(swapped)
+
+    def test_decrypting_reader(self):
+        data = os.urandom(CHUNK_SIZE * 4 + 7)
+        reader = file_format.DecryptingReader(io.BytesIO(encrypt(data)), KEY)
+        self.assertEqual(reader.read(), data)
+
+    def test_decrypting_reader_truncated(self):
+        data = os.urandom(CHUNK_SIZE * 4 + 7)
+        reader = file_format.DecryptingReader(io.BytesIO(encrypt(data)[:-(7 + file_format.TAG_SIZE)]), KEY)
+        with self.assertRaises(ValueError):
+            reader.read()
+
+    def test_encrypting_writer(self):
+        data = os.urandom(CHUNK_SIZE * 3 + 11)
+        out_file = io.BytesIO()
+        writer = file_format.EncryptingWriter(out_file, KEY, file_format.build_header("AES-GCM", SALT, CHUNK_SIZE))
+        for start in range(0, len(data), 10):
+            writer.write(data[start:start + 10])
+        writer.close()
+        self.assertEqual(decrypt(out_file.getvalue()), data)
+
+
+class SeekableReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(CHUNK_SIZE * 5 + 13)
+        self.reader = file_format.SeekableReader(io.BytesIO(encrypt(self.data)), KEY)
+
+    def test_size(self):
+        self.assertEqual(self.reader.size, len(self.data))
+
+    def test_ranges(self):
+        ranges = [(0, 10), (CHUNK_SIZE - 3, 6), (CHUNK_SIZE * 2, CHUNK_SIZE * 2 + 1),
+                  (len(self.data) - 5, 100), (len(self.data) + 10, 5)]
+        for offset, size in ranges:
+            with self.subTest(offset=offset, size=size):
+                self.reader.seek(offset)
+                self.assertEqual(self.reader.read(size), self.data[offset:offset + size])
+
+    def test_seek_whence(self):
+        self.reader.seek(-4, io.SEEK_END)
+        self.assertEqual(self.reader.read(), self.data[-4:])
+        self.reader.seek(CHUNK_SIZE)
+        self.reader.seek(3, io.SEEK_CUR)
+        self.assertEqual(self.reader.tell(), CHUNK_SIZE + 3)
+        with self.assertRaises(ValueError):
+            self.reader.seek(-1)
+
+    def test_truncated(self):
+        encrypted = encrypt(self.data)
+        with self.assertRaises(ValueError):
+            file_format.SeekableReader(io.BytesIO(encrypted[:-(13 + file_format.TAG_SIZE)]), KEY)
+
+    def test_tampered_chunk(self):
+        encrypted = bytearray(encrypt(self.data))
+        header_size = self.reader.header.size
+        encrypted[header_size + CHUNK_SIZE + file_format.TAG_SIZE + 1] ^= 1
+        reader = file_format.SeekableReader(io.BytesIO(bytes(encrypted)), KEY)
+        self.assertEqual(reader.read(CHUNK_SIZE), self.data[:CHUNK_SIZE])
+        with self.assertRaises(ValueError):
+            reader.read(CHUNK_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
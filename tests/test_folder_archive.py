@@ -0,0 +1,180 @@
+import io
+import os
+import tempfile
+import unittest
+
+import file_format
+import folder_archive
+
+KEY = bytes(range(32))
+NEW_KEY = bytes(range(32, 64))
+CHUNK_SIZE = 64
+
+
+def new_header():
+    return file_format.build_header("AES-GCM", b"s" * 16, CHUNK_SIZE)
+
+
+def write_file(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read_tree(folder: str) -> dict:
+    """Содержимое папки: путь → байты файла или None для папки"""
+    tree = {}
+    for root, dirs, names in os.walk(folder):
+        for name in dirs:
+            tree[os.path.relpath(os.path.join(root, name), folder)] = None
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                tree[os.path.relpath(os.path.join(root, name), folder)] = f.read()
+    return tree
+
+
+class FolderArchiveTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = temp_dir.name
+        self.source = os.path.join(self.root, "source")
+        write_file(os.path.join(self.source, "a.txt"), b"alpha")
+        write_file(os.path.join(self.source, "sub", "b.bin"), os.urandom(CHUNK_SIZE * 3 + 1))
+        write_file(os.path.join(self.source, "sub", "deep", "c.bin"), os.urandom(CHUNK_SIZE))
+        write_file(os.path.join(self.source, "empty"), b"")
+        os.makedirs(os.path.join(self.source, "empty_dir"))
+
+        self.archive = io.BytesIO()
+        self.members = folder_archive.write_archive(self.source, self.archive, KEY, new_header)
+
+    def extract(self, archive: io.BytesIO, key: bytes = KEY, paths=None) -> dict:
+        members = folder_archive.read_manifest(archive, key)
+        if paths is not None:
+            members = folder_archive.select_members(members, paths)
+        output = tempfile.mkdtemp(dir=self.root)
+        folder_archive.extract_members(archive, key, members, output)
+        return read_tree(output)
+
+    def test_round_trip(self):
+        self.assertEqual(folder_archive.read_manifest(self.archive, KEY), self.members)
+        self.assertEqual(self.extract(self.archive), read_tree(self.source))
+
+    def test_extract_selected(self):
+        tree = self.extract(self.archive, paths=["sub/deep"])
+        self.assertEqual(tree, {
+            "sub": None,
+            os.path.join("sub", "deep"): None,
+            os.path.join("sub", "deep", "c.bin"): read_tree(self.source)[os.path.join("sub", "deep", "c.bin")],
+        })
+
+    def test_update_appends_only_changes(self):
+        data = self.archive.getvalue()
+        unchanged = next(member for member in self.members if member.path == "sub/b.bin")
+        write_file(os.path.join(self.source, "a.txt"), b"alpha, changed")
+        write_file(os.path.join(self.source, "new.txt"), b"new file")
+        os.remove(os.path.join(self.source, "sub", "deep", "c.bin"))
+
+        result = folder_archive.update_archive(self.source, self.archive, KEY, new_header, self.members)
+
+        self.assertEqual((result.added, result.changed, result.removed, result.unchanged), (1, 1, 1, 2))
+        # Прежние данные не переписываются, изменения дописаны в конец
+        self.assertTrue(self.archive.getvalue().startswith(data))
+        self.assertEqual(result.archive_size, len(self.archive.getvalue()))
+        self.assertIn(unchanged, result.members)
+        self.assertLess(result.live_bytes, result.archive_size)
+        self.assertEqual(folder_archive.read_manifest(self.archive, KEY), result.members)
+        self.assertEqual(self.extract(self.archive), read_tree(self.source))
+
+    def test_update_without_changes_keeps_archive(self):
+        data = self.archive.getvalue()
+
+        result = folder_archive.update_archive(self.source, self.archive, KEY, new_header, self.members)
+
+        self.assertEqual(result.members, self.members)
+        self.assertEqual(self.archive.getvalue(), data)
+
+    def test_update_same_size_new_content(self):
+        # Размер не изменился, время изменения — да: файл сверяется по SHA-256
+        path = os.path.join(self.source, "a.txt")
+        write_file(path, b"ALPHA")
+        os.utime(path, (1, 1))
+
+        result = folder_archive.update_archive(self.source, self.archive, KEY, new_header, self.members)
+
+        self.assertEqual(result.changed, 1)
+        self.assertEqual(self.extract(self.archive)["a.txt"], b"ALPHA")
+
+    def test_compact(self):
+        write_file(os.path.join(self.source, "sub", "b.bin"), os.urandom(CHUNK_SIZE * 2))
+        result = folder_archive.update_archive(self.source, self.archive, KEY, new_header, self.members)
+
+        compacted = io.BytesIO()
+        members = folder_archive.compact_archive(self.archive, compacted, KEY, new_header, result.members)
+
+        self.assertLess(len(compacted.getvalue()), result.archive_size)
+        self.assertEqual(folder_archive.read_manifest(compacted, KEY), members)
+        self.assertEqual(self.extract(compacted), read_tree(self.source))
+
+    def test_rekey(self):
+        rekeyed = io.BytesIO()
+        progress = []
+        members = folder_archive.rekey_archive(
+            self.archive, rekeyed, KEY, NEW_KEY, new_header, self.members,
+            lambda done, total: progress.append((done, total))
+        )
+
+        total_size = sum(member.size for member in self.members)
+        self.assertEqual(progress[-1], (total_size, total_size))
+        self.assertEqual(folder_archive.read_manifest(rekeyed, NEW_KEY), members)
+        self.assertEqual(self.extract(rekeyed, NEW_KEY), read_tree(self.source))
+        with self.assertRaises(ValueError):
+            folder_archive.read_manifest(rekeyed, KEY)
+
+    def test_manifest_for_database(self):
+        data = folder_archive.pack_manifest(self.members, 123, KEY, new_header())
+        self.assertEqual(folder_archive.unpack_manifest(data, KEY), (self.members, 123))
+        with self.assertRaises(ValueError):
+            folder_archive.unpack_manifest(data, NEW_KEY)
+
+    def test_tampered_member(self):
+        member = next(member for member in self.members if member.path == "sub/b.bin")
+        data = bytearray(self.archive.getvalue())
+        data[member.offset + member.length - 5] ^= 1
+        with self.assertRaises(ValueError):
+            self.extract(io.BytesIO(bytes(data)))
+
+    def test_tampered_manifest(self):
+        data = bytearray(self.archive.getvalue())
+        data[-30] ^= 1
+        with self.assertRaises(ValueError):
+            folder_archive.read_manifest(io.BytesIO(bytes(data)), KEY)
+
+    def test_swapped_streams(self):
+        # Соль файла в манифесте не дает подставить поток другого файла
+        files = [member for member in self.members if not member.is_dir]
+        first, second = files[0], files[1]
+        swapped = [
+            first._replace(offset=second.offset, length=second.length) if member == first else member
+            for member in self.members
+        ]
+        output = tempfile.mkdtemp(dir=self.root)
+        with self.assertRaises(ValueError):
+            folder_archive.extract_members(self.archive, KEY, swapped, output)
+        with self.assertRaises(ValueError):
+            folder_archive.rekey_archive(self.archive, io.BytesIO(), KEY, NEW_KEY, new_header, swapped)
+
+    def test_truncated(self):
+        data = self.archive.getvalue()
+        for size in (len(data) - 1, len(data) // 2, 3):
+            with self.subTest(size=size), self.assertRaises(ValueError):
+                folder_archive.read_manifest(io.BytesIO(data[:size]), KEY)
+
+    def test_rejects_paths_outside_output(self):
+        member = folder_archive.ArchiveMember("../evil", True, 0, 0.0)
+        with self.assertRaises(ValueError):
+            folder_archive.extract_members(self.archive, KEY, [member], tempfile.mkdtemp(dir=self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
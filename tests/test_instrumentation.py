@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+
+from instrumentation import Instrumentation
+
+
+class ConfigureTest(unittest.TestCase):
+    def test_unwritable_log_keeps_timing_without_journal(self):
+        with tempfile.TemporaryDirectory() as folder:
+            log_path = os.path.join(folder, "missing", "spans.jsonl")
+            recorder = Instrumentation()
+
+            recorder.configure(enabled=True, log_path=log_path)
+
+            self.assertTrue(recorder.enabled)
+            self.assertIsNone(recorder.log_path)
+            self.assertIn(log_path, recorder.log_error)
+            with recorder.span("op"):
+                pass
+            self.assertEqual(recorder.snapshot()["op"]["count"], 1)
+
+    def test_writable_log_clears_error(self):
+        with tempfile.TemporaryDirectory() as folder:
+            recorder = Instrumentation()
+            recorder.configure(enabled=True, log_path=os.path.join(folder, "missing", "spans.jsonl"))
+
+            log_path = os.path.join(folder, "spans.jsonl")
+            recorder.configure(log_path=log_path)
+            with recorder.span("op"):
+                pass
+            recorder.configure(enabled=False, log_path=None)
+
+            self.assertIsNone(recorder.log_error)
+            with open(log_path, encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
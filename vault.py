@@ -0,0 +1,132 @@
+from cryptography.hazmat.primitives.keywrap import (
+    InvalidUnwrap, aes_key_unwrap, aes_key_wrap
+)
+from database.db_manager import DatabaseManager
+from encryption_settings import EncryptionSettings
+from typing import Optional
+import json
+import kdf
+import os
+import threading
+
+
+class VaultLockedError(Exception):
+    """Хранилище не разблокировано"""
+
+
+class Vault:
+    """Хранилище с одним мастер-паролем
+
+    Мастер-пароль через KDF дает ключ, которым обернут случайный мастер-ключ.
+    Мастер-ключом обернуты случайные ключи записей (таблица entry_keys), так
+    что после разблокировки запись открывается без KDF, а смена мастер-пароля
+    переоборачивает только мастер-ключ.
+    """
+    MASTER_KEY_SIZE = 32
+    DATA_KEY_SIZE = 32
+
+    def __init__(self, db_manager: DatabaseManager = None, settings: EncryptionSettings = None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.settings = settings or EncryptionSettings(self.db_manager.db_path)
+        self._master_key: Optional[bytearray] = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """Проверяет, создано ли хранилище"""
+        return self.db_manager.get_vault() is not None
+
+    @property
+    def is_unlocked(self) -> bool:
+        return self._master_key is not None
+
+    def create(self, password: str) -> None:
+        """Создает хранилище с новым мастер-ключом и разблокирует его"""
+        if self.exists():
+            raise ValueError("Хранилище уже создано")
+        master_key = os.urandom(self.MASTER_KEY_SIZE)
+        self._store_master_key(password, master_key)
+        self._set_master_key(master_key)
+
+    def unlock(self, password: str) -> None:
+        """Разблокирует хранилище мастер-паролем (один запуск KDF)"""
+        vault = self.db_manager.get_vault()
+        if vault is None:
+            raise ValueError("Хранилище еще не создано")
+        salt, kdf_params, wrapped_master_key = vault
+        kek = self._derive_kek(password, salt, json.loads(kdf_params))
+        try:
+            master_key = aes_key_unwrap(kek, wrapped_master_key)
+        except InvalidUnwrap:
+            raise ValueError("Неверный мастер-пароль")
+        self._set_master_key(master_key)
+
+    def lock(self) -> None:
+        """Блокирует хранилище и затирает мастер-ключ в памяти"""
+        with self._lock:
+            if self._master_key is not None:
+                self._master_key[:] = bytes(len(self._master_key))
+            self._master_key = None
+
+    def change_password(self, old_password: str, new_password: str) -> None:
+        """Меняет мастер-пароль без перешифрования записей"""
+        self.unlock(old_password)
+        self._store_master_key(new_password, self._get_master_key())
+
+    def kdf_params(self) -> Optional[dict]:
+        """Параметры KDF мастер-пароля или None, если хранилище не создано"""
+        vault = self.db_manager.get_vault()
+        return json.loads(vault[1]) if vault else None
+
+    def rekey(self, password: str, kdf_params: dict) -> None:
+        """Переводит мастер-пароль на новые параметры KDF, ключи записей не меняются"""
+        self.unlock(password)
+        self._store_master_key(password, self._get_master_key(), kdf_params)
+
+    def wrap_key(self, data_key: bytes) -> bytes:
+        """Оборачивает ключ записи мастер-ключом"""
+        return aes_key_wrap(self._get_master_key(), data_key)
+
+    def unwrap_key(self, wrapped_key: bytes) -> bytes:
+        """Разворачивает ключ записи"""
+        try:
+            return aes_key_unwrap(self._get_master_key(), wrapped_key)
+        except InvalidUnwrap:
+            raise ValueError("Ключ записи поврежден или принадлежит другому хранилищу")
+
+    def prepare_encryptor(self, encryptor) -> bytes:
+        """Инициализирует шифровальщик новым ключом записи
+
+        Возвращает обернутый ключ, который нужно сохранить вместе с записью.
+        """
+        data_key = os.urandom(self.DATA_KEY_SIZE)
+        wrapped_key = self.wrap_key(data_key)
+        encryptor.use_key(data_key, os.urandom(16))
+        return wrapped_key
+
+    def open_encryptor(self, encryptor, wrapped_key: bytes, salt: bytes) -> None:
+        """Инициализирует шифровальщик ключом существующей записи"""
+        encryptor.use_key(self.unwrap_key(wrapped_key), salt)
+
+    def _get_master_key(self) -> bytes:
+        with self._lock:
+            if self._master_key is None:
+                raise VaultLockedError("Хранилище заблокировано")
+            return bytes(self._master_key)
+
+    def _set_master_key(self, master_key: bytes) -> None:
+        self.lock()
+        with self._lock:
+            self._master_key = bytearray(master_key)
+
+    def _store_master_key(self, password: str, master_key: bytes, kdf_params: dict = None) -> None:
+        settings = self.settings.get_settings()
+        if kdf_params is None:
+            kdf_params = kdf.params_from_settings(settings, self.MASTER_KEY_SIZE)
+        kdf_params = dict(kdf_params, key_length=self.MASTER_KEY_SIZE)
+        salt = os.urandom(settings["salt_size"])
+        kek = self._derive_kek(password, salt, kdf_params)
+        self.db_manager.save_vault(salt, json.dumps(kdf_params), aes_key_wrap(kek, master_key))
+
+    def _derive_kek(self, password: str, salt: bytes, kdf_params: dict) -> bytes:
+        # Хранилища старых версий записаны без key_length
+        return kdf.derive(password, salt, dict(kdf_params, key_length=self.MASTER_KEY_SIZE))